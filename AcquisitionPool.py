@@ -0,0 +1,219 @@
+import os
+
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, pyqtSignal, pyqtSlot
+
+from SerialWorker import SerialWorker
+from ProcessAcquisition import ProcessWorker
+from TelemetryTransport import TelemetryTransport
+from Recorder import Recorder
+from RollingStats import RollingStats
+from AlarmEngine import AlarmEngine
+from Metrics import Sample, alarm_samples, rolling_samples, worker_samples
+
+
+def parse_ports(spec: str) -> dict:
+    """"ст1=/dev/ttyUSB0,ст2=/dev/ttyUSB1" -> {"ст1": "/dev/ttyUSB0", ...}.
+
+    Без имени устройство получает номер по порядку: "/dev/ttyUSB0,/dev/ttyUSB1"
+    -> {"1": ..., "2": ...}.
+    """
+    ports = {}
+    for number, item in enumerate(filter(None, (part.strip() for part in spec.split(","))), 1):
+        device_id, sep, port = item.partition("=")
+        if not sep:
+            device_id, port = str(number), item
+        if device_id in ports:
+            raise ValueError(f"Устройство {device_id} указано дважды")
+        ports[device_id] = port
+    return ports
+
+
+def process_mode_from_env() -> bool:
+    """NIIM_ACQUISITION=process ‒ читать порты в отдельных процессах (ProcessWorker)."""
+    return os.environ.get("NIIM_ACQUISITION", "thread") == "process"
+
+
+def discover_from_env() -> bool:
+    """NIIM_DISCOVER=1 ‒ искать единственный контроллер на всех портах системы."""
+    return os.environ.get("NIIM_DISCOVER", "0") not in ("", "0")
+
+
+def ports_from_env(default: str = "/dev/ttyUSB0") -> dict:
+    """NIIM_PORTS ‒ список портов (см. parse_ports), иначе один порт NIIM_PORT."""
+    if os.environ.get("NIIM_PORTS"):
+        return parse_ports(os.environ["NIIM_PORTS"])
+    return {"1": os.environ.get("NIIM_PORT", default)}
+
+
+class Device:
+    """Всё, что относится к одному контроллеру: воркер, его поток, транспорт в GUI, запись."""
+
+    def __init__(self, device_id: str, port: str, rate_hz: float, record_dir: str | None,
+                 out_of_process: bool = False, discover: bool = False, alarm_rules: list = (),
+                 retention: dict | None = None):
+        self.id = device_id
+        worker_class = ProcessWorker if out_of_process else SerialWorker
+        self.worker = worker_class(port=port, device_id=device_id, discover=discover)
+        if record_dir:
+            self.worker.recorder = Recorder(record_dir, **(retention or {}))
+        self.thread = QThread()
+        self.thread.setObjectName(f"SerialWorker-{device_id}")
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run_input)
+
+        self.transport = TelemetryTransport(rate_hz=rate_hz, device=device_id)
+        self.worker.batch_received.connect(self.transport.push, Qt.DirectConnection)
+        # статистика ‒ по всем кадрам, а не по тем, что дошли до GUI
+        self.stats = RollingStats()
+        self.worker.batch_received.connect(self.stats.update, Qt.DirectConnection)
+        # тревоги проверяются там же, в потоке порта (у каждого устройства своё состояние правил)
+        self.alarms = AlarmEngine(alarm_rules) if alarm_rules else None
+        self.connected = False
+
+
+class AcquisitionPool(QObject):
+    """Опрос нескольких контроллеров одновременно: по SerialWorker и потоку на порт.
+
+    Каждый воркер читает, разбирает и отправляет команды независимо от
+    остальных (свои поток чтения, передатчик и Correlator), поэтому
+    медленный или пропавший порт не задерживает соседей. Кадры помечены
+    идентификатором устройства; наружу всё выходит сигналами пула с
+    идентификатором первым аргументом.
+
+    record_dir ‒ каталог записей (None ‒ не записывать), retention ‒
+    max_total_bytes/max_age для Recorder, у каждого устройства свои.
+
+    out_of_process ‒ вместо SerialWorker ProcessWorker: порт читает и кадры
+    разбирает отдельный процесс, GUI не отнимает у него GIL.
+
+    discover ‒ если контроллер один, искать его по всем портам системы
+    (порт мог смениться после переподключения USB). Только по запросу:
+    опрос открывает чужие порты. При нескольких контроллерах ‒ всегда
+    только указанные порты, иначе устройства могли бы перепутаться.
+    """
+    batch_delivered = pyqtSignal(str, object)         # устройство, ExchangeBatch
+    data_received = pyqtSignal(str, dict)
+    error_occurred = pyqtSignal(str, str)
+    connection_status = pyqtSignal(str, bool)
+    eeprom_progress = pyqtSignal(str, int, int)
+    eeprom_dump_finished = pyqtSignal(str, int, bytes, float, str)
+    eeprom_write_finished = pyqtSignal(str, list, str)
+    alarm_changed = pyqtSignal(str, object)           # устройство, AlarmEvent
+
+    def __init__(self, ports: dict, rate_hz: float = 30, record_dir: str | None = "records",
+                 out_of_process: bool = False, alarm_rules: list = (), discover: bool = False,
+                 retention: dict | None = None):
+        super().__init__()
+        self.devices = {}
+        for device_id, port in ports.items():
+            # записи каждого устройства ‒ в своём каталоге, если устройств несколько
+            directory = record_dir and (os.path.join(record_dir, device_id) if len(ports) > 1 else record_dir)
+            device = Device(device_id, port, rate_hz, directory, out_of_process, discover=discover and len(ports) == 1,
+                            alarm_rules=alarm_rules, retention=retention)
+            self._forward(device)
+            self.devices[device_id] = device
+        # кадры, которые AlarmEngine ещё копит, когда поток кадров встал
+        self.alarm_timer = QTimer(self)
+        self.alarm_timer.setInterval(100)
+        self.alarm_timer.timeout.connect(self._flush_alarms)
+
+    def _forward(self, device: Device):
+        # сигналы воркера испускаются в его потоке; сигналы пула доходят до GUI очередью
+        d, worker = device.id, device.worker
+        worker.data_received.connect(lambda packet: self.data_received.emit(d, packet), Qt.DirectConnection)
+        worker.error_occurred.connect(lambda msg: self.error_occurred.emit(d, msg), Qt.DirectConnection)
+        worker.connection_status.connect(lambda ok: self._on_status(device, ok), Qt.DirectConnection)
+        worker.eeprom_progress.connect(lambda done, total: self.eeprom_progress.emit(d, done, total),
+                                       Qt.DirectConnection)
+        worker.eeprom_dump_finished.connect(
+            lambda start, data, rate, error: self.eeprom_dump_finished.emit(d, start, data, rate, error),
+            Qt.DirectConnection)
+        worker.eeprom_write_finished.connect(
+            lambda blocks, error: self.eeprom_write_finished.emit(d, blocks, error), Qt.DirectConnection)
+        device.transport.delivered.connect(lambda batch: self.batch_delivered.emit(d, batch))
+        if device.alarms:
+            worker.batch_received.connect(lambda batch: self._check_alarms(device, batch), Qt.DirectConnection)
+
+    def _check_alarms(self, device: Device, batch):
+        self._emit_alarms(device, device.alarms.feed, batch)
+
+    def _emit_alarms(self, device: Device, check, *args):
+        # feed из потока порта и flush_stale по таймеру не должны обгонять друг друга
+        with device.alarms.lock:
+            for event in check(*args):
+                self.alarm_changed.emit(device.id, event)
+
+    def _flush_alarms(self):
+        for device in self.devices.values():
+            if device.alarms:
+                self._emit_alarms(device, device.alarms.flush_stale)
+
+    def _on_status(self, device: Device, connected: bool):
+        device.connected = connected
+        if not connected and device.alarms:
+            self._emit_alarms(device, device.alarms.flush)
+        self.connection_status.emit(device.id, connected)
+
+    @property
+    def device_ids(self) -> list:
+        return list(self.devices)
+
+    def worker(self, device_id: str) -> SerialWorker:
+        return self.devices[device_id].worker
+
+    # ----------  команды: слоты потокобезопасны, как и у SerialWorker  ----------
+    @pyqtSlot(str, int, bytes)
+    def handle_command(self, device_id: str, cmd_id: int, payload: bytes = b''):
+        self.worker(device_id).handle_command(cmd_id, payload)
+
+    @pyqtSlot(str, int, int, bytes)
+    def handle_eprom_command(self, device_id: str, command_id: int, address: int, data: bytes = b''):
+        self.worker(device_id).handle_eprom_command(command_id, address, data)
+
+    @pyqtSlot(str, int, int)
+    def read_eeprom_range(self, device_id: str, start: int, length: int):
+        self.worker(device_id).read_eeprom_range(start, length)
+
+    @pyqtSlot(str, list)
+    def write_eeprom(self, device_id: str, blocks: list):
+        self.worker(device_id).write_eeprom(blocks)
+
+    # ----------  метрики  ----------
+    def metrics(self) -> list:
+        """Сборщик для MetricsRegistry: счётчики воркеров, очередей в GUI и статистика каналов по устройствам."""
+        samples = []
+        for device in self.devices.values():
+            samples += worker_samples(device.id, device.worker.stats())
+            samples += rolling_samples(device.id, device.stats)
+            if device.alarms:
+                samples += alarm_samples(device.id, device.alarms)
+            transport, labels = device.transport, {"device": device.id}
+            samples += [
+                Sample("niim_gui_queue_depth", "gauge", "Кадров ждут передачи в GUI", labels, transport.depth),
+                Sample("niim_gui_frames_delivered_total", "counter", "Кадров передано в GUI", labels,
+                       transport.delivered_frames),
+                Sample("niim_gui_frames_dropped_total", "counter", "Кадров отброшено на пути в GUI", labels,
+                       transport.dropped_frames),
+            ]
+        return samples
+
+    # ----------  запуск и остановка  ----------
+    def start(self):
+        for device in self.devices.values():
+            device.thread.start()
+        if any(device.alarms for device in self.devices.values()):
+            self.alarm_timer.start()
+
+    def stop(self):
+        # сначала всем воркерам флаг остановки ‒ порты закрываются параллельно
+        for device in self.devices.values():
+            device.transport.stop()
+            device.worker.stop()
+        self.alarm_timer.stop()
+        for device in self.devices.values():
+            device.thread.quit()
+            device.thread.wait()
+            if device.alarms:
+                self._emit_alarms(device, device.alarms.flush)
+            if device.worker.recorder:
+                device.worker.recorder.close()
@@ -0,0 +1,290 @@
+"""Тревоги по телеметрии: правила из файла, проверка пачками кадров.
+
+Файл правил ‒ alarms.json (или NIIM_ALARMS); .yaml/.yml читается, если
+установлен PyYAML. Список правил:
+    [{"name": "TEMP1 высокая", "channel": "TEMP1", "op": ">", "value": 60,
+      "hysteresis": 2, "delay": 5, "severity": "alarm"},
+     {"name": "ТМН тормозит при открытом V1", "channel": "TMNrpm", "op": "<", "value": 30000,
+      "hysteresis": 1000, "when": [{"channel": "ElectroValveState", "bit": 0}]},
+     {"name": "Натекание", "channel": "MIDA", "kind": "rate", "window": 10, "op": ">", "value": 0.05}]
+
+    kind        threshold (значение канала) или rate (изменение за window секунд, ед./с)
+    op, value   ">" или "<" и порог; «вне диапазона» ‒ два правила
+    hysteresis  тревога снимается, когда значение вернётся за порог на эту величину
+    delay       условие должно держаться столько секунд подряд
+    when        условия блокировки: правило проверяется, только пока все они
+                выполнены ({"channel", "bit"} ‒ бит установлен, {"channel", "op",
+                "value"} ‒ сравнение); иначе тревога снимается
+    severity    warning или alarm; message ‒ текст для списка тревог
+
+Все правила считаются разом, матрицей правила × кадры: на пачку уходит
+одинаковое число вызовов numpy при любом числе правил, Python-цикл идёт
+только по изменившимся тревогам.
+"""
+import json
+import os
+import threading
+from time import monotonic_ns, perf_counter
+from typing import NamedTuple
+
+import numpy as np
+
+from Metrics import Histogram, UPDATE_BUCKETS_MS
+
+ALARMS_FILE = "alarms.json"
+SEVERITIES = ("warning", "alarm")
+_OPS = {">": 1.0, "<": -1.0}
+_GATE_OPS = {">": np.greater, "<": np.less, ">=": np.greater_equal, "<=": np.less_equal,
+             "==": np.equal, "!=": np.not_equal}
+
+
+class AlarmRule:
+    __slots__ = ("name", "channel", "kind", "op", "value", "hysteresis", "delay", "window",
+                 "severity", "message", "when")
+
+    def __init__(self, name: str, channel: str, op: str, value: float, kind: str = "threshold",
+                 hysteresis: float = 0.0, delay: float = 0.0, window: float | None = None,
+                 severity: str = "alarm", message: str = "", when: list = ()):
+        if op not in _OPS:
+            raise ValueError(f"{name}: op должен быть > или <, получено {op!r}")
+        if kind not in ("threshold", "rate"):
+            raise ValueError(f"{name}: неизвестный вид правила {kind!r}")
+        if kind == "rate" and not (window and window > 0):
+            raise ValueError(f"{name}: для rate нужен window > 0")
+        if severity not in SEVERITIES:
+            raise ValueError(f"{name}: severity ‒ одно из {', '.join(SEVERITIES)}")
+        if hysteresis < 0 or delay < 0:
+            raise ValueError(f"{name}: hysteresis и delay не могут быть отрицательными")
+        self.name = name
+        self.channel = channel
+        self.kind = kind
+        self.op = op
+        self.value = float(value)
+        self.hysteresis = float(hysteresis)
+        self.delay = float(delay)
+        self.window = window and float(window)
+        self.severity = severity
+        self.message = message or f"{channel}{' (скорость)' if kind == 'rate' else ''} {op} {value:g}"
+        self.when = [_gate(name, g) for g in when]
+
+
+def _gate(rule: str, gate: dict) -> tuple:
+    """{"channel", "bit"} или {"channel", "op", "value"} -> (канал, op, значение, бит)."""
+    if "bit" in gate:
+        return gate["channel"], None, None, int(gate["bit"])
+    if gate.get("op") not in _GATE_OPS:
+        raise ValueError(f"{rule}: условие when ‒ bit или op из {', '.join(_GATE_OPS)}")
+    return gate["channel"], gate["op"], float(gate["value"]), None
+
+
+def load_rules(path: str = ALARMS_FILE) -> list:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("для правил в YAML нужен PyYAML (pip install pyyaml)") from None
+            items = yaml.safe_load(f) or []
+        else:
+            items = json.load(f)
+    rules = [AlarmRule(**item) for item in items]
+    names = [r.name for r in rules]
+    duplicates = {n for n in names if names.count(n) > 1}
+    if duplicates:
+        raise ValueError(f"Правила описаны дважды: {', '.join(sorted(duplicates))}")
+    return rules
+
+
+def rules_from_env() -> list:
+    """Правила из NIIM_ALARMS или alarms.json; нет файла ‒ пустой список."""
+    path = os.environ.get("NIIM_ALARMS", ALARMS_FILE)
+    if not os.path.exists(path):
+        return []
+    return load_rules(path)
+
+
+class AlarmEvent(NamedTuple):
+    t_ns: int              # время кадра, на котором тревога возникла или снялась
+    rule: str
+    severity: str
+    active: bool
+    value: float           # значение проверяемой величины в этом кадре
+    message: str
+
+
+class AlarmEngine:
+    """Состояние всех правил одного контроллера.
+
+    feed() копит пачки не дольше max_delay секунд (по времени кадров) и
+    проверяет их одной матрицей ‒ мелкие пачки из потока порта по одной
+    считать дорого. evaluate() проверяет сразу.
+
+    Накопленное feed() проверяет только с приходом следующей пачки, поэтому
+    последние кадры перед паузой или обрывом связи проверяют flush_stale()
+    по таймеру и flush() при потере связи и остановке. Все три можно
+    вызывать из разных потоков; чтобы события доходили по порядку, вызов
+    вместе с отправкой событий делают под lock.
+    """
+
+    def __init__(self, rules: list, max_delay: float = 0.05):
+        self.rules = list(rules)
+        self.max_delay_ns = int(max_delay * 1e9)
+        self.eval_time = Histogram(UPDATE_BUCKETS_MS)     # длительность evaluate, мс
+        self.frames = 0
+        self._pending = []
+        self.lock = threading.RLock()
+        self._origin_ns = None
+        self._compile()
+
+    def _compile(self):
+        rules = self.rules
+        # источники: сырые каналы, затем пары (канал, окно) для скорости
+        self._channels = sorted({r.channel for r in rules if r.kind == "threshold"})
+        self._rates = sorted({(r.channel, r.window) for r in rules if r.kind == "rate"})
+        index = {c: i for i, c in enumerate(self._channels)}
+        index.update({pair: len(self._channels) + i for i, pair in enumerate(self._rates)})
+        self._source = np.array([index[r.channel if r.kind == "threshold" else (r.channel, r.window)]
+                                 for r in rules], dtype=np.intp)
+        self._rate_tails = [(np.empty(0), np.empty(0)) for _ in self._rates]
+
+        self._sign = np.array([_OPS[r.op] for r in rules])
+        self._value = np.array([r.value for r in rules])
+        self._hysteresis = np.array([r.hysteresis for r in rules])
+        self._delay = np.array([r.delay for r in rules])
+
+        # условия блокировки: общий список, правило ‒ строка матрицы правила × условия
+        self._gates = sorted({g for r in rules for g in r.when}, key=repr)
+        gate_index = {g: i for i, g in enumerate(self._gates)}
+        self._gate_matrix = np.zeros((len(rules), len(self._gates)), dtype=np.float64)
+        for row, rule in enumerate(rules):
+            for g in rule.when:
+                self._gate_matrix[row, gate_index[g]] = 1.0
+        self._needed = sorted(set(self._channels) | {c for c, _ in self._rates} | {g[0] for g in self._gates})
+
+        self.state = np.zeros(len(rules), dtype=bool)
+        self._since = np.full(len(rules), np.nan)          # начало текущего выполнения условия, с
+
+    @property
+    def active(self) -> list:
+        return [r.name for r, on in zip(self.rules, self.state) if on]
+
+    # ----------  вход  ----------
+    def feed(self, batch) -> list:
+        """batch ‒ ExchangeBatch (t_ns и batch[канал]); события ‒ когда накопится max_delay."""
+        if not self.rules or not len(batch):
+            return []
+        with self.lock:
+            self._pending.append((batch.t_ns, {c: batch[c] for c in self._needed}))
+            if batch.t_ns[-1] - self._pending[0][0][0] < self.max_delay_ns:
+                return []
+            return self._flush()
+
+    def flush(self) -> list:
+        """Проверить всё накопленное сразу (потеря связи, остановка)."""
+        with self.lock:
+            return self._flush()
+
+    def flush_stale(self, now_ns: int | None = None) -> list:
+        """Проверить накопленное, если первая пачка ждёт дольше max_delay (по monotonic_ns)."""
+        with self.lock:
+            if not self._pending:
+                return []
+            now_ns = monotonic_ns() if now_ns is None else now_ns
+            if now_ns - int(self._pending[0][0][0]) < self.max_delay_ns:
+                return []
+            return self._flush()
+
+    def _flush(self) -> list:
+        if not self._pending:
+            return []
+        if len(self._pending) == 1:
+            t_ns, columns = self._pending[0]
+        else:
+            t_ns = np.concatenate([p[0] for p in self._pending])
+            columns = {c: np.concatenate([p[1][c] for p in self._pending]) for c in self._needed}
+        self._pending.clear()
+        return self.evaluate(t_ns, columns)
+
+    # ----------  проверка  ----------
+    def evaluate(self, t_ns: np.ndarray, columns: dict) -> list:
+        """Проверить кадры (t_ns, {канал: значения}) всеми правилами; вернуть смены состояния."""
+        if not self.rules or not len(t_ns):
+            return []
+        started = perf_counter()
+        if self._origin_ns is None:
+            self._origin_ns = int(t_ns[0])
+        t = (np.asarray(t_ns, dtype=np.int64) - self._origin_ns) / 1e9
+        n = len(t)
+        self.frames += n
+
+        sources = np.empty((len(self._channels) + len(self._rates), n))
+        for i, channel in enumerate(self._channels):
+            sources[i] = columns[channel]
+        for i, (channel, window) in enumerate(self._rates):
+            sources[len(self._channels) + i] = self._rate(i, t, np.asarray(columns[channel], dtype=np.float64),
+                                                          window)
+        x = sources[self._source]                                       # правила × кадры
+
+        # превышение: > 0 ‒ условие выполнено, < -hysteresis ‒ можно снимать (nan ‒ ни то ни другое)
+        excess = (x - self._value[:, None]) * self._sign[:, None]
+        with np.errstate(invalid="ignore"):
+            raise_ = excess > 0
+            clear = excess < -self._hysteresis[:, None]
+        if self._gates:
+            blocked = self._gate_matrix @ ~self._gate_values(columns, n) > 0
+            raise_ &= ~blocked
+            clear |= blocked
+
+        raise_ = self._held(raise_, t)
+        state = self._latch(raise_, clear)
+
+        previous = np.concatenate([self.state[:, None], state[:, :-1]], axis=1)
+        rows, frames = np.nonzero(state != previous)
+        order = np.argsort(frames, kind="stable")
+        events = [AlarmEvent(int(t_ns[i]), self.rules[r].name, self.rules[r].severity, bool(state[r, i]),
+                             float(x[r, i]), self.rules[r].message)
+                  for r, i in zip(rows[order].tolist(), frames[order].tolist())]
+        self.state = state[:, -1].copy()
+        self.eval_time.observe((perf_counter() - started) * 1000)
+        return events
+
+    def _gate_values(self, columns: dict, n: int) -> np.ndarray:
+        """Условия блокировки × кадры, bool."""
+        values = np.empty((len(self._gates), n), dtype=bool)
+        for i, (channel, op, value, bit) in enumerate(self._gates):
+            column = np.asarray(columns[channel])
+            if bit is not None:
+                values[i] = (column.astype(np.int64) >> bit) & 1
+            else:
+                values[i] = _GATE_OPS[op](column, value)
+        return values
+
+    def _rate(self, i: int, t: np.ndarray, x: np.ndarray, window: float) -> np.ndarray:
+        """(x - x window секунд назад) / прошедшее время; nan, пока истории меньше половины окна."""
+        tail_t, tail_x = self._rate_tails[i]
+        all_t = np.concatenate([tail_t, t])
+        all_x = np.concatenate([tail_x, x])
+        ref = np.searchsorted(all_t, t - window, side="left")
+        dt = t - all_t[ref]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = np.where(dt >= window / 2, (x - all_x[ref]) / dt, np.nan)
+        keep = np.searchsorted(all_t, t[-1] - window, side="left")
+        self._rate_tails[i] = (all_t[keep:], all_x[keep:])
+        return rate
+
+    def _held(self, condition: np.ndarray, t: np.ndarray) -> np.ndarray:
+        """condition, выполняющееся не меньше delay секунд подряд (с учётом прошлых пачек)."""
+        n = len(t)
+        idx = np.arange(n)
+        last_false = np.maximum.accumulate(np.where(condition, -1, idx), axis=1)
+        carried = np.where(np.isnan(self._since), t[0], self._since)[:, None]
+        start = np.where(last_false < 0, carried, t[np.minimum(last_false + 1, n - 1)])
+        self._since = np.where(condition[:, -1], start[:, -1], np.nan)
+        return condition & (t[None, :] - start >= self._delay[:, None])
+
+    def _latch(self, raise_: np.ndarray, clear: np.ndarray) -> np.ndarray:
+        """Состояние с гистерезисом: последнее из событий «возникла»/«снята», до них ‒ прежнее."""
+        n = raise_.shape[1]
+        last = np.maximum.accumulate(np.where(raise_ | clear, np.arange(n), -1), axis=1)
+        at_last = np.take_along_axis(raise_, np.maximum(last, 0), axis=1)
+        return np.where(last >= 0, at_last, self.state[:, None])
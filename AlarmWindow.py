@@ -0,0 +1,66 @@
+import time
+
+from main_imports import *
+from AlarmEngine import AlarmEvent
+
+
+class AlarmWindow(QWidget):
+    """Журнал тревог: строка на каждое возникновение и снятие, активные выделены цветом.
+
+    Окно немодальное и при новой тревоге показывается, не забирая фокус.
+    """
+    MAX_ROWS = 1000
+    BRUSHES = {"alarm": QBrush(QColor(255, 190, 190)), "warning": QBrush(QColor(255, 243, 176))}
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Тревоги")
+        self.setGeometry(200, 200, 760, 400)
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+        layout = QVBoxLayout(self)
+
+        self.status_label = QLabel("Активных тревог нет")
+        layout.addWidget(self.status_label)
+
+        self.table = QTableWidget(0, 6)
+        self.table.setHorizontalHeaderLabels(["Время", "Устройство", "Тревога", "Условие", "Значение", "Состояние"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.clear_button = QPushButton("Очистить журнал")
+        self.clear_button.clicked.connect(lambda: self.table.setRowCount(0))
+        layout.addWidget(self.clear_button)
+
+        self.active = {}              # (устройство, правило) -> severity
+
+    def add_event(self, device: str, event: AlarmEvent):
+        key = (device, event.rule)
+        if event.active:
+            self.active[key] = event.severity
+        else:
+            self.active.pop(key, None)
+
+        # t_ns ‒ monotonic_ns кадра, в журнал ‒ настенное время
+        wall = time.time() - (time.monotonic_ns() - event.t_ns) / 1e9
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        texts = (time.strftime("%H:%M:%S", time.localtime(wall)), device, event.rule, event.message,
+                 f"{event.value:.4g}", "возникла" if event.active else "снята")
+        for column, text in enumerate(texts):
+            item = QTableWidgetItem(text)
+            if event.active:
+                item.setBackground(self.BRUSHES[event.severity])
+            self.table.setItem(row, column, item)
+        if row >= self.MAX_ROWS:
+            self.table.removeRow(0)
+        self.table.scrollToBottom()
+        self._update_status()
+
+    def _update_status(self):
+        if not self.active:
+            self.status_label.setText("Активных тревог нет")
+            return
+        names = ", ".join(f"{device}: {rule}" for device, rule in self.active)
+        self.status_label.setText(f"Активных тревог: {len(self.active)} ({names})")
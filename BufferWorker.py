@@ -1,15 +1,127 @@
-from queue import Queue
+import heapq
+import itertools
+import logging
+import threading
+from collections import deque
+from time import monotonic_ns
+
+# ----------  приоритеты отправки (меньше ‒ раньше)  ----------
+PRIORITY_SAFETY = 0     # клапаны и всё, что влияет на безопасность установки
+PRIORITY_NORMAL = 10
+PRIORITY_BULK   = 20    # массовый обмен с EEPROM
+
 
 class CommandBuffer:
+    """Потокобезопасная очередь пакетов на отправку с приоритетами.
+
+    Пакеты одного приоритета уходят в порядке поступления.
+    """
+
     def __init__(self):
-        self.outgoing = Queue()
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._heap)
 
-    def add(self, command: str):
-        """Добавить команду в буфер на отправку"""
-        self.outgoing.put(command)
+    def add(self, packet: bytes, priority: int = PRIORITY_NORMAL):
+        """Добавить готовый пакет в буфер на отправку"""
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._seq), monotonic_ns(), packet))
+            self._cond.notify()
 
     def get_next(self):
-        """Получить следующую команду на отправку"""
-        if not self.outgoing.empty():
-            return self.outgoing.get()
-        return None
\ No newline at end of file
+        """Получить следующий пакет на отправку (None ‒ буфер пуст)"""
+        with self._cond:
+            if self._heap:
+                return heapq.heappop(self._heap)[3]
+        return None
+
+    def take(self, max_bytes: int, timeout: float | None = None) -> list:
+        """Дождаться пакетов и забрать их по приоритету, не больше max_bytes за раз.
+
+        Возвращает список (время постановки в очередь, пакет); первый пакет
+        забирается всегда, даже если он длиннее max_bytes.
+        """
+        with self._cond:
+            if not self._heap and not self._cond.wait(timeout):
+                return []
+            items = []
+            size = 0
+            while self._heap and (not items or size + len(self._heap[0][3]) <= max_bytes):
+                _, _, queued_ns, packet = heapq.heappop(self._heap)
+                items.append((queued_ns, packet))
+                size += len(packet)
+            return items
+
+    def clear(self):
+        with self._cond:
+            self._heap.clear()
+
+
+class Transmitter:
+    """Поток записи в порт, не зависящий от потока чтения.
+
+    Забирает из CommandBuffer всё, что накопилось (по приоритету), и
+    отправляет одним write(). max_write ограничивает размер одной записи,
+    чтобы срочный пакет не ждал за длинной пачкой EEPROM-команд.
+    Для каждого пакета запоминается время от постановки в очередь до
+    окончания write() (latencies_ns). on_sent(пакеты, время) вызывается
+    после каждой удачной записи.
+    """
+
+    def __init__(self, buffer: CommandBuffer, get_connection, on_error, max_write: int = 256,
+                 on_sent=None):
+        self.buffer = buffer
+        self.get_connection = get_connection
+        self.on_error = on_error
+        self.on_sent = on_sent
+        self.max_write = max_write
+
+        self.latencies_ns = deque(maxlen=1024)
+        self.packets_sent = 0
+        self.writes = 0
+        self.bytes_sent = 0
+
+        self.is_running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="Transmitter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        while self.is_running:
+            items = self.buffer.take(self.max_write, timeout=0.1)
+            if not items:
+                continue
+
+            connection = self.get_connection()
+            if not connection or not connection.is_open:
+                self.on_error("Порт не открыт — команда не отправлена")
+                continue
+
+            data = b"".join(packet for _, packet in items)
+            try:
+                connection.write(data)
+            except Exception as e:
+                logging.error(f"Ошибка отправки команды: {e}")
+                self.on_error(f"Ошибка отправки команды: {e}")
+                continue
+
+            now = monotonic_ns()
+            if self.on_sent:
+                self.on_sent([packet for _, packet in items], now)
+            self.latencies_ns.extend(now - queued_ns for queued_ns, _ in items)
+            self.packets_sent += len(items)
+            self.writes += 1
+            self.bytes_sent += len(data)
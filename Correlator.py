@@ -0,0 +1,201 @@
+"""Сопоставление ответов контроллера с отправленными командами.
+
+Ответы приходят без номера запроса:
+    0xCC ‒ данные EEPROM (ни адреса, ни команды ‒ только длина),
+    0xBB ‒ ошибка с кодом команды, на которую она выдана.
+Поэтому каждая команда регистрируется до отправки и получает Future:
+    - чтение EEPROM завершается данными ответа 0xCC той же длины;
+    - остальные команды подтверждения не имеют ‒ Future завершается
+      успешно, если за timeout не пришла ошибка 0xBB на этот код команды.
+Ответы одного вида приходят в порядке отправки. Ответ 0xCC относится к
+первому ждущему чтению с такой же длиной; чтения перед ним считаются
+потерянными. Ответ, которому не нашлось запроса (опоздавший, повторный),
+в окна не попадает ‒ он только считается в stray.
+"""
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from time import monotonic_ns
+
+from errors import REQUEST_TIMEOUT, REPLY_LOST, DEVICE_ERROR
+from Metrics import Histogram
+
+# верхние границы корзин гистограммы времени ответа, с (последняя корзина ‒ всё, что дольше)
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+
+class Request:
+    __slots__ = ("cmd_id", "packet", "expect_length", "timeout_ns", "future", "sent_ns", "deadline_ns")
+
+    def __init__(self, cmd_id: int, packet: bytes, expect_length, timeout: float):
+        self.cmd_id = cmd_id
+        self.packet = packet
+        self.expect_length = expect_length  # длина ответа 0xCC; None ‒ ответа нет
+        self.timeout_ns = int(timeout * 1e9)
+        self.future = Future()
+        self.sent_ns = None
+        # пока команда стоит в очереди, срок считаем от регистрации
+        self.deadline_ns = monotonic_ns() + self.timeout_ns
+
+
+class Correlator:
+    """Реестр команд «в полёте».
+
+    register() ‒ из любого потока, до постановки пакета в очередь;
+    mark_sent() ‒ из потока передатчика после write();
+    match() ‒ из потока чтения на каждый разобранный пакет-словарь.
+    Просроченные запросы снимает собственный поток (start()/stop()).
+    Колбэки Future выполняются в потоке, который завершил запрос.
+    """
+
+    def __init__(self, timeout: float = 0.5):
+        self.timeout = timeout
+        self._requests = deque()           # в порядке регистрации
+        self._cond = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+        self.matched = 0
+        self.expired = 0
+        self.lost = 0                      # чтения, за которые ответил следующий запрос
+        self.device_errors = 0
+        self.stray = 0
+        self.histograms = {}               # cmd_id -> Histogram(LATENCY_BUCKETS)
+
+    # ----------  регистрация и отправка  ----------
+    def register(self, cmd_id: int, packet: bytes, expect_length: int | None = None,
+                 timeout: float | None = None) -> Future:
+        request = Request(cmd_id, packet, expect_length, self.timeout if timeout is None else timeout)
+        with self._cond:
+            self._requests.append(request)
+            self._cond.notify()
+        return request.future
+
+    def mark_sent(self, packets, t_ns: int):
+        """Пакеты ушли в порт: время ответа и срок отсчитываются отсюда."""
+        with self._cond:
+            for packet in packets:
+                for request in self._requests:
+                    if request.packet is packet and request.sent_ns is None:
+                        request.sent_ns = t_ns
+                        request.deadline_ns = t_ns + request.timeout_ns
+                        break
+            self._cond.notify()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._requests)
+
+    # ----------  ответы  ----------
+    def match(self, packet: dict) -> bool:
+        """Сопоставить ответ; True ‒ пакет поглощён и дальше не передаётся."""
+        if "EEPROM_READ" in packet:
+            self._match_eeprom(packet)
+            return True
+        if "CMD_ID" in packet:
+            return self._match_error(packet)
+        return False
+
+    def _match_eeprom(self, packet: dict):
+        length = len(packet["EEPROM_READ"])
+        done = []
+        with self._cond:
+            reads = [r for r in self._requests if r.expect_length is not None]
+            target = next((r for r in reads if r.expect_length == length), None)
+            if target is None:
+                self.stray += 1
+                logging.warning(f"Ответ EEPROM ({length} байт) без запроса ‒ отброшен")
+                return
+            for request in reads:
+                self._requests.remove(request)
+                if request is target:
+                    break
+                self.lost += 1
+                done.append((request, REPLY_LOST(
+                    f"Ответ на чтение EEPROM ({request.expect_length} байт) потерян")))
+            self._account(target, packet.get("T_NS") or monotonic_ns())
+            done.append((target, packet))
+        self._finish(done)
+
+    def _match_error(self, packet: dict) -> bool:
+        with self._cond:
+            target = next((r for r in self._requests if r.cmd_id == packet["CMD_ID"]), None)
+            if target is None:
+                return False              # ошибка не по нашей команде ‒ пусть её увидит GUI
+            self._requests.remove(target)
+            self.device_errors += 1
+            self._account(target, packet.get("T_NS") or monotonic_ns())
+        self._finish([(target, DEVICE_ERROR(
+            f"Команда 0x{packet['CMD_ID']:02X}: ошибка контроллера {packet['ERROR_CODE']}", packet))])
+        return True
+
+    def _account(self, request: Request, t_ns: int):
+        self.matched += 1
+        if request.sent_ns is None:
+            return
+        histogram = self.histograms.get(request.cmd_id)
+        if histogram is None:
+            histogram = self.histograms[request.cmd_id] = Histogram(LATENCY_BUCKETS)
+        histogram.observe((t_ns - request.sent_ns) / 1e9)
+
+    @staticmethod
+    def _finish(done):
+        # результаты выставляем вне блокировки: колбэки могут регистрировать новые запросы
+        for request, outcome in done:
+            if request.future.done():
+                continue
+            if isinstance(outcome, Exception):
+                request.future.set_exception(outcome)
+            else:
+                request.future.set_result(outcome)
+
+    # ----------  сроки  ----------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="Correlator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.is_running = False
+        with self._cond:
+            pending = list(self._requests)
+            self._requests.clear()
+            self._cond.notify()
+        for request in pending:
+            request.future.cancel()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def expire(self, now_ns: int | None = None):
+        """Снять просроченные запросы: чтение ‒ REQUEST_TIMEOUT, команда без ответа ‒ успех."""
+        now_ns = monotonic_ns() if now_ns is None else now_ns
+        done = []
+        with self._cond:
+            for request in [r for r in self._requests if r.deadline_ns <= now_ns]:
+                self._requests.remove(request)
+                if request.expect_length is None:
+                    done.append((request, None))
+                else:
+                    self.expired += 1
+                    done.append((request, REQUEST_TIMEOUT(
+                        f"Команда 0x{request.cmd_id:02X}: нет ответа за {request.timeout_ns / 1e9:.3g} с")))
+        self._finish(done)
+
+    def _run(self):
+        while self.is_running:
+            with self._cond:
+                if self._requests:
+                    wait = (min(r.deadline_ns for r in self._requests) - monotonic_ns()) / 1e9
+                else:
+                    wait = None
+                if wait is None or wait > 0:
+                    self._cond.wait(wait)
+            self.expire()
+
+    def latency_histogram(self, cmd_id: int) -> list:
+        """[(верхняя граница, с, или None для «дольше»; число ответов), ...]"""
+        histogram = self.histograms.get(cmd_id) or Histogram(LATENCY_BUCKETS)
+        return list(zip(LATENCY_BUCKETS + (None,), histogram.counts))
@@ -0,0 +1,124 @@
+import numpy as np
+
+from RingBuffer import RingBuffer
+
+
+class MinMaxPyramid:
+    """История канала и пирамида min/max для быстрой отрисовки.
+
+    Уровень с множителем f хранит для каждого целого блока из f отсчётов
+    его минимум и максимум. Блоки считаются инкрементально при extend(),
+    каждый уровень собирается из готовых блоков предыдущего. Минимум и
+    максимум (а не простое прореживание) сохраняют одиночные выбросы.
+    """
+
+    def __init__(self, capacity: int, factors=(16, 256, 4096), dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.base = RingBuffer(capacity, dtype)
+        self.factors = tuple(factors)
+        self.levels = []    # (factor, ratio, mins, maxs, [pending_min, pending_max])
+        prev = 1
+        for factor in self.factors:
+            if factor % prev:
+                raise ValueError("Каждый множитель пирамиды должен делиться на предыдущий")
+            size = capacity // factor + 1
+            self.levels.append((
+                factor, factor // prev,
+                RingBuffer(size, dtype), RingBuffer(size, dtype),
+                [np.empty(0, dtype), np.empty(0, dtype)],
+            ))
+            prev = factor
+
+    def __len__(self):
+        return len(self.base)
+
+    @property
+    def total(self) -> int:
+        return self.base.total
+
+    @property
+    def first_index(self) -> int:
+        return self.base.first_index
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.dtype)
+        if len(values) == 0:
+            return
+        self.base.extend(values)
+
+        lo = hi = values
+        for factor, ratio, mins, maxs, pending in self.levels:
+            if len(pending[0]):
+                lo = np.concatenate((pending[0], lo))
+                hi = np.concatenate((pending[1], hi))
+            full = len(lo) // ratio * ratio
+            pending[0], pending[1] = lo[full:].copy(), hi[full:].copy()
+            if not full:
+                break
+            lo = lo[:full].reshape(-1, ratio).min(axis=1)
+            hi = hi[:full].reshape(-1, ratio).max(axis=1)
+            mins.extend(lo)
+            maxs.extend(hi)
+
+    def level_for(self, samples: int, pixels: int) -> int:
+        """Множитель уровня, дающий не больше ~2 точек на пиксель."""
+        if samples <= 2 * pixels:
+            return 1
+        for factor in self.factors:
+            if samples / factor <= pixels:
+                return factor
+        return self.factors[-1]
+
+    def select(self, start: int, stop: int, pixels: int):
+        """Точки (x, y) для отрисовки отсчётов [start, stop) на pixels пикселях."""
+        start = max(int(start), self.first_index)
+        stop = min(int(stop), self.total)
+        pixels = max(int(pixels), 1)
+        if stop <= start:
+            empty = np.empty(0)
+            return empty, empty
+
+        factor = self.level_for(stop - start, pixels)
+        if factor == 1:
+            return np.arange(start, stop, dtype=np.float64), self.base.view_range(start, stop)
+
+        _, _, mins, maxs = next(level for level in self.levels if level[0] == factor)[:4]
+        first_block = -(-start // factor)      # только целиком хранимые блоки
+        last_block = min(stop // factor, mins.total)
+        lo = mins.view_range(first_block, last_block)
+        hi = maxs.view_range(first_block, last_block)
+        step = factor
+
+        # даже самый грубый уровень слишком подробен ‒ доагрегируем на лету
+        group = -(-len(lo) // pixels)
+        if group > 1:
+            full = len(lo) // group * group
+            lo = lo[:full].reshape(-1, group).min(axis=1)
+            hi = hi[:full].reshape(-1, group).max(axis=1)
+            step = factor * group
+            last_block = first_block + full
+
+        # края диапазона, не покрытые целыми блоками, берём из сырых отсчётов
+        head_stop = min(first_block * factor, stop)
+        head = self.base.view_range(start, head_stop)
+        tail_start = max(last_block * factor, head_stop)
+        tail = self.base.view_range(tail_start, stop)
+
+        count = len(lo) + (1 if len(head) else 0) + (1 if len(tail) else 0)
+        x = np.empty(2 * count)
+        y = np.empty(2 * count)
+        i = 0
+        if len(head):
+            x[0:2] = (start + head_stop) / 2
+            y[0], y[1] = head.min(), head.max()
+            i = 2
+        j = i + 2 * len(lo)
+        centers = first_block * factor + step * (np.arange(len(lo)) + 0.5)
+        x[i:j:2] = centers
+        x[i + 1:j:2] = centers
+        y[i:j:2] = lo
+        y[i + 1:j:2] = hi
+        if len(tail):
+            x[j:j + 2] = (tail_start + stop) / 2
+            y[j], y[j + 1] = tail.min(), tail.max()
+        return x, y
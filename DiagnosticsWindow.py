@@ -0,0 +1,65 @@
+from main_imports import *
+from Metrics import MetricsRegistry
+
+
+class DiagnosticsWindow(QWidget):
+    """Текущие значения метрик (те же, что отдаёт /metrics), обновление раз в секунду.
+
+    Пока окно скрыто, таймер стоит и метрики не собираются.
+    """
+    REFRESH_MS = 1000
+
+    def __init__(self, registry: MetricsRegistry):
+        super().__init__()
+        self.registry = registry
+        self.setWindowTitle("Диагностика")
+        self.setGeometry(150, 150, 760, 600)
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["Метрика", "Метки", "Значение"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start(self.REFRESH_MS)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
+    def refresh(self):
+        samples = sorted(self.registry.collect(), key=lambda s: (s.name, sorted(s.labels.items())))
+        self.table.setRowCount(len(samples))
+        for row, sample in enumerate(samples):
+            labels = ", ".join(f"{k}={v}" for k, v in sample.labels.items())
+            for column, text in enumerate((sample.name, labels, self._format(sample))):
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(text))
+                elif item.text() != text:
+                    item.setText(text)
+        self.table.resizeColumnToContents(0)
+
+    @staticmethod
+    def _format(sample) -> str:
+        value = sample.value
+        if sample.kind == "histogram":
+            if not value.count:
+                return "нет данных"
+            return (f"n={value.count}, среднее {value.sum / value.count:g}, "
+                    f"p50 ≤ {value.quantile(0.5):g}, p95 ≤ {value.quantile(0.95):g}")
+        if value is None:
+            return "‒"
+        if isinstance(value, bool):
+            return "да" if value else "нет"
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return str(value)
@@ -0,0 +1,143 @@
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QVariant
+from main_imports import *
+
+from EepromTransfer import write_bin, write_intel_hex, write_csv
+
+# форматы выгрузки: фильтр диалога -> функция записи
+EXPORT_FORMATS = {
+    "Двоичный образ (*.bin)": lambda path, data, start: write_bin(path, data),
+    "Intel HEX (*.hex)": write_intel_hex,
+    "CSV (*.csv)": write_csv,
+}
+
+
+class EepromModel(QAbstractTableModel):
+    """Образ EEPROM для QTableView: строка ‒ байт, столбцы «Адрес», «0x», «dec».
+
+    Хранит один bytes и ничего не создаёт заранее: текст ячейки собирается
+    в data() только для строк, которые видит QTableView.
+    """
+
+    HEADERS = ("Адрес", "0x", "dec")
+    _HEX = [f"0x{b:02X}" for b in range(256)]
+    _DEC = [str(b) for b in range(256)]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.image = b""
+        self.start = 0
+
+    def set_image(self, data: bytes, start: int = 0):
+        self.beginResetModel()
+        self.image = bytes(data)
+        self.start = start
+        self.endResetModel()
+
+    # ----------  QAbstractTableModel  ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.image)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignRight | Qt.AlignVCenter
+        if role != Qt.DisplayRole or not index.isValid():
+            return QVariant()
+        row, col = index.row(), index.column()
+        if col == 0:
+            return f"0x{self.start + row:04X}"
+        value = self.image[row]
+        return self._HEX[value] if col == 1 else self._DEC[value]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return QVariant()
+
+    # ----------  выгрузка  ----------
+    def export(self, path: str, name_filter: str):
+        EXPORT_FORMATS[name_filter](path, self.image, self.start)
+
+
+class ParameterModel(QAbstractTableModel):
+    """Параметры ParameterStore: значение в контроллере и новое (редактируется).
+
+    Изменённые, но не записанные строки подсвечиваются. changed ‒ после
+    каждой правки, invalid(текст) ‒ если значение не подходит к типу.
+    """
+    changed = pyqtSignal()
+    invalid = pyqtSignal(str)
+
+    HEADERS = ("Параметр", "Адрес", "Тип", "В контроллере", "Новое значение")
+    VALUE_COLUMN = 4
+    EDITED_BRUSH = QBrush(QColor(255, 243, 176))
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+
+    def refresh(self):
+        """Тень или правки поменялись целиком (чтение, запись, сброс)."""
+        if self.store.parameters:
+            self.dataChanged.emit(self.index(0, 3), self.index(len(self.store.parameters) - 1, 4))
+        self.changed.emit()
+
+    @staticmethod
+    def _text(value) -> str:
+        if value is None:
+            return "?"
+        return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+    # ----------  QAbstractTableModel  ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store.parameters)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == self.VALUE_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        p = self.store.parameters[index.row()]
+        col = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if col == 0:
+                return p.name
+            if col == 1:
+                return f"0x{p.address:04X}"
+            if col == 2:
+                return f"{p.type}{p.width * 8}"
+            if col == 3:
+                return self._text(self.store.device_value(p.name))
+            return self._text(self.store.value(p.name))
+        if role == Qt.BackgroundRole and self.store.is_edited(p.name):
+            return self.EDITED_BRUSH
+        if role == Qt.ToolTipRole and p.description:
+            return p.description
+        return QVariant()
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or index.column() != self.VALUE_COLUMN:
+            return False
+        p = self.store.parameters[index.row()]
+        try:
+            self.store.set(p.name, p.parse(str(value)))
+        except ValueError as e:
+            self.invalid.emit(str(e))
+            return False
+        self.dataChanged.emit(self.index(index.row(), 0), self.index(index.row(), self.VALUE_COLUMN))
+        self.changed.emit()
+        return True
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return QVariant()
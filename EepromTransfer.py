@@ -0,0 +1,304 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from errors import EEPROM_TRANSFER_FAILED, REQUEST_TIMEOUT, REPLY_LOST
+
+EEPROM_SIZE = 64 * 1024
+MAX_CHUNK = 255          # счётчик байт в команде 0x11 и длина ответа 0xCC ‒ один байт
+MAX_WRITE = 253          # данных в команде 0x10: длина пакета (2 байта адреса + данные) ‒ один байт
+
+
+class EepromDump:
+    """Чтение произвольного диапазона EEPROM конвейером запросов 0x11.
+
+    Диапазон режется на куски до MAX_CHUNK байт, одновременно в полёте
+    держится до window запросов. send(адрес, число байт) ставит запрос в
+    очередь и возвращает Future из Correlator: результат ‒ пакет ответа,
+    исключение ‒ REQUEST_TIMEOUT или DEVICE_ERROR.
+
+    Ответ 0xCC Correlator узнаёт только по длине, поэтому соседние куски
+    имеют разную длину (chunk, chunk-1, ...), а двух запросов одной длины
+    в полёте не бывает. Неудачный кусок перезапрашивается (не больше
+    retries раз); после просрочки новые запросы выжидают timeout, чтобы
+    опоздавший ответ не достался чужому запросу.
+    """
+
+    def __init__(self, start: int, length: int, send, chunk: int = MAX_CHUNK, window: int = 4,
+                 timeout: float = 0.5, retries: int = 3):
+        if start < 0 or length <= 0 or start + length > EEPROM_SIZE:
+            raise ValueError(f"Диапазон EEPROM вне 0..{EEPROM_SIZE - 1}")
+        chunk = max(1, min(chunk, MAX_CHUNK))
+        self.start = start
+        self.length = length
+        self.send = send                  # send(address, count) -> Future
+        self.window = max(1, window)
+        self.timeout = timeout
+        self.retries = retries
+
+        self.chunks = []
+        address = start
+        while address < start + length:
+            size = chunk - len(self.chunks) % self.window if chunk > self.window else chunk
+            size = min(size, start + length - address)
+            self.chunks.append((address, size))
+            address += size
+        self._todo = deque(range(len(self.chunks)))
+        self._in_flight = {}              # номер куска -> Future
+        self._finished = deque()          # (номер куска, Future) в порядке завершения
+        self._data = [None] * len(self.chunks)
+        self._tries = [0] * len(self.chunks)
+        self._cond = threading.Condition()
+        self._failure = None              # причина остановки (строка)
+        self._quiet_until = 0.0
+
+        self.bytes_done = 0
+        self.requests_sent = 0
+        self.retried = 0
+        self.elapsed = 0.0
+
+    @property
+    def bytes_per_s(self) -> float:
+        return self.bytes_done / self.elapsed if self.elapsed else 0.0
+
+    def cancel(self):
+        with self._cond:
+            self._failure = "Чтение EEPROM отменено"
+            self._cond.notify()
+
+    def _on_done(self, index: int, future):
+        # колбэк Future ‒ из потока чтения порта или потока сроков Correlator
+        with self._cond:
+            self._finished.append((index, future))
+            self._cond.notify()
+
+    def _collect(self, index: int, future):
+        del self._in_flight[index]
+        if future.cancelled():
+            self._failure = "Чтение EEPROM отменено"
+            return
+        error = future.exception()
+        if error is None:
+            self._data[index] = bytes(future.result()["EEPROM_READ"])
+            self.bytes_done += len(self._data[index])
+            return
+        if isinstance(error, REQUEST_TIMEOUT) and not isinstance(error, REPLY_LOST):
+            self._quiet_until = time.monotonic() + self.timeout
+        self._tries[index] += 1
+        if self._tries[index] > self.retries:
+            self._failure = f"EEPROM 0x{self.chunks[index][0]:04X}: {error} (после {self.retries} повторов)"
+            return
+        self.retried += 1
+        self._todo.appendleft(index)
+
+    def _sendable(self, index: int) -> bool:
+        # повторный кусок может совпасть по длине с тем, что уже в полёте ‒ ждём
+        size = self.chunks[index][1]
+        return all(self.chunks[i][1] != size for i in self._in_flight)
+
+    def run(self, progress=None) -> bytes:
+        """Прочитать диапазон целиком; progress(прочитано, всего) ‒ после каждого куска."""
+        started = time.perf_counter()
+        reported = -1
+        with self._cond:
+            while True:
+                while self._finished:
+                    self._collect(*self._finished.popleft())
+                if self._failure:
+                    self.elapsed = time.perf_counter() - started
+                    raise EEPROM_TRANSFER_FAILED(self._failure)
+                if not self._todo and not self._in_flight:
+                    break
+
+                now = time.monotonic()
+                while (self._todo and len(self._in_flight) < self.window and now >= self._quiet_until
+                       and self._sendable(self._todo[0])):
+                    index = self._todo.popleft()
+                    future = self.send(*self.chunks[index])
+                    self._in_flight[index] = future
+                    self.requests_sent += 1
+                    future.add_done_callback(lambda f, i=index: self._on_done(i, f))
+
+                if progress and self.bytes_done != reported:
+                    reported = self.bytes_done
+                    self._cond.release()
+                    try:
+                        progress(self.bytes_done, self.length)
+                    finally:
+                        self._cond.acquire()
+                    continue
+
+                if not self._finished:
+                    self._cond.wait(max(self._quiet_until - now, 0.001) if not self._in_flight else None)
+
+        self.elapsed = time.perf_counter() - started
+        if progress and self.bytes_done != reported:
+            progress(self.bytes_done, self.length)
+        return b"".join(self._data)
+
+
+# ----------  запись  ----------
+def plan_writes(changes: dict, known=None, max_gap: int = 0, max_block: int = MAX_WRITE,
+                page_size: int | None = None) -> list:
+    """{адрес: байт} -> [(адрес, данные), ...] ‒ как можно меньше команд 0x10.
+
+    Соседние изменённые байты идут одной командой (не длиннее max_block).
+    Разрыв до max_gap байт тоже закрывается одной командой ‒ если known
+    (адрес -> байт или None) знает, что там лежит, и его можно переписать
+    тем же значением; по умолчанию (0) пишутся только изменённые байты.
+    page_size ‒ не пересекать границы страниц микросхемы.
+    """
+    blocks = []
+    for address in sorted(changes):
+        if blocks:
+            start, data = blocks[-1]
+            end = start + len(data)
+            gap = address - end
+            fill = [known(a) for a in range(end, address)] if 0 < gap <= max_gap and known else None
+            same_page = page_size is None or start // page_size == address // page_size
+            if (gap == 0 or (fill and None not in fill)) and same_page \
+                    and address - start + 1 <= max_block:
+                data.extend(fill or ())
+                data.append(changes[address])
+                continue
+        blocks.append((address, bytearray([changes[address]])))
+    return [(start, bytes(data)) for start, data in blocks]
+
+
+def read_ranges(blocks: list, max_gap: int = 32) -> list:
+    """Диапазоны чтения для проверки блоков: близкие блоки читаются одним диапазоном."""
+    ranges = []
+    for start, data in sorted(blocks):
+        end = start + len(data)
+        if ranges and start - (ranges[-1][0] + ranges[-1][1]) <= max_gap:
+            first = ranges[-1][0]
+            ranges[-1] = (first, max(end, first + ranges[-1][1]) - first)
+        else:
+            ranges.append((start, len(data)))
+    return ranges
+
+
+class EepromWrite:
+    """Запись блоков командами 0x10 с проверкой чтением.
+
+    Все команды записи ставятся в очередь сразу: подтверждения у них нет,
+    а ответы на чтение контроллер выдаёт после выполненных перед ними
+    записей. Затем записанное читается обратно (EepromDump, близкие блоки ‒
+    одним диапазоном) и сравнивается; несовпавшие блоки пишутся повторно,
+    не больше retries раз. send_write(адрес, данные) и send_read(адрес,
+    число байт) возвращают Future из Correlator.
+    """
+
+    def __init__(self, blocks: list, send_write, send_read, window: int = 4, timeout: float = 0.5,
+                 retries: int = 2):
+        for address, data in blocks:
+            if not 0 < len(data) <= MAX_WRITE or address < 0 or address + len(data) > EEPROM_SIZE:
+                raise ValueError(f"Блок записи 0x{address:04X} ({len(data)} байт) вне EEPROM или длиннее "
+                                 f"{MAX_WRITE} байт")
+        self.blocks = list(blocks)
+        self.send_write = send_write
+        self.send_read = send_read
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+        self._dump = None
+        self._cancelled = False
+
+        self.bytes_total = sum(len(data) for _, data in blocks)
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self.rewritten = 0
+        self.elapsed = 0.0
+
+    def cancel(self):
+        self._cancelled = True
+        if self._dump:
+            self._dump.cancel()
+
+    def run(self, progress=None) -> list:
+        """Записать и проверить; возвращает проверенные блоки. progress(проверено байт, всего)."""
+        started = time.perf_counter()
+        pending = self.blocks
+        verified = 0
+        try:
+            for attempt in range(self.retries + 1):
+                writes = []
+                for address, data in pending:
+                    writes.append(self.send_write(address, data))
+                    self.packets_sent += 1
+                    self.bytes_sent += len(data)
+                mismatched = []
+                for start, length in read_ranges(pending):
+                    if self._cancelled:
+                        raise EEPROM_TRANSFER_FAILED("Запись EEPROM отменена")
+                    self._dump = EepromDump(start, length, self.send_read, window=self.window,
+                                            timeout=self.timeout)
+                    image = self._dump.run()
+                    for address, data in pending:
+                        if start <= address < start + length:
+                            offset = address - start
+                            if image[offset:offset + len(data)] == data:
+                                verified += len(data)
+                            else:
+                                mismatched.append((address, data))
+                    if progress:
+                        progress(verified, self.bytes_total)
+                if not mismatched:
+                    return self.blocks
+                self.rewritten += len(mismatched)
+                logging.warning(f"EEPROM: {len(mismatched)} блоков не совпали при проверке "
+                                f"(попытка {attempt + 1})")
+                pending = mismatched
+            address = pending[0][0]
+            errors = [f.exception() for f in writes if f.done() and not f.cancelled() and f.exception()]
+            reason = f": {errors[0].args[0]}" if errors else ""
+            raise EEPROM_TRANSFER_FAILED(
+                f"EEPROM 0x{address:04X}: записанное не совпадает с прочитанным "
+                f"(блоков {len(pending)}, после {self.retries} повторов){reason}")
+        finally:
+            self._dump = None
+            self.elapsed = time.perf_counter() - started
+
+
+# ----------  выгрузка образа в файл  ----------
+_HEX = [f"{b:02X}" for b in range(256)]
+
+
+def write_bin(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_intel_hex(path: str, data: bytes, start: int = 0, record_size: int = 16):
+    """Intel HEX: записи данных (00) по record_size байт, расширенный линейный
+    адрес (04) при переходе через границу 64 КБ, в конце ‒ конец файла (01)."""
+    lines = []
+    upper = 0
+    offset = 0
+    while offset < len(data):
+        address = start + offset
+        if address >> 16 != upper:
+            upper = address >> 16
+            lines.append(_hex_record(0, 0x04, upper.to_bytes(2, "big")))
+        # запись не должна пересекать границу 64 КБ
+        size = min(record_size, len(data) - offset, 0x10000 - (address & 0xFFFF))
+        lines.append(_hex_record(address & 0xFFFF, 0x00, data[offset:offset + size]))
+        offset += size
+    lines.append(_hex_record(0, 0x01, b""))
+    with open(path, "w", newline="\n") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _hex_record(address: int, kind: int, payload: bytes) -> str:
+    record = bytes([len(payload), address >> 8, address & 0xFF, kind]) + bytes(payload)
+    checksum = -sum(record) & 0xFF
+    return ":" + record.hex().upper() + _HEX[checksum]
+
+
+def write_csv(path: str, data: bytes, start: int = 0):
+    """CSV «адрес,0x,dec» ‒ те же столбцы, что и в окне EEPROM."""
+    dec = [str(b) for b in range(256)]
+    with open(path, "w", newline="\n") as f:
+        f.write("address,hex,dec\n")
+        f.writelines(f"{start + i},0x{_HEX[b]},{dec[b]}\n" for i, b in enumerate(data))
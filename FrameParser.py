@@ -0,0 +1,239 @@
+import re
+import struct
+from time import monotonic_ns
+
+import numpy as np
+
+# ----------  протокол контроллера  ----------
+SYNC_EXCHANGE = 0xAA
+SYNC_ERROR    = 0xBB
+SYNC_EPROM    = 0xCC
+SYNC_BYTES    = (SYNC_EXCHANGE, SYNC_ERROR, SYNC_EPROM)
+
+EPROM_READ_REPLY = 0x12
+
+# Кадр обмена: AA len1 len4 + len1 однобайтных + len4 четырёхбайтных полей.
+# Контроллер передаёт len1 = 5, len4 = 6 (итого 29 байт полезной нагрузки).
+EXCHANGE_LEN1    = 5
+EXCHANGE_LEN4    = 6
+EXCHANGE_PAYLOAD = EXCHANGE_LEN1 + 4 * EXCHANGE_LEN4
+EXCHANGE_FRAME   = 3 + EXCHANGE_PAYLOAD
+
+STATE_FIELDS = ("ForVacuumState", "TMNState", "DU16", "DU63", "ElectroValveState")
+WORD_FIELDS  = ("TMNrpm", "MIDA", "Magdischarge", "ThermalIndicator", "TEMP1", "TEMP2")
+EXCHANGE_FIELDS = STATE_FIELDS + WORD_FIELDS
+
+# Кадр целиком, как он лежит на линии: можно разбирать np.frombuffer без копирования полей
+EXCHANGE_DTYPE = np.dtype(
+    [("sync", "u1"), ("len1", "u1"), ("len4", "u1")]
+    + [(name, "u1") for name in STATE_FIELDS]
+    + [("TMNrpm", "<u4")]
+    + [(name, "<f4") for name in WORD_FIELDS[1:]]
+)
+assert EXCHANGE_DTYPE.itemsize == EXCHANGE_FRAME
+
+_ERROR_HEADER    = struct.Struct("<3B")     # CMD_ID, ERROR_CODE, длина
+_EPROM_HEADER    = struct.Struct("<2B")     # CMD_ID, длина
+
+_SYNC_RE = re.compile(b"[\xaa\xbb\xcc]")
+
+
+# ----------  сборка пакетов (обратное разбору: симулятор, воспроизведение)  ----------
+def encode_exchange(values: dict) -> bytes:
+    """Кадр обмена из словаря полей (отсутствующие поля ‒ нули)."""
+    frame = np.zeros(1, dtype=EXCHANGE_DTYPE)
+    frame["sync"], frame["len1"], frame["len4"] = SYNC_EXCHANGE, EXCHANGE_LEN1, EXCHANGE_LEN4
+    for name in EXCHANGE_FIELDS:
+        if name in values:
+            frame[name] = values[name]
+    return frame.tobytes()
+
+
+def encode_error(cmd_id: int, error_code: int, info: bytes = b"") -> bytes:
+    return bytes([SYNC_ERROR, cmd_id, error_code, len(info)]) + info
+
+
+def encode_eeprom_reply(data: bytes) -> bytes:
+    return bytes([SYNC_EPROM, EPROM_READ_REPLY, len(data)]) + bytes(data)
+
+
+class ExchangeBatch:
+    """Пачка кадров обмена в столбцовом виде.
+
+    batch["MIDA"] ‒ массив значений канала по всем кадрам пачки (view, без копий).
+    batch.t_ns ‒ монотонное время чтения каждого кадра, нс (time.monotonic_ns).
+    batch.device ‒ идентификатор контроллера, с которого пришли кадры.
+    """
+
+    __slots__ = ("records", "t_ns", "device")
+
+    def __init__(self, records: np.ndarray, t_ns: np.ndarray, device: str | None = None):
+        self.records = records
+        self.t_ns = t_ns
+        self.device = device
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.records[name]
+
+    def last(self) -> dict:
+        """Последний кадр пачки в виде привычного словаря."""
+        rec = self.records[-1]
+        return {name: rec[name].item() for name in EXCHANGE_FIELDS}
+
+    def to_dicts(self) -> list:
+        return [dict(zip(EXCHANGE_FIELDS, row)) for row in self.records[list(EXCHANGE_FIELDS)].tolist()]
+
+    @classmethod
+    def concat(cls, batches) -> "ExchangeBatch":
+        return cls(np.concatenate([b.records for b in batches]),
+                   np.concatenate([b.t_ns for b in batches]), batches[0].device)
+
+
+class FrameParser:
+    """Потоковый разборщик кадров контроллера.
+
+    Не зависит от pyserial: байты подаются через feed() любыми кусками,
+    незаконченный кадр сохраняется до следующего вызова.
+    """
+
+    def __init__(self, device: str | None = None):
+        self.device = device      # идентификатор контроллера ‒ попадает в каждый пакет
+        self._buf = bytearray()
+        self.resyncs = 0          # сколько раз пропускали мусор до синхробайта
+        self._skipping = False    # прошлый кусок кончился мусором: его продолжение ‒ та же пересинхронизация
+        self.length_errors = 0    # кадры обмена с неверными len1/len4
+        self.frames = 0           # всего разобранных кадров
+        self.frame_counts = {"exchange": 0, "error": 0, "eeprom": 0}
+
+    def reset(self):
+        """Сбросить недочитанный хвост (например, после переподключения)."""
+        self._buf.clear()
+        self._skipping = False
+
+    @property
+    def pending(self) -> int:
+        """Сколько байт ждут продолжения кадра."""
+        return len(self._buf)
+
+    def feed(self, data: bytes, t_ns: int | None = None) -> list:
+        """Добавить байты и вернуть разобранные пакеты в порядке прихода.
+
+        Подряд идущие кадры обмена собираются в один ExchangeBatch,
+        пакеты ошибок и EEPROM возвращаются словарями (с ключами "T_NS", "DEVICE").
+        t_ns ‒ момент чтения data (monotonic_ns); им помечаются все
+        кадры, законченные этим куском.
+        """
+        if t_ns is None:
+            t_ns = monotonic_ns()
+        buf = self._buf
+        buf += data
+        n = len(buf)
+        pos = 0
+        packets = []
+
+        while pos < n:
+            sync = buf[pos]
+            if sync == SYNC_EXCHANGE:
+                if n - pos < 3:
+                    break
+                if buf[pos + 1] != EXCHANGE_LEN1 or buf[pos + 2] != EXCHANGE_LEN4:
+                    self.length_errors += 1
+                    pos += 1
+                    continue
+                count = self._exchange_run(buf, pos, n)
+                if count == 0:
+                    break
+                end = pos + count * EXCHANGE_FRAME
+                # одна копия на всю серию кадров, буфер после этого свободен
+                packets.append(ExchangeBatch(
+                    np.frombuffer(buf, dtype=EXCHANGE_DTYPE, count=count, offset=pos).copy(),
+                    np.full(count, t_ns, dtype=np.uint64), self.device))
+                self.frames += count
+                self.frame_counts["exchange"] += count
+                self._skipping = False
+                pos = end
+                continue
+
+            if sync == SYNC_ERROR:
+                if n - pos < 4:
+                    break
+                cmd_id, error_code, length = _ERROR_HEADER.unpack_from(buf, pos + 1)
+                end = pos + 4 + length
+                if end > n:
+                    break
+                if not self._followed_by_sync(buf, end, n):
+                    pos += 1
+                    continue
+                kind = "error"
+                packet = {
+                    "CMD_ID":     cmd_id,
+                    "ERROR_CODE": error_code,
+                    "ERROR_INFO": bytes(buf[pos + 4:end]),
+                    "T_NS":       t_ns,
+                    "DEVICE":     self.device,
+                }
+
+            elif sync == SYNC_EPROM:
+                if n - pos < 3:
+                    break
+                cmd_id, length = _EPROM_HEADER.unpack_from(buf, pos + 1)
+                if cmd_id != EPROM_READ_REPLY:
+                    self.resyncs += 1
+                    pos += 1
+                    continue
+                end = pos + 3 + length
+                if end > n:
+                    break
+                kind = "eeprom"
+                packet = {"EEPROM_READ": list(buf[pos + 3:end]), "T_NS": t_ns, "DEVICE": self.device}
+
+            else:
+                # мусор между кадрами ‒ прыгаем сразу к следующему синхробайту
+                if not (self._skipping and pos == 0):
+                    self.resyncs += 1
+                match = _SYNC_RE.search(buf, pos)
+                pos = match.start() if match else n
+                self._skipping = match is None
+                continue
+
+            packets.append(packet)
+            self.frames += 1
+            self.frame_counts[kind] += 1
+            self._skipping = False
+            pos = end
+
+        del buf[:pos]
+        return packets
+
+    @staticmethod
+    def _exchange_run(buf, pos: int, n: int) -> int:
+        """Сколько целых кадров обмена с верным заголовком подряд начинается с pos (0 ‒ первый ещё не дочитан).
+
+        Заголовок (AA, len1, len4) проверяется у каждого кадра, поэтому кадр
+        принимается независимо от того, что идёт за ним: мусор после серии
+        пропускается уже на следующем шаге разбора.
+        """
+        total = (n - pos) // EXCHANGE_FRAME
+        if total == 0:
+            return 0
+        # заголовки всех кадров проверяем разом; view отпускаем до изменения буфера
+        heads = np.frombuffer(buf, dtype=EXCHANGE_DTYPE, count=total, offset=pos)
+        ok = (heads["sync"] == SYNC_EXCHANGE) & (heads["len1"] == EXCHANGE_LEN1) \
+            & (heads["len4"] == EXCHANGE_LEN4)
+        count = total if ok.all() else int(ok.argmin())
+        del heads, ok
+        return count
+
+    def _followed_by_sync(self, buf, end: int, n: int) -> bool:
+        """Пакет ошибки принимается, только если за ним идёт синхробайт или конец данных.
+
+        У него в заголовке нечего проверить (любые CMD_ID, код и длина),
+        поэтому так ложный 0xBB внутри мусора не «съедает» следующие кадры.
+        """
+        if end == n or buf[end] in SYNC_BYTES:
+            return True
+        self.resyncs += 1
+        return False
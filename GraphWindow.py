@@ -1,10 +1,25 @@
+from time import perf_counter
+
+from PyQt5.QtWidgets import QComboBox, QHeaderView
 from main_imports import *
+import pyqtgraph as pg
+from Decimation import MinMaxPyramid
+from Metrics import Histogram, UPDATE_BUCKETS_MS
+from RollingStats import RollingStats, PUMPDOWN_TARGET
 
 class GraphPanel(QWidget):
-    def __init__(self):
+    CHANNELS = ("MIDA", "Magdischarge", "ThermalIndicator")
+
+    def __init__(self, history: int = 1_000_000):
+        """history ‒ сколько последних отсчётов каждого канала хранить.
+
+        На экран уходит не вся история, а уровень пирамиды min/max,
+        дающий 1‒2 точки на пиксель видимого диапазона.
+        """
         super().__init__()
         layout = QVBoxLayout()
         self.setLayout(layout)
+        self.history = history
 
         self.plots = []
         self.curves = []
@@ -13,30 +28,146 @@ class GraphPanel(QWidget):
 
         for i in range(3):
             plot = pg.PlotWidget()
-            curve = plot.plot(np.zeros(100), pen='g')
+            curve = plot.plot(pen='g')
             vline = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen('r', width=1.5))
+            vline.hide()
             plot.addItem(vline)
 
+            # пользователь приблизил/сдвинул график ‒ подбираем уровень детализации заново
+            plot.getViewBox().sigRangeChangedManually.connect(lambda _, i=i: self.redraw(i))
+
             self.plots.append(plot)
             self.curves.append(curve)
             self.vlines.append(vline)
-            self.data.append(np.zeros(100))
+            self.data.append(MinMaxPyramid(history))
             layout.addWidget(plot)
 
-        self.current_index = 0
-        self.mark_requested = False
+        # абсолютный индекс отсчёта, отмеченного mark_event (None ‒ отметки нет)
+        self.mark_index = None
+        self.update_time = Histogram(UPDATE_BUCKETS_MS)    # длительность update_plots, мс
 
-    def update_plots(self, actual_data):
-        if self.current_index > 0:
-            self.current_index -= 1
-        for i in range(3):
-            self.data[i] = np.roll(self.data[i], -1)
-            self.data[i][-1] = actual_data[i]
-            self.curves[i].setData(self.data[i])
-            if self.current_index:
-                self.vlines[i].setValue(self.current_index)
+    def update_plots(self, batch):
+        """batch ‒ ExchangeBatch (или любой объект с batch[канал] -> массив).
+
+        Скрытая панель (другое устройство) только копит историю,
+        перерисовка ‒ при показе.
+        """
+        started = perf_counter()
+        visible = self.isVisible()
+        for i, name in enumerate(self.CHANNELS):
+            ring = self.data[i]
+            ring.extend(batch[name])
+            if visible:
+                self.redraw(i)
+
+            if self.mark_index is not None:
+                if self.mark_index >= ring.first_index:
+                    self.vlines[i].setValue(self.mark_index)
+                    self.vlines[i].show()
+                else:
+                    self.vlines[i].hide()    # отмеченный отсчёт уже вытеснен из истории
+        self.update_time.observe((perf_counter() - started) * 1000)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        for i in range(len(self.CHANNELS)):
+            self.redraw(i)
+
+    def redraw(self, i: int):
+        ring = self.data[i]
+        view_box = self.plots[i].getViewBox()
+        if view_box.autoRangeEnabled()[0]:
+            start, stop = ring.first_index, ring.total
+        else:
+            x_min, x_max = view_box.viewRange()[0]
+            start, stop = int(x_min), int(x_max) + 1
+        # по оси X ‒ абсолютный номер отсчёта, поэтому отметка не «съезжает» при переполнении кольца
+        x, y = ring.select(start, stop, max(int(view_box.width()), 100))
+        self.curves[i].setData(x, y)
+
+    def clear(self):
+        """Забыть историю (например, перед загрузкой записи из SessionQuery)."""
+        self.data = [MinMaxPyramid(self.history) for _ in self.CHANNELS]
+        self.mark_index = None
+        for i, vline in enumerate(self.vlines):
+            vline.hide()
+            self.plots[i].enableAutoRange()
+            self.redraw(i)
 
     def mark_event(self):
-        self.mark_requested = True
-        self.current_index = 100
+        # отмечаем следующий пришедший отсчёт
+        self.mark_index = self.data[0].total
+
+
+class StatsPanel(QWidget):
+    """Скользящая статистика каналов (RollingStats) за выбранное окно и оценка времени откачки.
+
+    Обновляется раз в секунду, пока видна; статистику считает RollingStats
+    в потоке порта, здесь только чтение готовых значений.
+    """
+    REFRESH_MS = 1000
+    COLUMNS = ("Канал", "Среднее", "СКО", "Мин", "Макс", "Скорость, /с")
+
+    def __init__(self, stats: RollingStats):
+        super().__init__()
+        self.stats = stats
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Окно:"))
+        self.window_select = QComboBox()
+        self.window_select.addItems([self._window_text(w) for w in stats.windows])
+        self.window_select.currentIndexChanged.connect(self.refresh)
+        top.addWidget(self.window_select)
+        self.eta_label = QLabel("")
+        top.addWidget(self.eta_label, stretch=1)
+        layout.addLayout(top)
+
+        self.table = QTableWidget(len(stats.channels), len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        for row, channel in enumerate(stats.channels):
+            self.table.setItem(row, 0, QTableWidgetItem(channel))
+            for column in range(1, len(self.COLUMNS)):
+                self.table.setItem(row, column, QTableWidgetItem(""))
+        self.table.setFixedHeight(self.table.verticalHeader().length() + self.table.horizontalHeader().height() + 4)
+        layout.addWidget(self.table)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    @staticmethod
+    def _window_text(seconds: float) -> str:
+        return f"{seconds / 60:g} мин" if seconds >= 60 else f"{seconds:g} с"
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start(self.REFRESH_MS)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
+    def refresh(self):
+        window = self.stats.windows[self.window_select.currentIndex()]
+        snapshot = self.stats.snapshot()
+        for row, channel in enumerate(self.stats.channels):
+            s = snapshot[channel][window]
+            for column, value in enumerate((s.mean, s.std, s.min, s.max, s.rate), 1):
+                text = "‒" if value != value else f"{value:.4g}"
+                item = self.table.item(row, column)
+                if item.text() != text:
+                    item.setText(text)
 
+        eta = self.stats.pumpdown_eta()
+        if eta is None:
+            self.eta_label.setText("")
+        elif eta == 0:
+            self.eta_label.setText(f"Давление ниже 1e{PUMPDOWN_TARGET:g}")
+        else:
+            self.eta_label.setText(f"До 1e{PUMPDOWN_TARGET:g}: ~{eta / 60:.0f} мин" if eta >= 60
+                                   else f"До 1e{PUMPDOWN_TARGET:g}: ~{eta:.0f} с")
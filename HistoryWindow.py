@@ -0,0 +1,175 @@
+import threading
+
+from PyQt5.QtWidgets import QDateTimeEdit, QFileDialog, QProgressBar
+from PyQt5.QtCore import QDateTime
+from main_imports import *
+from GraphWindow import GraphPanel
+from SessionQuery import SessionQuery, decimate, format_times
+
+
+class HistoryWindow(QWidget):
+    """Просмотр записанных сеансов: интервал времени -> графики GraphPanel и выгрузка в CSV/NPZ.
+
+    Выборка идёт в отдельном потоке кусками SessionQuery; длинный интервал
+    прореживается огибающей min/max, чтобы в панель попало не больше
+    HISTORY_POINTS отсчётов на канал.
+    """
+    HISTORY_POINTS = 1_000_000
+    loaded = pyqtSignal(object, str)            # список QueryChunk, подпись
+    progress = pyqtSignal(int, int)             # записей обработано, всего
+    failed = pyqtSignal(str)
+
+    def __init__(self, directory: str = "records"):
+        super().__init__()
+        self.setWindowTitle("История записей")
+        self.setGeometry(150, 150, 1100, 800)
+        layout = QVBoxLayout(self)
+
+        top = QHBoxLayout()
+        top.addWidget(QLabel("Каталог:"))
+        self.directory_edit = QLineEdit(directory)
+        top.addWidget(self.directory_edit, stretch=1)
+        self.browse_button = QPushButton("…")
+        self.browse_button.clicked.connect(self.browse)
+        top.addWidget(self.browse_button)
+        top.addWidget(QLabel("с"))
+        self.start_edit = QDateTimeEdit(QDateTime.currentDateTime().addSecs(-3600))
+        self.end_edit = QDateTimeEdit(QDateTime.currentDateTime())
+        for edit in (self.start_edit, self.end_edit):
+            edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+            edit.setCalendarPopup(True)
+        top.addWidget(self.start_edit)
+        top.addWidget(QLabel("по"))
+        top.addWidget(self.end_edit)
+        self.whole_button = QPushButton("Весь сеанс")
+        self.whole_button.clicked.connect(self.select_whole)
+        top.addWidget(self.whole_button)
+        self.load_button = QPushButton("Загрузить")
+        self.load_button.clicked.connect(self.load)
+        top.addWidget(self.load_button)
+        self.export_button = QPushButton("Выгрузить…")
+        self.export_button.clicked.connect(self.export)
+        top.addWidget(self.export_button)
+        layout.addLayout(top)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar)
+
+        self.graph = GraphPanel(history=self.HISTORY_POINTS)
+        layout.addWidget(self.graph, stretch=1)
+
+        self.loaded.connect(self.show_chunks)
+        self.progress.connect(self.show_progress)
+        self.failed.connect(self.show_error)
+        self._thread = None
+
+    # ----------  интервал  ----------
+    def _session(self) -> SessionQuery:
+        session = SessionQuery(self.directory_edit.text())
+        if not session.segments:
+            raise ValueError(f"В каталоге {self.directory_edit.text()} нет записей")
+        return session
+
+    def _interval(self) -> tuple:
+        start = self.start_edit.dateTime().toMSecsSinceEpoch() * 1_000_000
+        end = self.end_edit.dateTime().toMSecsSinceEpoch() * 1_000_000 + 999_999_999
+        if end <= start:
+            raise ValueError("Конец интервала раньше начала")
+        return start, end
+
+    def browse(self):
+        directory = QFileDialog.getExistingDirectory(self, "Каталог записей", self.directory_edit.text())
+        if directory:
+            self.directory_edit.setText(directory)
+            self.select_whole()
+
+    def select_whole(self):
+        try:
+            session = self._session()
+        except ValueError as e:
+            self.show_error(str(e))
+            return
+        self.start_edit.setDateTime(QDateTime.fromMSecsSinceEpoch(session.start_ns // 1_000_000))
+        self.end_edit.setDateTime(QDateTime.fromMSecsSinceEpoch(session.end_ns // 1_000_000))
+
+    # ----------  фоновые задачи  ----------
+    def _start(self, target, *args):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        try:
+            session = self._session()
+            start, end = self._interval()
+        except ValueError as e:
+            self.show_error(str(e))
+            return
+        self._set_busy(True)
+        self._thread = threading.Thread(target=self._run, args=(target, session, start, end) + args,
+                                        name="HistoryQuery", daemon=True)
+        self._thread.start()
+
+    def _run(self, target, *args):
+        try:
+            target(*args)
+        except (OSError, ValueError) as e:
+            logging.error(f"Ошибка выборки из записи: {e}")
+            self.failed.emit(str(e))
+
+    def load(self):
+        self._start(self._load)
+
+    def _load(self, session: SessionQuery, start: int, end: int):
+        total = session.count(start, end)
+        # огибающая даёт две точки на блок из factor записей
+        factor = max(-(-2 * total // self.HISTORY_POINTS), 1)
+        chunk_records = factor * max(65536 // factor, 1)
+        chunks = []
+        done = 0
+        for chunk in session.chunks(start, end, GraphPanel.CHANNELS, chunk_records):
+            chunks.append(decimate(chunk, factor))
+            done += len(chunk)
+            self.progress.emit(done, total)
+        text = f"{total} записей"
+        if total:
+            first, last = format_times(chunks[0].wall_ns[:1])[0], format_times(chunks[-1].wall_ns[-1:])[0]
+            text = f"{first} ‒ {last}: {text}" + (f", прорежено min/max по {factor}" if factor > 1 else "")
+        self.loaded.emit(chunks, text)
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Выгрузить интервал", "", "CSV (*.csv);;NumPy (*.npz)")
+        if not path:
+            return
+        if not path.endswith((".csv", ".npz")):
+            path += ".csv"
+        self._start(self._export, path)
+
+    def _export(self, session: SessionQuery, start: int, end: int, path: str):
+        rows = (session.to_npz if path.endswith(".npz") else session.to_csv)(path, start, end)
+        self.loaded.emit(None, f"Выгружено {rows} записей в {path}")
+
+    # ----------  слоты GUI  ----------
+    def _set_busy(self, busy: bool):
+        for button in (self.load_button, self.export_button, self.whole_button):
+            button.setEnabled(not busy)
+        self.progress_bar.setVisible(busy)
+        self.progress_bar.setRange(0, 0)
+
+    def show_progress(self, done: int, total: int):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def show_chunks(self, chunks, text: str):
+        self._set_busy(False)
+        self.status_label.setText(text)
+        if chunks is None:
+            return
+        self.graph.clear()
+        for chunk in chunks:
+            self.graph.update_plots(chunk)
+
+    def show_error(self, message: str):
+        self._set_busy(False)
+        self.status_label.setText("")
+        QMessageBox.warning(self, "История записей", message)
@@ -0,0 +1,211 @@
+"""Настройка журнала приложения.
+
+Вызывается точкой входа, а не при импорте: модули, которые импортируют
+друг друга (или запускаются в дочерних процессах), не должны трогать
+корневой логгер.
+
+Потоки приложения (в первую очередь поток порта) в файл не пишут: запись
+уходит в ограниченную очередь, на диск её переносит фоновый поток
+(QueueListener) с ротацией по размеру. Одинаковые сообщения ‒ не больше
+burst за interval секунд, остальные только считаются и попадают в журнал
+одной строкой «повторилось ещё N раз». Если очередь переполнена, запись
+отбрасывается, а не ждёт диска.
+"""
+import atexit
+import logging
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+_pipeline = None
+
+
+class RepeatLimiter:
+    """Сколько раз подряд встречалось одно и то же сообщение (логгер, уровень, текст)."""
+
+    def __init__(self, burst: int = 5, interval: float = 10.0, max_keys: int = 1000):
+        self.burst = burst
+        self.interval = interval
+        self.max_keys = max_keys
+        self._seen = {}     # ключ -> [начало окна, сообщений в окне, подавлено, последняя подавленная запись]
+
+    def check(self, record: logging.LogRecord) -> list:
+        """Записи, которые нужно передать дальше: [], [record] или [сводка, record]."""
+        key = (record.name, record.levelno, record.getMessage())
+        state = self._seen.get(key)
+        if state is None or record.created - state[0] >= self.interval:
+            out = [self._summary(state)] if state and state[2] else []
+            if state is None and len(self._seen) >= self.max_keys:
+                out += self.flush(record.created)
+            self._seen[key] = [record.created, 1, 0, None]
+            return out + [record]
+        state[1] += 1
+        if state[1] <= self.burst:
+            return [record]
+        state[2] += 1
+        state[3] = record
+        return []
+
+    def flush(self, now: float | None = None) -> list:
+        """Сводки по окнам, которые закончились к now; такие окна забываются."""
+        now = time.time() if now is None else now
+        out = []
+        for key, state in list(self._seen.items()):
+            if now - state[0] >= self.interval:
+                if state[2]:
+                    out.append(self._summary(state))
+                del self._seen[key]
+        return out
+
+    @staticmethod
+    def _summary(state) -> logging.LogRecord:
+        started, _, suppressed, last = state
+        return logging.makeLogRecord(dict(
+            last.__dict__, args=None, exc_info=None, exc_text=None,
+            msg=f"{last.getMessage()} ‒ повторилось ещё {suppressed} раз "
+                f"за {last.created - started:.0f} с"))
+
+
+class LimitedQueueHandler(QueueHandler):
+    """QueueHandler, который не ждёт: повторы ограничивает, при полной очереди теряет запись."""
+
+    def __init__(self, log_queue: queue.Queue, limiter: RepeatLimiter | None = None):
+        super().__init__(log_queue)
+        self.limiter = limiter
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord):
+        records = self.limiter.check(record) if self.limiter else [record]
+        for item in records:
+            super().emit(item)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, final: bool = False):
+        """Сводки по закончившимся окнам повторов; final ‒ по всем (перед остановкой)."""
+        if not self.limiter:
+            return
+        with self.lock:
+            for item in self.limiter.flush(float("inf") if final else None):
+                super().emit(item)
+
+
+class CallbackHandler(LimitedQueueHandler):
+    """Готовые к передаче записи ‒ в put (например, очередь событий дочернего процесса)."""
+
+    def __init__(self, put, limiter: RepeatLimiter | None = None):
+        super().__init__(None, limiter)
+        self.put = put
+
+    def enqueue(self, record: logging.LogRecord):
+        self.put(record)
+
+
+class _Listener(QueueListener):
+    """QueueListener, который при остановке ждёт места в очереди под маркер конца.
+
+    Стандартный кладёт маркер через put_nowait и падает с queue.Full, если
+    журнал останавливают, когда очередь забита (медленный диск).
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """Очередь, фоновая запись и периодический вывод сводок повторов."""
+
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, handlers: list, level: int, queue_size: int = 10000,
+                 burst: int = 5, interval: float = 10.0):
+        self.queue = queue.Queue(queue_size)
+        self.handler = LimitedQueueHandler(self.queue, RepeatLimiter(burst, interval))
+        self.handler.setLevel(level)
+        self.listener = _Listener(self.queue, *handlers, respect_handler_level=True)
+        self._stopped = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="LogFlush", daemon=True)
+        self._reported_drops = 0
+
+    def start(self, logger: logging.Logger):
+        self.logger = logger
+        logger.addHandler(self.handler)
+        self.listener.start()
+        self._flusher.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._flusher.join()
+        self._flush(final=True)
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()     # дописывает всё, что осталось в очереди
+        for handler in self.listener.handlers:
+            handler.close()
+
+    def _flush(self, final: bool = False):
+        self.handler.flush(final)
+        dropped = self.handler.dropped
+        if dropped != self._reported_drops:
+            logging.getLogger(__name__).warning(
+                f"Очередь журнала переполнена: потеряно {dropped - self._reported_drops} записей")
+            self._reported_drops = dropped
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.FLUSH_INTERVAL):
+            self._flush()
+
+
+def setup_logging(filename: str | None = "niim.log", level: int = logging.DEBUG,
+                  max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                  console: bool = False) -> LogPipeline:
+    """Журнал через очередь: файл с ротацией (filename) и/или stderr (console)."""
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+    formatter = logging.Formatter(FORMAT)
+    handlers = []
+    if filename:
+        handlers.append(RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups,
+                                            encoding="utf-8"))
+    if console:
+        handlers.append(logging.StreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _pipeline = LogPipeline(handlers, level)
+    root = logging.getLogger()
+    root.setLevel(level)
+    _pipeline.start(root)
+    atexit.register(stop_logging)
+    return _pipeline
+
+
+def stop_logging():
+    """Дописать очередь и закрыть файлы; повторный вызов ничего не делает."""
+    global _pipeline
+    if _pipeline is None:
+        return
+    _pipeline.stop()
+    _pipeline = None
+
+
+def forward_logging(put, level: int = logging.DEBUG, burst: int = 5, interval: float = 10.0
+                    ) -> CallbackHandler:
+    """Журнал дочернего процесса ‒ записями в put, писать их будет родитель.
+
+    Повторы ограничиваются уже здесь, чтобы поток сообщений не забивал
+    очередь между процессами; сводки повторов выдаёт handler.flush().
+    """
+    handler = CallbackHandler(put, RepeatLimiter(burst, interval))
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    return handler
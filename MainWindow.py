@@ -1,11 +1,20 @@
-from PyQt5.QtCore import QThread
+import os
+
+from PyQt5.QtWidgets import QTableView, QHeaderView, QFileDialog, QComboBox
 from main_imports import *
 from ShematicWindow import *
 from GraphWindow import *
-from SerialWorker import SerialWorker
+from EepromModel import EepromModel, ParameterModel, EXPORT_FORMATS
+from ParameterStore import ParameterStore, load_parameter_map, PARAMETERS_FILE
+from DiagnosticsWindow import DiagnosticsWindow
+from AlarmWindow import AlarmWindow
+from HistoryWindow import HistoryWindow
+from Metrics import MetricsRegistry, Sample
 
 
 class EepromWindow(QWidget):
+    read_range_signal = pyqtSignal(int, int)      # начальный адрес, число байт
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Данные EEPROM")
@@ -27,7 +36,7 @@ class EepromWindow(QWidget):
 
         buttons_layout = QHBoxLayout()
         self.generate_button = QPushButton("Прочитать")
-        self.generate_button.clicked.connect(self.generate_table)
+        self.generate_button.clicked.connect(self.read_eeprom_command)
         buttons_layout.addWidget(self.generate_button)
 
         self.save_button = QPushButton("Сохранить")
@@ -36,19 +45,30 @@ class EepromWindow(QWidget):
 
         self.layout.addLayout(buttons_layout)
 
-        self.table = QTableWidget()
+        self.status_label = QLabel("")
+        self.layout.addWidget(self.status_label)
+
+        # модель поверх одного bytes: QTableView запрашивает только видимые строки
+        self.model = EepromModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        # одинаковая высота строк ‒ представлению не нужно мерить каждую из 64 К строк
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(20)
+        self.table.verticalHeader().hide()
         self.layout.addWidget(self.table)
 
-    @pyqtSlot(list)
-    def handle_data(self, data_list: list):
-        self.table.setRowCount(len(data_list))
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Индекс", "0x", "dec"])
+    @pyqtSlot(int, int)
+    def handle_progress(self, done: int, total: int):
+        self.status_label.setText(f"Прочитано {done} из {total} байт")
 
-        for i, val in enumerate(data_list):
-            self.table.setItem(i, 0, QTableWidgetItem(str(i)))
-            self.table.setItem(i, 1, QTableWidgetItem(hex(val)))
-            self.table.setItem(i, 2, QTableWidgetItem(str(val)))
+    @pyqtSlot(int, bytes, float, str)
+    def handle_dump(self, start: int, data: bytes, rate: float, error: str):
+        if error:
+            self.status_label.setText(error)
+            return
+        self.status_label.setText(f"Прочитано {len(data)} байт с 0x{start:04X}, {rate / 1024:.1f} КБ/с")
+        self.model.set_image(data, start)
 
     def read_eeprom_command(self):
         try:
@@ -64,89 +84,171 @@ class EepromWindow(QWidget):
             self.end_input.setPlaceholderText("Ошибка: введите числа")
             return
 
-        count = end - start + 1
-        cmd_id = 0x11  # команда чтения EEPROM
-        address = start
-        num_bytes = bytes([count])
-        self.send_eprom_command_signal.emit(cmd_id, address, num_bytes)
+        # диапазон любой длины ‒ SerialWorker сам режет его на запросы по 255 байт
+        self.status_label.setText("Чтение...")
+        self.read_range_signal.emit(start, end - start + 1)
 
 
     def save_table(self):
-        rows = self.table.rowCount()
-        cols = self.table.columnCount()
-
-        result = []
-        for row in range(rows):
-            row_data = []
-            for col in range(cols):
-                item = self.table.item(row, col)
-                text = item.text() if item else ""
-                row_data.append(text)
-            result.append(row_data)
-
-        # Пример: выводим результат в консоль
-        print("Сохранённые данные:")
-        for r in result:
-            print(r)
+        if not self.model.image:
+            self.status_label.setText("Нечего сохранять ‒ сначала прочитайте EEPROM")
+            return
+        path, name_filter = QFileDialog.getSaveFileName(
+            self, "Сохранить образ EEPROM", f"eeprom_{self.model.start:04X}",
+            ";;".join(EXPORT_FORMATS))
+        if not path:
+            return
+        suffix = name_filter[name_filter.index("*") + 1:-1]     # "CSV (*.csv)" -> ".csv"
+        if not path.endswith(suffix):
+            path += suffix
+        try:
+            self.model.export(path, name_filter)
+        except OSError as e:
+            logging.error(f"Не удалось сохранить образ EEPROM: {e}")
+            self.status_label.setText(f"Ошибка сохранения: {e}")
+            return
+        self.status_label.setText(f"Сохранено: {path}")
 
 class ConfigWidget(QWidget):
-    def __init__(self):
+    """Параметры контроллера по карте parameters.json (NIIM_PARAMETERS).
+
+    «Прочитать» ‒ один диапазон EEPROM, покрывающий все параметры; его
+    содержимое становится тенью. «Записать» отправляет только байты, которые
+    отличаются от тени, и снимает правки после проверки чтением.
+    """
+    read_range_signal = pyqtSignal(int, int)
+    write_signal = pyqtSignal(list)                # [(адрес, данные)]
+
+    def __init__(self, path: str | None = None):
         super().__init__()
         self.setWindowTitle("Конфигурация")
-        self.setFixedSize(400, 300)
+        self.resize(700, 500)
         self.layout = QVBoxLayout(self)
+        self.busy = False
 
-        # Таблица
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)  # 2 столбца данных + 1 столбец для кнопки
-        self.table.setHorizontalHeaderLabels(["Параметр", "Значение", ""])  # третий без названия
+        path = path or os.environ.get("NIIM_PARAMETERS", PARAMETERS_FILE)
+        try:
+            parameters = load_parameter_map(path)
+            error = None
+        except FileNotFoundError:
+            # карты нет ‒ обычная установка без окна параметров, не ошибка
+            logging.info(f"Карта параметров {path} не найдена")
+            parameters, error = [], f"Карта параметров не задана: нет файла {path} (NIIM_PARAMETERS)"
+        except (OSError, ValueError, TypeError) as e:
+            logging.error(f"Карта параметров {path}: {e}")
+            parameters, error = [], f"Карта параметров {path} не загружена: {e}"
+        self.store = ParameterStore(parameters)
+        self.model = ParameterModel(self.store, self)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setStretchLastSection(True)
         self.layout.addWidget(self.table)
 
-        # Начальные 3 строки
-        for _ in range(3):
-            self.add_row()
-
-        # Кнопка добавления
-        self.add_button = QPushButton("Добавить строку")
-        self.add_button.clicked.connect(self.add_row)
-        self.layout.addWidget(self.add_button)
-        self.save_button = QPushButton("Сохранить")
-        self.layout.addWidget(self.save_button)
-
-    def add_row(self):
-        row_position = self.table.rowCount()
-        self.table.insertRow(row_position)
-
-        # Редактируемые ячейки
-        self.table.setItem(row_position, 0, QTableWidgetItem(""))
-        self.table.setItem(row_position, 1, QTableWidgetItem(""))
-
-        # Кнопка удаления
-        delete_button = QPushButton("🗙")
-        delete_button.setStyleSheet("color: red; font-weight: bold;")
-        delete_button.clicked.connect(lambda _, r=row_position: self.delete_row(r))
-        self.table.setCellWidget(row_position, 2, delete_button)
-
-    def delete_row(self, row):
-        self.table.removeRow(row)
-
-        # После удаления пересоздаем кнопки, чтобы lambda не хранил старые индексы
-        for r in range(self.table.rowCount()):
-            button = QPushButton("🗙")
-            button.setStyleSheet("color: red; font-weight: bold;")
-            button.clicked.connect(lambda _, row=r: self.delete_row(row))
-            self.table.setCellWidget(r, 2, button)
+        buttons = QHBoxLayout()
+        self.read_button = QPushButton("Прочитать")
+        self.read_button.clicked.connect(self.read_parameters)
+        self.save_button = QPushButton("Записать")
+        self.save_button.clicked.connect(self.write_parameters)
+        self.revert_button = QPushButton("Сбросить")
+        self.revert_button.clicked.connect(self.revert)
+        for button in (self.read_button, self.save_button, self.revert_button):
+            buttons.addWidget(button)
+        self.layout.addLayout(buttons)
+
+        self.status_label = QLabel("")
+        self.layout.addWidget(self.status_label)
+
+        self.model.invalid.connect(self.status_label.setText)
+        self.model.changed.connect(self._update_buttons)
+        if error:
+            self.status_label.setText(error)
+        self._update_buttons()
+
+    def _update_buttons(self):
+        loaded = bool(self.store.parameters)
+        self.read_button.setEnabled(loaded and not self.busy)
+        self.save_button.setEnabled(bool(self.store.edits) and not self.busy)
+        self.revert_button.setEnabled(bool(self.store.edits) and not self.busy)
+
+    def _set_busy(self, busy: bool):
+        self.busy = busy
+        self._update_buttons()
+
+    def read_parameters(self):
+        self._set_busy(True)
+        self.status_label.setText("Чтение...")
+        self.read_range_signal.emit(*self.store.span)
+
+    def write_parameters(self):
+        blocks = self.store.plan()
+        if not blocks:
+            self.status_label.setText("Изменений нет")
+            return
+        self._set_busy(True)
+        size = sum(len(data) for _, data in blocks)
+        self.status_label.setText(f"Запись: {size} байт в {len(blocks)} командах...")
+        self.write_signal.emit(blocks)
+
+    def revert(self):
+        self.store.revert()
+        self.model.refresh()
+        self.status_label.setText("Правки сброшены")
+
+    @pyqtSlot(int, int)
+    def handle_progress(self, done: int, total: int):
+        self.status_label.setText(f"Прочитано {done} из {total} байт")
+
+    @pyqtSlot(int, bytes, float, str)
+    def handle_dump(self, start: int, data: bytes, rate: float, error: str):
+        self._set_busy(False)
+        if error:
+            self.status_label.setText(error)
+            return
+        self.store.shadow.update(start, data)
+        self.model.refresh()
+        self.status_label.setText(f"Параметры прочитаны ({len(data)} байт)")
+
+    @pyqtSlot(list, str)
+    def handle_write(self, blocks: list, error: str):
+        self._set_busy(False)
+        if error:
+            self.status_label.setText(f"Ошибка записи: {error}")
+            return
+        self.store.apply_written(blocks)
+        self.model.refresh()
+        size = sum(len(data) for _, data in blocks)
+        self.status_label.setText(f"Записано и проверено: {size} байт")
 
 
 class MainWindow(QWidget):
-    send_command_signal = pyqtSignal(int, bytes)
-    send_eprom_command_signal = pyqtSignal(int, int, bytes)
-    eeprom_data_signal = pyqtSignal(list)
+    # первый аргумент команд ‒ устройство, выбранное в окне
+    send_command_signal = pyqtSignal(str, int, bytes)
+    read_eeprom_range_signal = pyqtSignal(str, int, int)
+    write_eeprom_signal = pyqtSignal(str, list)
 
-    def __init__(self):
+    def __init__(self, devices=("1",), metrics: MetricsRegistry | None = None, stats: dict | None = None):
         super().__init__()
         self.setWindowTitle("SCADA NIIM")
         self.setGeometry(100, 100, 1280, 1024)
+        self.devices = list(devices)
+        self.connected = dict.fromkeys(self.devices, False)
+        self.eeprom_device = None     # устройство, для которого открыто окно EEPROM
+        self.config_device = None     # ... окно конфигурации
+        # (устройство, окно) ‒ кто запустил текущее чтение диапазона или запись:
+        # прогресс и результат уходят только ему
+        self.eeprom_client = None
+        # дополнительные окна создаются при первом открытии и дальше только показываются
+        self.eeprom_window: EepromWindow | None = None
+        self.config_window: ConfigWidget | None = None
+        self.diagnostics_window: DiagnosticsWindow | None = None
+        self.alarm_window: AlarmWindow | None = None
+        self.history_window: HistoryWindow | None = None
+        self.metrics_registry = metrics or MetricsRegistry()
+        # RollingStats по устройствам (считает AcquisitionPool); без них панели статистики нет
+        self.rolling_stats = stats or {}
         self.setup_ui()
         self.mode = 0
         self.error_box_open = False
@@ -165,11 +267,14 @@ class MainWindow(QWidget):
         actionFile.addAction("Продвинутый").triggered.connect(self.setPro)
 
         eeprom_menu = menubar.addMenu("ЭСППЗУ")
-        eeprom_menu.addAction("Записать")
+        eeprom_menu.addAction("Записать").triggered.connect(self.ReadConfig)
         eeprom_menu.addAction("Прочитать").triggered.connect(self.ReadEeprom)
 
         menubar.addAction("Редактировать конфигурацию").triggered.connect(self.ReadConfig)
-        menubar.addMenu("Логи")
+        logs_menu = menubar.addMenu("Логи")
+        logs_menu.addAction("Диагностика").triggered.connect(self.ShowDiagnostics)
+        logs_menu.addAction("Тревоги").triggered.connect(self.ShowAlarms)
+        logs_menu.addAction("История записей").triggered.connect(self.ShowHistory)
 
         #  ---  панель управления  ---
         self.work_control = QStackedWidget()
@@ -197,44 +302,177 @@ class MainWindow(QWidget):
         scroll.setWidgetResizable(True)
         scroll.setFixedWidth(200)
 
-        # схематика и графики
-        self.schematic   = SchematicWidget()
-        self.graph_panel = GraphPanel()
+        # выбор устройства: у каждого своя схема и свои графики, на экране ‒ выбранное
+        self.device_select = QComboBox()
+        self.device_select.addItems([d + " (нет подключения)" for d in self.devices])
+        self.device_select.currentIndexChanged.connect(self.select_device)
+        self.device_select.setVisible(len(self.devices) > 1)
+
+        self.schematics   = {d: SchematicWidget() for d in self.devices}
+        self.graph_panels = {d: GraphPanel() for d in self.devices}
+        self.schematic_stack = QStackedWidget()
+        self.graph_stack     = QStackedWidget()
+        for d in self.devices:
+            self.schematic_stack.addWidget(self.schematics[d])
+            if d in self.rolling_stats:
+                # статистика каналов ‒ под графиками того же устройства
+                page = QWidget()
+                page_layout = QVBoxLayout(page)
+                page_layout.setContentsMargins(0, 0, 0, 0)
+                page_layout.addWidget(self.graph_panels[d], stretch=1)
+                page_layout.addWidget(StatsPanel(self.rolling_stats[d]))
+                self.graph_stack.addWidget(page)
+            else:
+                self.graph_stack.addWidget(self.graph_panels[d])
 
         # финальное размещение
         main_layout.addWidget(menubar, 0, 0)
+        main_layout.addWidget(self.device_select, 1, 0)
         work_layout.addWidget(scroll)
-        work_layout.addWidget(self.schematic, stretch=1)
-        work_layout.addWidget(self.graph_panel, stretch=1)
-        main_layout.addWidget(work_panel)
+        work_layout.addWidget(self.schematic_stack, stretch=1)
+        work_layout.addWidget(self.graph_stack, stretch=1)
+        main_layout.addWidget(work_panel, 2, 0)
+
+    # ----------  выбор устройства  ----------
+    @property
+    def device(self) -> str:
+        return self.devices[self.device_select.currentIndex()]
+
+    @property
+    def schematic(self) -> SchematicWidget:
+        return self.schematics[self.device]
+
+    @property
+    def graph_panel(self) -> GraphPanel:
+        return self.graph_panels[self.device]
+
+    def select_device(self, index: int):
+        self.schematic_stack.setCurrentIndex(index)
+        self.graph_stack.setCurrentIndex(index)
+        self._update_title()
 
     # ----------  меню режимов  ----------
     def setAvto(self): self.work_control.setCurrentIndex(1)
     def setPro(self):  self.work_control.setCurrentIndex(0)
 
     # ----------  дополнительные окна  ----------
+    def _build_eeprom_window(self) -> EepromWindow:
+        w = EepromWindow()
+        # чтение идёт с устройства, для которого окно открыто последним
+        w.read_range_signal.connect(lambda start, length: self._read_range(self.eeprom_device, w, start, length))
+        return w
+
+    def _build_config_window(self) -> ConfigWidget:
+        w = ConfigWidget()
+        w.read_range_signal.connect(lambda start, length: self._read_range(self.config_device, w, start, length))
+        w.write_signal.connect(lambda blocks: self._write_eeprom(self.config_device, w, blocks))
+        return w
+
+    def _read_range(self, device: str, window, start: int, length: int):
+        self.eeprom_client = (device, window)
+        self.read_eeprom_range_signal.emit(device, start, length)
+
+    def _write_eeprom(self, device: str, window, blocks: list):
+        self.eeprom_client = (device, window)
+        self.write_eeprom_signal.emit(device, blocks)
+
+    def _eeprom_client(self, device: str):
+        if self.eeprom_client and self.eeprom_client[0] == device:
+            return self.eeprom_client[1]
+        return None
+
     def ReadEeprom(self):
-        self.w = EepromWindow()
-        self.w.send_eprom_command_signal.connect(self.send_eprom_command_signal)
-        self.eeprom_data_signal.connect(self.w.handle_data)
-        self.w.show()
+        # окно привязано к устройству, выбранному в момент открытия
+        self.eeprom_device = self.device
+        if self.eeprom_window is None:
+            self.eeprom_window = self._build_eeprom_window()
+        if len(self.devices) > 1:
+            self.eeprom_window.setWindowTitle(f"Данные EEPROM ‒ {self.eeprom_device}")
+        self.eeprom_window.show()
+        self.eeprom_window.raise_()
 
     def ReadConfig(self):
-        self.w2 = ConfigWidget(); self.w2.show()
-
-    # ----------  обратные вызовы от SerialWorker  ----------
-    def display_data(self, data: dict):
-        if "EEPROM_READ" in data:
-            self.eeprom_data_signal.emit(data["EEPROM_READ"])
-            return
-
-
-        # Пример ‒ обновляем графики
-        self.graph_panel.update_plots([data.get("MIDA", 0),
-                                       data.get("Magdischarge", 0),
-                                       data.get("ThermalIndicator", 0)])
-
-    def display_error(self, msg: str):
+        self.config_device = self.device
+        if self.config_window is None:
+            self.config_window = self._build_config_window()
+        if len(self.devices) > 1:
+            self.config_window.setWindowTitle(f"Конфигурация ‒ {self.config_device}")
+        self.config_window.show()
+        self.config_window.raise_()
+
+    def ShowDiagnostics(self):
+        if self.diagnostics_window is None:
+            self.diagnostics_window = DiagnosticsWindow(self.metrics_registry)
+        self.diagnostics_window.show()
+        self.diagnostics_window.raise_()
+
+    def ShowAlarms(self):
+        if self.alarm_window is None:
+            self.alarm_window = AlarmWindow()
+        self.alarm_window.show()
+        self.alarm_window.raise_()
+
+    def ShowHistory(self):
+        if self.history_window is None:
+            # несколько устройств пишутся в records/<устройство> (AcquisitionPool)
+            directory = os.path.join("records", self.device) if len(self.devices) > 1 else "records"
+            self.history_window = HistoryWindow(directory)
+            if os.path.isdir(directory):
+                self.history_window.select_whole()
+        self.history_window.show()
+        self.history_window.raise_()
+
+    def metrics(self) -> list:
+        """Сборщик для MetricsRegistry: время обновления графиков и мнемосхемы по устройствам."""
+        samples = [Sample("niim_gui_update_ms", "histogram", "Длительность GraphPanel.update_plots, мс",
+                          {"device": d}, panel.update_time) for d, panel in self.graph_panels.items()]
+        for d, schematic in self.schematics.items():
+            samples.append(Sample("niim_schematic_paint_ms", "histogram", "Длительность отрисовки мнемосхемы, мс",
+                                  {"device": d}, schematic.paint_time))
+            samples.append(Sample("niim_schematic_item_updates_total", "counter",
+                                  "Изменений элементов мнемосхемы", {"device": d}, schematic.item_updates))
+        return samples
+
+    # ----------  обратные вызовы от AcquisitionPool  ----------
+    def display_data(self, device: str, data: dict):
+        # сюда приходят только пакеты, которых не ждала ни одна команда
+        if "ERROR_CODE" in data:
+            self.display_error(device, f"Команда 0x{data['CMD_ID']:02X}: ошибка контроллера {data['ERROR_CODE']}")
+
+    def display_eeprom_progress(self, device: str, done: int, total: int):
+        client = self._eeprom_client(device)
+        if client:
+            client.handle_progress(done, total)
+
+    def display_eeprom_dump(self, device: str, start: int, data: bytes, rate: float, error: str):
+        client = self._eeprom_client(device)
+        if client:
+            self.eeprom_client = None
+            client.handle_dump(start, data, rate, error)
+
+    def display_eeprom_write(self, device: str, blocks: list, error: str):
+        client = self._eeprom_client(device)
+        if isinstance(client, ConfigWidget):
+            self.eeprom_client = None
+            client.handle_write(blocks, error)
+
+    def display_alarm(self, device: str, event):
+        if self.alarm_window is None:
+            self.alarm_window = AlarmWindow()
+        self.alarm_window.add_event(device, event)
+        # новая тревога ‒ журнал на экран, но без фокуса и без модального окна
+        if event.active and not self.alarm_window.isVisible():
+            self.alarm_window.show()
+
+    def display_batch(self, device: str, batch):
+        # кадры обмена приходят пачкой (ExchangeBatch) ‒ графики обновляем столбцами;
+        # скрытые панели только копят историю, перерисовывается видимая
+        self.graph_panels[device].update_plots(batch)
+        self.schematics[device].show_frame(batch)
+
+    def display_error(self, device: str, msg: str):
+        if len(self.devices) > 1:
+            msg = f"{device}: {msg}"
         if self.error_box_open:
             return  # Уже показывается окно — не дублируем
 
@@ -251,9 +489,16 @@ class MainWindow(QWidget):
         logging.error("Ошибка связи: " + msg)
         box.show()
 
-    def update_connection_status(self, connected: bool):
-        postfix = " (подключено)" if connected else " (нет подключения)"
-        self.setWindowTitle("UdavProg" + postfix)
+    def update_connection_status(self, device: str, connected: bool):
+        self.connected[device] = connected
+        index = self.devices.index(device)
+        self.device_select.setItemText(index, device + ("" if connected else " (нет подключения)"))
+        self._update_title()
+
+    def _update_title(self):
+        postfix = " (подключено)" if self.connected[self.device] else " (нет подключения)"
+        device = f" ‒ {self.device}" if len(self.devices) > 1 else ""
+        self.setWindowTitle("UdavProg" + device + postfix)
 
     # ----------  пользовательские действия  ----------
     def toggle_valve(self, name: str):
@@ -271,83 +516,10 @@ class MainWindow(QWidget):
         if valve_id:
             cmd_id = 0x01
             payload = bytes([valve_id])
-            self.send_command_signal.emit(cmd_id, payload)
-
-# ------------------------------------------------------------------------------------------------
-#                                          Приложение
-# ------------------------------------------------------------------------------------------------
-class LoadingWindow(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Ожидание устройства...")
-        self.setGeometry(100, 100, 300, 100)
-        layout = QVBoxLayout(self)
-        layout.addWidget(QLabel("Ожидание подключения по COM..."))
+            self.send_command_signal.emit(self.device, cmd_id, payload)
 
 
-class App:
-    def __init__(self):
-        self.qt_app = QApplication(sys.argv)
-
-        # окно ожидания (может быстро исчезнуть, если контроллер уже подключён)
-        self.loading = LoadingWindow()
-        self.loading.show()
-
-        # создаём поток + воркера
-        self.serial_thread = QThread()
-        self.serial_worker = SerialWorker()
-        self.serial_worker.moveToThread(self.serial_thread)
-
-        # сигналы
-        self.serial_thread.started.connect(self.serial_worker.run_input)
-        self.serial_worker.connection_status.connect(self._on_connection_status)
-
-        self.serial_thread.start()
-        self.main: MainWindow | None = None
-
-    # ----------  реакции на (от-)подключение устройства  ----------
-    def _on_connection_status(self, connected: bool):
-        if connected:
-            # если главное окно ещё не создано – создаём
-            if self.main is None:
-                self._launch_main_window()
-            else:
-                self.main.update_connection_status(True)
-
-            # убираем окно ожидания
-            if self.loading.isVisible():
-                self.loading.hide()
-        else:
-            # устройство исчезло
-            if self.main:
-                self.main.update_connection_status(False)
-            if not self.loading.isVisible():
-                self.loading.show()
-
-    def _launch_main_window(self):
-        self.main = MainWindow()
-
-        # перенаправляем сигналы сразу в интерфейс
-        self.serial_worker.data_received.connect(self.main.display_data)
-        self.serial_worker.error_occurred.connect(self.main.display_error)
-        self.serial_worker.connection_status.connect(self.main.update_connection_status)
-
-        self.main.show()
-
-    # ----------  корректное закрытие  ----------
-    def _stop_serial_thread(self):
-        if self.serial_worker:
-            self.serial_worker.stop()
-        if self.serial_thread:
-            self.serial_thread.quit()
-            self.serial_thread.wait()
-
-    def run(self):
-        exit_code = self.qt_app.exec_()
-        self._stop_serial_thread()
-        sys.exit(exit_code)
-
-
-# ------------------------------  точка входа  ------------------------------
+# ------------------------------  точка входа (main.py)  ------------------------------
 if __name__ == "__main__":
-    App().run()
\ No newline at end of file
+    from main import main
+    main()
@@ -0,0 +1,287 @@
+"""Счётчики конвейера приёма в формате Prometheus.
+
+Компоненты, как и раньше, считают сами ‒ обычными атрибутами (parser.frames,
+transport.dropped_frames, ...). Здесь только:
+    Histogram        ‒ гистограмма с фиксированными корзинами (время ответа, перерисовки);
+    MetricsRegistry  ‒ список сборщиков; сборщик ‒ функция, которая при каждом
+                       опросе возвращает текущие значения (Sample);
+    MetricsServer    ‒ GET /metrics на локальном порту для мониторинга.
+
+Опрос идёт из потока HTTP-сервера или таймера окна диагностики: сборщики
+только читают атрибуты, ничего не блокируют.
+"""
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+
+DEFAULT_PORT = 9105
+
+# время перерисовки графиков, мс
+UPDATE_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """Счётчики по корзинам: counts[i] ‒ значения в (buckets[i-1], buckets[i]], последняя ‒ больше всех."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def observe(self, value: float):
+        index = next((i for i, edge in enumerate(self.buckets) if value <= edge), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float | None:
+        """Верхняя граница корзины, в которую попадает квантиль q (None ‒ нет данных)."""
+        total = self.count
+        if not total:
+            return None
+        seen = 0
+        for edge, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= q * total:
+                return edge
+        return float("inf")
+
+
+class Sample(NamedTuple):
+    name: str
+    kind: str            # counter, gauge, histogram
+    help: str
+    labels: dict
+    value: object        # число или Histogram
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def add_collector(self, collector):
+        """collector() -> iterable[Sample]; вызывается при каждом опросе."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> list:
+        with self._lock:
+            collectors = list(self._collectors)
+        samples = []
+        for collector in collectors:
+            try:
+                samples.extend(collector())
+            except Exception as e:          # сломанный сборщик не должен ронять остальные
+                logging.error(f"Сбор метрик: {e}")
+        return samples
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (version 0.0.4)."""
+        lines = []
+        described = set()
+        for sample in sorted(self.collect(), key=lambda s: s.name):
+            if sample.name not in described:
+                described.add(sample.name)
+                lines.append(f"# HELP {sample.name} {sample.help}")
+                lines.append(f"# TYPE {sample.name} {sample.kind}")
+            if sample.kind == "histogram":
+                lines.extend(_render_histogram(sample))
+            else:
+                lines.append(f"{sample.name}{_labels(sample.labels)} {_number(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _number(value) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, float):
+        return repr(value) if value == value else "NaN"
+    return str(int(value))
+
+
+def _render_histogram(sample: Sample) -> list:
+    hist = sample.value
+    lines = []
+    cumulative = 0
+    for edge, count in zip(hist.buckets + ("+Inf",), hist.counts):
+        cumulative += count
+        labels = dict(sample.labels, le=edge if edge == "+Inf" else repr(float(edge)))
+        lines.append(f"{sample.name}_bucket{_labels(labels)} {cumulative}")
+    lines.append(f"{sample.name}_sum{_labels(sample.labels)} {_number(float(hist.sum))}")
+    lines.append(f"{sample.name}_count{_labels(sample.labels)} {cumulative}")
+    return lines
+
+
+# ----------  счётчики воркера порта  ----------
+# ключ SerialWorker.stats() / ProcessWorker.stats() -> (метрика, тип, описание, имя метки для словаря)
+WORKER_METRICS = {
+    "bytes_read":       ("niim_bytes_read_total", "counter", "Байт прочитано из порта", None),
+    "frames":           ("niim_frames_total", "counter", "Разобрано кадров по типам", "type"),
+    "resyncs":          ("niim_resyncs_total", "counter", "Пропусков мусора до синхробайта", None),
+    "length_errors":    ("niim_length_errors_total", "counter", "Кадров обмена с неверной длиной", None),
+    "outgoing_queue":   ("niim_outgoing_queue_depth", "gauge", "Команд в очереди передатчика", None),
+    "commands_sent":    ("niim_commands_sent_total", "counter", "Команд записано в порт", None),
+    "in_flight":        ("niim_requests_in_flight", "gauge", "Команд ждут ответа или срока", None),
+    "replies":          ("niim_replies_total", "counter", "Исходы запросов Correlator", "outcome"),
+    "latency_seconds":  ("niim_reply_latency_seconds", "histogram", "Время ответа контроллера, с", "cmd"),
+    "connected":        ("niim_connected", "gauge", "Есть связь с контроллером", None),
+    "reconnects":       ("niim_reconnects_total", "counter", "Восстановлений связи", None),
+    "reconnect_seconds": ("niim_reconnect_seconds", "gauge", "Время последнего восстановления связи, с", None),
+    "records_written":  ("niim_records_written_total", "counter", "Записей сохранено Recorder", None),
+    "records_dropped":  ("niim_records_dropped_total", "counter", "Записей потеряно Recorder", None),
+    "ring_overruns":    ("niim_ring_overruns_total", "counter", "Кадров потеряно в общей памяти (process)", None),
+    "restarts":         ("niim_reader_restarts_total", "counter", "Перезапусков процесса приёма (process)", None),
+}
+
+
+def worker_samples(device_id: str, stats: dict) -> list:
+    """stats() воркера -> Sample с меткой device."""
+    samples = []
+    for key, value in stats.items():
+        if key not in WORKER_METRICS:
+            continue
+        name, kind, description, label = WORKER_METRICS[key]
+        if label:
+            for item, item_value in value.items():
+                samples.append(Sample(name, kind, description, {"device": device_id, label: item}, item_value))
+        else:
+            samples.append(Sample(name, kind, description, {"device": device_id}, value))
+    return samples
+
+
+# ----------  скользящая статистика каналов (RollingStats)  ----------
+ROLLING_METRICS = {
+    "mean": ("niim_channel_mean", "Среднее канала в окне"),
+    "std":  ("niim_channel_std", "СКО канала в окне"),
+    "min":  ("niim_channel_min", "Минимум канала в окне"),
+    "max":  ("niim_channel_max", "Максимум канала в окне"),
+    "rate": ("niim_channel_rate", "Скорость изменения канала в окне, единиц в секунду"),
+}
+
+
+def rolling_samples(device_id: str, rolling) -> list:
+    """RollingStats -> показатели с метками device, channel, window (в секундах) и оценка времени откачки."""
+    samples = []
+    for channel, windows in rolling.snapshot().items():
+        for window, stats in windows.items():
+            labels = {"device": device_id, "channel": channel, "window": f"{window:g}"}
+            for field, (name, description) in ROLLING_METRICS.items():
+                samples.append(Sample(name, "gauge", description, labels, float(getattr(stats, field))))
+    samples.append(Sample("niim_pumpdown_eta_seconds", "gauge", "Оценка времени до целевого давления, с",
+                          {"device": device_id}, rolling.pumpdown_eta()))
+    return samples
+
+
+def alarm_samples(device_id: str, engine) -> list:
+    """AlarmEngine -> активные тревоги и время проверки правил."""
+    labels = {"device": device_id}
+    return [
+        Sample("niim_alarms_active", "gauge", "Активных тревог", labels, int(engine.state.sum())),
+        Sample("niim_alarm_rules", "gauge", "Правил тревог", labels, len(engine.rules)),
+        Sample("niim_alarm_eval_ms", "histogram", "Длительность проверки правил тревог, мс", labels,
+               engine.eval_time),
+    ]
+
+
+def add_counters(base: dict, stats: dict) -> dict:
+    """Сложить счётчики и гистограммы двух stats() (например, процесс до и после перезапуска).
+
+    Показатели (gauge) берутся из stats.
+    """
+    total = dict(base)
+    for key, value in stats.items():
+        kind = WORKER_METRICS[key][1] if key in WORKER_METRICS else "counter"
+        previous = base.get(key)
+        if kind == "gauge" or previous is None:
+            total[key] = value
+        elif kind == "histogram":
+            total[key] = {item: _merged(previous.get(item), hist) for item, hist in value.items()}
+            total[key].update({item: hist for item, hist in previous.items() if item not in value})
+        elif isinstance(value, dict):
+            total[key] = {item: previous.get(item, 0) + value.get(item, 0) for item in {**previous, **value}}
+        else:
+            total[key] = previous + value
+    return total
+
+
+def _merged(a: Histogram | None, b: Histogram) -> Histogram:
+    result = Histogram(b.buckets)
+    for hist in (a, b):
+        if hist is not None:
+            result.merge(hist)
+    return result
+
+
+# ----------  HTTP  ----------
+class _Handler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass                          # каждый опрос в журнал не пишем
+
+
+class MetricsServer:
+    """GET http://host:port/metrics в фоновом потоке."""
+
+    def __init__(self, registry: MetricsRegistry, port: int = DEFAULT_PORT, host: str = "127.0.0.1"):
+        handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="MetricsServer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logging.info(f"Метрики: http://{self.httpd.server_address[0]}:{self.port}/metrics")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def server_from_env(registry: MetricsRegistry) -> MetricsServer | None:
+    """NIIM_METRICS_PORT (по умолчанию 9105, 0 ‒ не запускать), NIIM_METRICS_HOST (127.0.0.1)."""
+    port = int(os.environ.get("NIIM_METRICS_PORT", DEFAULT_PORT))
+    if not port:
+        return None
+    return start_server(registry, port, os.environ.get("NIIM_METRICS_HOST", "127.0.0.1"))
+
+
+def start_server(registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> MetricsServer | None:
+    """Запустить MetricsServer; порт занят или недоступен ‒ предупреждение и работа без метрик."""
+    try:
+        server = MetricsServer(registry, port, host)
+    except OSError as e:
+        logging.warning(f"Метрики: порт {port} недоступен ({e}), продолжаем без них")
+        return None
+    server.start()
+    return server
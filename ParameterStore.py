@@ -0,0 +1,174 @@
+"""Параметры контроллера в EEPROM: типизированная карта, теневая копия и правки.
+
+Карта ‒ JSON-список параметров:
+    [{"name": "PumpDelay", "address": 256, "type": "uint", "width": 2,
+      "description": "Задержка запуска насоса, с"}, ...]
+type ‒ uint, int (width 1, 2, 4) или float (width 4); порядок байт ‒
+младший первым, как адрес в командах EEPROM.
+
+Теневая копия (EepromShadow) ‒ то, что лежит в EEPROM контроллера по
+последнему чтению или подтверждённой записи. Правки хранятся отдельно;
+changes() ‒ только байты, отличающиеся от тени, plan() ‒ они же,
+собранные в команды 0x10 (EepromTransfer.plan_writes).
+"""
+import json
+import math
+import struct
+
+from EepromTransfer import EEPROM_SIZE, MAX_WRITE, plan_writes
+
+PARAMETERS_FILE = "parameters.json"
+# заголовок команды 0x10 (CC 10 длина адрес) ‒ 5 байт: разрыв не длиннее
+# выгоднее переписать известными байтами, чем отправить ещё одну команду
+PLAN_MAX_GAP = 5
+
+_FORMATS = {
+    ("uint", 1): "<B", ("uint", 2): "<H", ("uint", 4): "<I",
+    ("int", 1): "<b", ("int", 2): "<h", ("int", 4): "<i",
+    ("float", 4): "<f",
+}
+
+
+class Parameter:
+    __slots__ = ("name", "address", "width", "type", "description", "_struct")
+
+    def __init__(self, name: str, address: int, type: str = "uint", width: int = 1, description: str = ""):
+        if (type, width) not in _FORMATS:
+            raise ValueError(f"{name}: неподдерживаемый тип {type}/{width}")
+        if address < 0 or address + width > EEPROM_SIZE:
+            raise ValueError(f"{name}: адрес 0x{address:04X} вне EEPROM")
+        self.name = name
+        self.address = address
+        self.width = width
+        self.type = type
+        self.description = description
+        self._struct = struct.Struct(_FORMATS[type, width])
+
+    def encode(self, value) -> bytes:
+        if self.type == "float":
+            value = float(value)
+            if not math.isfinite(value):
+                raise ValueError(f"{self.name}: недопустимое значение {value}")
+        elif value != int(value):
+            raise ValueError(f"{self.name}: ожидается целое, получено {value}")
+        try:
+            return self._struct.pack(value if self.type == "float" else int(value))
+        except struct.error:
+            raise ValueError(f"{self.name}: {value} вне диапазона {self.type}{self.width * 8}") from None
+
+    def decode(self, data: bytes):
+        return self._struct.unpack(data)[0]
+
+    def parse(self, text: str):
+        """Значение из строки таблицы (целые ‒ в том числе 0x...)."""
+        text = text.strip().replace(",", ".")
+        try:
+            value = float(text) if self.type == "float" else int(text, 0)
+        except ValueError:
+            raise ValueError(f"{self.name}: «{text}» ‒ не {'число' if self.type == 'float' else 'целое'}") from None
+        self.encode(value)                # проверка диапазона
+        return value
+
+
+def load_parameter_map(path: str = PARAMETERS_FILE) -> list:
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    parameters = [Parameter(**item) for item in items]
+    names = set()
+    owner = {}
+    for p in parameters:
+        if p.name in names:
+            raise ValueError(f"Параметр {p.name} описан дважды")
+        names.add(p.name)
+        for address in range(p.address, p.address + p.width):
+            if address in owner:
+                raise ValueError(f"{p.name} и {owner[address]} пересекаются по адресу 0x{address:04X}")
+            owner[address] = p.name
+    return parameters
+
+
+class EepromShadow:
+    """Известное содержимое EEPROM; неизвестные байты ‒ None."""
+
+    def __init__(self):
+        self.data = bytearray(EEPROM_SIZE)
+        self.valid = bytearray(EEPROM_SIZE)
+
+    def update(self, start: int, data: bytes):
+        self.data[start:start + len(data)] = data
+        self.valid[start:start + len(data)] = b"\x01" * len(data)
+
+    def get(self, address: int) -> int | None:
+        return self.data[address] if self.valid[address] else None
+
+    def read(self, address: int, width: int) -> bytes | None:
+        if not all(self.valid[address:address + width]):
+            return None
+        return bytes(self.data[address:address + width])
+
+
+class ParameterStore:
+    """Значения параметров: в контроллере (тень) и отредактированные, ещё не записанные."""
+
+    def __init__(self, parameters: list, shadow: EepromShadow | None = None):
+        self.parameters = list(parameters)
+        self.by_name = {p.name: p for p in self.parameters}
+        self.shadow = shadow or EepromShadow()
+        self.edits = {}                   # имя -> закодированное значение
+
+    @property
+    def span(self) -> tuple:
+        """(начало, длина) ‒ диапазон EEPROM, покрывающий все параметры."""
+        if not self.parameters:
+            return 0, 0
+        start = min(p.address for p in self.parameters)
+        end = max(p.address + p.width for p in self.parameters)
+        return start, end - start
+
+    def device_value(self, name: str):
+        """Значение в контроллере (None ‒ ещё не прочитано)."""
+        p = self.by_name[name]
+        data = self.shadow.read(p.address, p.width)
+        return None if data is None else p.decode(data)
+
+    def value(self, name: str):
+        p = self.by_name[name]
+        if name in self.edits:
+            return p.decode(self.edits[name])
+        return self.device_value(name)
+
+    def set(self, name: str, value):
+        p = self.by_name[name]
+        data = p.encode(value)
+        if data == self.shadow.read(p.address, p.width):
+            self.edits.pop(name, None)   # вернули прежнее значение ‒ писать нечего
+        else:
+            self.edits[name] = data
+
+    def is_edited(self, name: str) -> bool:
+        return name in self.edits
+
+    def revert(self):
+        self.edits.clear()
+
+    def changes(self) -> dict:
+        """{адрес: байт} ‒ только байты, которые отличаются от тени (или в ней неизвестны)."""
+        changes = {}
+        for name, data in self.edits.items():
+            p = self.by_name[name]
+            for offset, byte in enumerate(data):
+                if self.shadow.get(p.address + offset) != byte:
+                    changes[p.address + offset] = byte
+        return changes
+
+    def plan(self, max_gap: int = PLAN_MAX_GAP, page_size: int | None = None) -> list:
+        """Команды записи [(адрес, данные)] для всех правок."""
+        return plan_writes(self.changes(), self.shadow.get, max_gap, MAX_WRITE, page_size)
+
+    def apply_written(self, blocks: list):
+        """Блоки записаны и проверены: обновить тень, снять совпавшие правки."""
+        for address, data in blocks:
+            self.shadow.update(address, data)
+        for name in [n for n, data in self.edits.items()
+                     if self.shadow.read(self.by_name[n].address, len(data)) == data]:
+            del self.edits[name]
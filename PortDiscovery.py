@@ -0,0 +1,144 @@
+"""Поиск контроллера по портам и задержки между попытками подключения.
+
+Контроллер узнаём по кадрам обмена: с порта должны прийти PROBE_FRAMES
+целых кадров подряд с верным заголовком (AA len1 len4). Одиночный 0xAA
+встречается в потоке любого чужого устройства, два кадра подряд ‒ нет.
+Порты-кандидаты опрашиваются параллельно, побеждает первый ответивший;
+остальные закрываются.
+"""
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import monotonic
+
+import serial
+from serial.tools import list_ports
+
+from FrameParser import SYNC_EXCHANGE, EXCHANGE_LEN1, EXCHANGE_LEN4, EXCHANGE_FRAME
+
+EXCHANGE_HEADER = bytes([SYNC_EXCHANGE, EXCHANGE_LEN1, EXCHANGE_LEN4])
+PROBE_FRAMES = 2
+
+# порты, занятые воркерами этого процесса, ‒ чужие порты не опрашиваем
+_claimed = set()
+_claimed_lock = threading.Lock()
+
+
+class Backoff:
+    """Экспоненциальная задержка между попытками: initial, initial*factor, ... до maximum.
+
+    jitter ‒ доля случайного разброса, чтобы несколько воркеров не стучались
+    в порты одновременно.
+    """
+
+    def __init__(self, initial: float = 0.05, factor: float = 2.0, maximum: float = 2.0,
+                 jitter: float = 0.1):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next(self) -> float:
+        delay = min(self.initial * self.factor ** self.attempts, self.maximum)
+        self.attempts += 1
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def reset(self):
+        self.attempts = 0
+
+
+def system_ports() -> list:
+    """Последовательные порты системы (USB-UART, COM и т.п.)."""
+    return [info.device for info in list_ports.comports()]
+
+
+def candidate_ports(port: str, last_good: str | None = None, discover: bool = False) -> list:
+    """Настроенный порт, последний удачный и (discover) все порты системы, кроме занятых."""
+    candidates = [port]
+    if last_good:
+        candidates.append(last_good)
+    if discover:
+        candidates += system_ports()
+    with _claimed_lock:
+        return [p for p in dict.fromkeys(candidates) if p not in _claimed]
+
+
+def claim(port: str):
+    with _claimed_lock:
+        _claimed.add(port)
+
+
+def release(port: str):
+    with _claimed_lock:
+        _claimed.discard(port)
+
+
+def find_frames(buf: bytearray, frames: int = PROBE_FRAMES) -> int:
+    """Начало frames целых кадров обмена подряд в buf или -1.
+
+    Байты, из которых такая серия уже не начнётся, из buf удаляются.
+    """
+    pos = buf.find(EXCHANGE_HEADER)
+    while pos >= 0:
+        if len(buf) < pos + frames * EXCHANGE_FRAME:
+            break
+        if all(buf.startswith(EXCHANGE_HEADER, pos + i * EXCHANGE_FRAME) for i in range(1, frames)):
+            return pos
+        pos = buf.find(EXCHANGE_HEADER, pos + 1)
+    # хвост может оказаться началом заголовка ‒ его оставляем
+    del buf[:pos if pos >= 0 else max(len(buf) - len(EXCHANGE_HEADER) + 1, 0)]
+    return -1
+
+
+def probe(port: str, baudrate: int, timeout: float):
+    """Открыть порт и дождаться PROBE_FRAMES кадров обмена подряд не дольше timeout.
+
+    Возвращает (соединение, байты начиная с первого кадра) или None.
+    """
+    try:
+        connection = serial.serial_for_url(port, baudrate=baudrate, timeout=timeout, exclusive=True)
+    except (serial.SerialException, OSError, ValueError) as e:
+        logging.debug(f"{port}: не открывается ({e})")
+        return None
+    deadline = monotonic() + timeout
+    buf = bytearray()
+    try:
+        while (left := deadline - monotonic()) > 0:
+            connection.timeout = left
+            buf += connection.read(connection.in_waiting or 1)
+            pos = find_frames(buf)
+            if pos >= 0:
+                return connection, bytes(buf[pos:])
+    except (serial.SerialException, OSError) as e:
+        logging.debug(f"{port}: ошибка чтения при опросе ({e})")
+    if buf:
+        logging.debug(f"{port}: {len(buf)} байт без кадров обмена ‒ не контроллер")
+    connection.close()
+    return None
+
+
+def discover(ports: list, baudrate: int, timeout: float):
+    """Опросить порты параллельно; (порт, соединение, первые байты) первого ответившего или None."""
+    if not ports:
+        return None
+    pool = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="probe")
+    pending = {pool.submit(probe, port, baudrate, timeout): port for port in ports}
+    found = None
+    try:
+        while pending and found is None:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                port = pending.pop(future)
+                result = future.result()
+                if result and found is None:
+                    found = (port,) + result
+                elif result:
+                    result[0].close()
+    finally:
+        # проигравшие опросы закрывают свои порты сами, когда закончат
+        for future in pending:
+            future.add_done_callback(lambda f: f.result() and f.result()[0].close())
+        pool.shutdown(wait=False)
+    return found
@@ -0,0 +1,373 @@
+"""Приём в отдельном процессе: чтение порта и разбор кадров не делят GIL с GUI.
+
+Дочерний процесс крутит обычный SerialWorker и складывает кадры обмена в
+кольцо в разделяемой памяти (ShmRing), редкие пакеты (ошибки, EEPROM,
+состояние связи) ‒ в очередь событий. ProcessWorker в процессе GUI имеет
+те же сигналы и слоты, что и SerialWorker, и подставляется вместо него
+(AcquisitionPool, NIIM_ACQUISITION=process). Если дочерний процесс умер,
+ProcessWorker запускает его заново; потери видны в ProcessWorker.loss.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from PyQt5.QtCore import QObject, Qt, pyqtSignal, pyqtSlot
+
+from FrameParser import ExchangeBatch, EXCHANGE_DTYPE
+from Metrics import add_counters
+
+RING_MAGIC = 0x4E494D52          # "NIMR"
+RING_HEADER = np.dtype([("magic", "<u4"), ("reserved", "<u4"), ("capacity", "<u8"), ("written", "<u8"),
+                        ("claimed", "<u8")])
+RING_HEADER_SIZE = 64
+
+
+class ShmRing:
+    """Кольцо кадров обмена в multiprocessing.shared_memory: один писатель, один читатель.
+
+    Раскладка: заголовок 64 байта (magic, capacity, written ‒ сколько кадров
+    записано за всё время, claimed ‒ докуда писатель пишет сейчас), затем
+    t_ns[capacity] (<u8) и кадры EXCHANGE_DTYPE[capacity]. Писатель
+    выставляет claimed, копирует кадры, потом увеличивает written.
+    Читатель держит свой счётчик прочитанного; если отстал больше чем на
+    capacity, самые старые кадры потеряны (overruns). То же ‒ с кадрами,
+    которые писатель начал затирать, пока читатель их копировал: после
+    копии читатель сверяется с claimed и отбрасывает их.
+
+    read() копирует кадры из разделяемой памяти: пачку держат потребители
+    (RollingStats, AlarmEngine, TelemetryTransport копят их до пересчёта),
+    а представление в кольцо писатель затёр бы через круг, и после close()
+    оно указывало бы в отключённую память. Копия ‒ одна на пачку, 40 байт
+    на кадр.
+    """
+
+    def __init__(self, shm: SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((), RING_HEADER, buffer=shm.buf)
+        self.capacity = int(self.header["capacity"])
+        offset = RING_HEADER_SIZE
+        self.t_ns = np.ndarray(self.capacity, np.uint64, buffer=shm.buf, offset=offset)
+        offset += 8 * self.capacity
+        self.frames = np.ndarray(self.capacity, EXCHANGE_DTYPE, buffer=shm.buf, offset=offset)
+
+        self.read_index = int(self.header["written"])
+        self.overruns = 0                  # кадры, затёртые до того, как их прочитали
+
+    @classmethod
+    def create(cls, capacity: int = 1 << 17) -> "ShmRing":
+        size = RING_HEADER_SIZE + capacity * (8 + EXCHANGE_DTYPE.itemsize)
+        shm = SharedMemory(create=True, size=size)
+        header = np.ndarray((), RING_HEADER, buffer=shm.buf)
+        header["magic"], header["capacity"] = RING_MAGIC, capacity
+        header["written"] = header["claimed"] = 0
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "ShmRing":
+        # SharedMemory регистрирует и чужой сегмент: resource_tracker подключившегося
+        # процесса удалил бы кольцо при его выходе. Удаляет только создатель.
+        # Дочерний процесс multiprocessing (spawn) делит трекер с создателем ‒
+        # там регистрация одна на двоих, её не снимаем (трекер есть только на POSIX)
+        shm = SharedMemory(name=name)
+        if os.name == "posix" and multiprocessing.parent_process() is None:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        ring = cls(shm, owner=False)
+        if int(ring.header["magic"]) != RING_MAGIC:
+            ring.close()
+            raise ValueError(f"{name}: не кольцо кадров NIIM")
+        return ring
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def written(self) -> int:
+        return int(self.header["written"])
+
+    # ----------  писатель  ----------
+    def write(self, batch: ExchangeBatch):
+        records, t_ns = batch.records, batch.t_ns
+        written = int(self.header["written"])
+        if len(records) > self.capacity:
+            # не поместившееся начало считаем записанным ‒ читатель увидит его как переполнение
+            written += len(records) - self.capacity
+            records, t_ns = records[-self.capacity:], t_ns[-self.capacity:]
+        self.header["claimed"] = written + len(records)
+        start = written % self.capacity
+        first = min(len(records), self.capacity - start)
+        self.frames[start:start + first] = records[:first]
+        self.t_ns[start:start + first] = t_ns[:first]
+        rest = len(records) - first
+        if rest:
+            self.frames[:rest] = records[first:]
+            self.t_ns[:rest] = t_ns[first:]
+        self.header["written"] = written + len(records)
+
+    # ----------  читатель  ----------
+    def read(self, device: str | None = None) -> list:
+        """Непрочитанные кадры: 0, 1 или 2 ExchangeBatch (кольцо могло перейти через край)."""
+        written = int(self.header["written"])
+        available = written - self.read_index
+        if available > self.capacity:
+            self.overruns += available - self.capacity
+            self.read_index = written - self.capacity
+            available = self.capacity
+        copies = []
+        while available:
+            start = self.read_index % self.capacity
+            count = min(available, self.capacity - start)
+            copies.append((self.read_index, np.array(self.frames[start:start + count]),
+                           np.array(self.t_ns[start:start + count])))
+            self.read_index += count
+            available -= count
+        # пока копировали, писатель мог начать затирать самые старые из них
+        oldest = int(self.header["claimed"]) - self.capacity
+        batches = []
+        for first, frames, t_ns in copies:
+            torn = min(max(oldest - first, 0), len(frames))
+            self.overruns += torn
+            if torn < len(frames):
+                batches.append(ExchangeBatch(frames[torn:], t_ns[torn:], device))
+        return batches
+
+    def close(self):
+        del self.header, self.t_ns, self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ----------  дочерний процесс  ----------
+STATS_INTERVAL = 1.0
+
+
+def _reader_main(port: str, baudrate: int, device_id, ring_name: str, events, commands, discover: bool):
+    from SerialWorker import SerialWorker
+    from Logs import forward_logging
+
+    # процесс запущен через spawn ‒ журнал не настроен; записи пишет родитель
+    # (два процесса не могут ротировать один файл)
+    log_handler = forward_logging(lambda record: events.put(("log", record)))
+    ring = ShmRing.attach(ring_name)
+    worker = SerialWorker(port=port, baudrate=baudrate, device_id=device_id, discover=discover)
+    worker.batch_received.connect(ring.write, Qt.DirectConnection)
+    worker.data_received.connect(lambda p: events.put(("data", p)), Qt.DirectConnection)
+    worker.error_occurred.connect(lambda m: events.put(("error", m)), Qt.DirectConnection)
+    worker.connection_status.connect(lambda ok: events.put(("status", ok)), Qt.DirectConnection)
+    worker.eeprom_progress.connect(lambda done, total: events.put(("eeprom_progress", done, total)),
+                                   Qt.DirectConnection)
+    worker.eeprom_dump_finished.connect(
+        lambda start, data, rate, error: events.put(("eeprom_dump", start, data, rate, error)), Qt.DirectConnection)
+    worker.eeprom_write_finished.connect(lambda blocks, error: events.put(("eeprom_write", blocks, error)),
+                                         Qt.DirectConnection)
+
+    def serve_commands():
+        # (имя слота, аргументы) -> вызов слота SerialWorker; None ‒ остановка
+        while True:
+            item = commands.get()
+            if item is None:
+                worker.stop()
+                return
+            method, args = item
+            getattr(worker, method)(*args)
+
+    def report_stats():
+        while worker.is_running:
+            time.sleep(STATS_INTERVAL)
+            log_handler.flush()          # сводки «повторилось N раз»
+            events.put(("stats", worker.stats()))
+
+    threading.Thread(target=serve_commands, daemon=True).start()
+    threading.Thread(target=report_stats, daemon=True).start()
+    try:
+        worker.run_input()
+    finally:
+        log_handler.flush(final=True)
+        ring.close()
+
+
+# ----------  сторона GUI  ----------
+class ProcessWorker(QObject):
+    """Замена SerialWorker: порт читает дочерний процесс, сюда приходят готовые кадры.
+
+    run_input() выполняется в QThread, как у SerialWorker: запускает и
+    сторожит процесс, забирает кадры из кольца и события из очереди и
+    испускает те же сигналы. Слоты команд потокобезопасны и только
+    передают вызов в дочерний процесс.
+    """
+    data_received = pyqtSignal(dict)
+    batch_received = pyqtSignal(object)
+    error_occurred = pyqtSignal(str)
+    connection_status = pyqtSignal(bool)
+    eeprom_progress = pyqtSignal(int, int)
+    eeprom_dump_finished = pyqtSignal(int, bytes, float, str)
+    eeprom_write_finished = pyqtSignal(list, str)
+
+    POLL_INTERVAL = 0.005        # как часто заглядывать в кольцо, с
+    RESTART_DELAY = 1.0
+
+    def __init__(self, port: str = "/dev/ttyUSB0", baudrate: int = 115200, device_id: str | None = None,
+                 capacity: int = 1 << 17, discover: bool = False):
+        super().__init__()
+        self.port = port
+        self.baudrate = baudrate
+        self.device_id = device_id
+        self.discover = discover
+        self.capacity = capacity
+        self.recorder = None
+
+        self.is_running = True
+        self.process = None
+        self.ring = None
+        self._context = multiprocessing.get_context("spawn")   # fork из процесса с Qt-потоками небезопасен
+        self._events = None
+        self._commands = None
+
+        self.restarts = 0
+        self._overruns = 0         # переполнения колец прошлых запусков run_input
+        self.child_stats = {}      # последний SerialWorker.stats() дочернего процесса
+        self._stats_base = {}      # счётчики процессов, умерших раньше
+        self.connected = False
+
+    @property
+    def loss(self) -> dict:
+        """Счётчики потерь: 0 везде ‒ ничего не пропало."""
+        stats = add_counters(self._stats_base, self.child_stats)
+        totals = {key: stats.get(key, 0) for key in ("resyncs", "length_errors")}
+        return {
+            "ring_overruns": self._overruns + (self.ring.overruns if self.ring else 0),
+            "restarts": self.restarts,
+            **totals,
+        }
+
+    def stats(self) -> dict:
+        """Как SerialWorker.stats(): счётчики дочернего процесса (за все перезапуски) и кольца."""
+        stats = add_counters(self._stats_base, self.child_stats)
+        stats.update(self.loss, connected=self.connected)
+        if self.recorder:
+            stats["records_written"] = self.recorder.records_written
+            stats["records_dropped"] = self.recorder.records_dropped
+        return stats
+
+    # ----------  команды  ----------
+    def _call(self, method: str, *args):
+        if self._commands is None:
+            self.error_occurred.emit("Процесс приёма не запущен — команда не отправлена")
+            return
+        self._commands.put((method, args))
+
+    @pyqtSlot(int, bytes)
+    def handle_command(self, cmd_id: int, payload: bytes = b''):
+        self._call("handle_command", cmd_id, payload)
+
+    @pyqtSlot(int, int, bytes)
+    def handle_eprom_command(self, command_id: int, address: int, data: bytes = b''):
+        self._call("handle_eprom_command", command_id, address, data)
+
+    @pyqtSlot(int, int)
+    def read_eeprom_range(self, start: int, length: int, window: int = 4):
+        self._call("read_eeprom_range", start, length, window)
+
+    @pyqtSlot(list)
+    def write_eeprom(self, blocks: list, window: int = 4):
+        self._call("write_eeprom", blocks, window)
+
+    # ----------  процесс  ----------
+    def _start_process(self):
+        self._events = self._context.Queue()
+        self._commands = self._context.Queue()
+        self.process = self._context.Process(
+            target=_reader_main, name=f"NIIM-reader-{self.device_id or self.port}", daemon=True,
+            args=(self.port, self.baudrate, self.device_id, self.ring.name, self._events, self._commands,
+                  self.discover))
+        self.process.start()
+
+    def _restart_process(self):
+        logging.error(f"Процесс приёма {self.port} завершился (код {self.process.exitcode}), перезапуск")
+        self.error_occurred.emit(f"Процесс приёма {self.port} перезапущен")
+        self.connection_status.emit(False)
+        self.restarts += 1
+        self.connected = False
+        self._stats_base = add_counters(self._stats_base, self.child_stats)
+        self.child_stats = {}
+        self._commands = None
+        time.sleep(self.RESTART_DELAY)
+        if self.is_running:
+            self._start_process()
+
+    # ----------  главный цикл потока  ----------
+    def run_input(self):
+        self.ring = ShmRing.create(self.capacity)
+        self._start_process()
+        while self.is_running:
+            if not self.process.is_alive():
+                self._restart_process()
+                continue
+
+            self._drain()
+
+            # ожидание события заодно задаёт темп опроса кольца
+            try:
+                self._dispatch(self._events.get(timeout=self.POLL_INTERVAL))
+                while True:
+                    self._dispatch(self._events.get_nowait())
+            except queue.Empty:
+                pass
+
+        self._shutdown()
+
+    def _dispatch(self, event: tuple):
+        kind, *args = event
+        if kind == "data":
+            if self.recorder:
+                self.recorder.record(args[0])
+            self.data_received.emit(args[0])
+        elif kind == "error":
+            self.error_occurred.emit(args[0])
+        elif kind == "status":
+            self.connected = args[0]
+            self.connection_status.emit(args[0])
+        elif kind == "eeprom_progress":
+            self.eeprom_progress.emit(*args)
+        elif kind == "eeprom_dump":
+            self.eeprom_dump_finished.emit(*args)
+        elif kind == "eeprom_write":
+            self.eeprom_write_finished.emit(*args)
+        elif kind == "stats":
+            self.child_stats = args[0]
+        elif kind == "log":
+            # запись журнала дочернего процесса ‒ в журнал этого
+            logging.getLogger(args[0].name).handle(args[0])
+
+    def _shutdown(self):
+        if self.process and self.process.is_alive():
+            self._commands.put(None)
+            self.process.join(timeout=3)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        # последние кадры, дописанные перед остановкой; пачки ‒ копии, так что
+        # кольцо можно закрыть, пока потребители их ещё держат
+        self._drain()
+        self._overruns += self.ring.overruns
+        self.ring.close()
+        self.ring = None
+
+    def _drain(self):
+        for batch in self.ring.read(self.device_id):
+            if self.recorder:
+                self.recorder.record(batch)
+            self.batch_received.emit(batch)
+
+    # ----------  остановка  ----------
+    def stop(self):
+        self.is_running = False
@@ -0,0 +1,305 @@
+"""Запись телеметрии на диск.
+
+Формат записи
+-------------
+Сеанс пишется сегментами. Каждый сегмент ‒ пара файлов с общим именем
+``niim_<ГГГГММДД_ччммсс>_<номер>``:
+
+* ``.exch`` ‒ кадры обмена (0xAA), запись EXCHANGE_RECORD_DTYPE, 40 байт:
+  ``t_ns`` (<u8, time.monotonic_ns в момент чтения) + кадр как на линии
+  (поля EXCHANGE_DTYPE из FrameParser);
+* ``.evt`` ‒ пакеты ошибок (0xBB) и ответы EEPROM (0xCC), запись
+  EVENT_RECORD_DTYPE, 272 байта: ``t_ns``, ``kind`` (1 ‒ ошибка, 2 ‒ EEPROM),
+  ``cmd_id``, ``error_code``, ``length``, ``address`` (<i4, -1 ‒ неизвестен),
+  ``data`` (256 байт, значимы первые ``length``).
+
+Каждый файл начинается с заголовка HEADER_DTYPE (64 байта): ``magic``
+(b"NIIMREC1"), ``version``, ``kind``, ``record_size``, ``wall_ns`` и
+``mono_ns`` ‒ time.time_ns() и time.monotonic_ns() в момент открытия
+сегмента (wall = wall_ns + (t_ns - mono_ns)). Дальше записи идут подряд
+без разделителей, поэтому файл читается без разбора::
+
+    records = np.memmap(path, dtype=EXCHANGE_RECORD_DTYPE, mode="r", offset=HEADER_SIZE)
+
+или просто open_records(path).
+
+Хранение: Recorder удаляет самые старые сегменты каталога, когда их общий
+размер превысил max_total_bytes или сегмент старше max_age секунд.
+NIIM_RECORD=0 отключает запись (см. record_dir_from_env, retention_from_env).
+"""
+import glob
+import logging
+import os
+import threading
+import time
+from queue import SimpleQueue, Empty
+
+import numpy as np
+
+from FrameParser import EXCHANGE_DTYPE, ExchangeBatch
+
+MAGIC = b"NIIMREC1"
+VERSION = 1
+HEADER_SIZE = 64
+
+KIND_EXCHANGE = 1
+KIND_EVENT = 2
+
+EVENT_ERROR = 1
+EVENT_EEPROM = 2
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"), ("version", "<u2"), ("kind", "<u2"), ("record_size", "<u4"),
+    ("wall_ns", "<u8"), ("mono_ns", "<u8"), ("reserved", "V32"),
+])
+assert HEADER_DTYPE.itemsize == HEADER_SIZE
+
+EXCHANGE_RECORD_DTYPE = np.dtype([("t_ns", "<u8")] + EXCHANGE_DTYPE.descr)
+
+EVENT_DATA_SIZE = 256
+EVENT_RECORD_DTYPE = np.dtype([
+    ("t_ns", "<u8"), ("kind", "u1"), ("cmd_id", "u1"), ("error_code", "u1"), ("length", "u1"),
+    ("address", "<i4"), ("data", "u1", (EVENT_DATA_SIZE,)),
+])
+
+EXTENSIONS = {KIND_EXCHANGE: ".exch", KIND_EVENT: ".evt"}
+RECORD_DTYPES = {KIND_EXCHANGE: EXCHANGE_RECORD_DTYPE, KIND_EVENT: EVENT_RECORD_DTYPE}
+
+
+# ----------  чтение  ----------
+def read_header(path: str) -> np.void:
+    with open(path, "rb") as f:
+        header = np.frombuffer(f.read(HEADER_SIZE), dtype=HEADER_DTYPE)[0]
+    if header["magic"] != MAGIC:
+        raise ValueError(f"{path}: не файл записи NIIM")
+    return header
+
+
+def open_records(path: str) -> np.ndarray:
+    """Записи файла через np.memmap (без чтения в память)."""
+    header = read_header(path)
+    dtype = RECORD_DTYPES[int(header["kind"])]
+    count = (os.path.getsize(path) - HEADER_SIZE) // dtype.itemsize
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def segment_files(out_dir: str) -> list:
+    """Сегменты каталога от старых к новым: [(база имени, [файлы сегмента]), ...].
+
+    К сегменту относятся все файлы с его именем: .exch, .evt и то, что
+    рядом положили читатели (индекс SessionQuery).
+    """
+    segments = {}
+    for path in glob.glob(os.path.join(glob.escape(out_dir), "niim_*.*")):
+        name = os.path.basename(path)
+        segments.setdefault(os.path.join(out_dir, name[:name.index(".")]), []).append(path)
+    # в имени время открытия с точностью до секунды и номер в сеансе ‒ у нескольких
+    # сеансов за одну секунду порядок решает время изменения (индекс пишется позже
+    # сегмента, поэтому берём самое раннее)
+    return sorted(segments.items(), key=lambda item: (min(map(os.path.getmtime, item[1])), item[0]))
+
+
+# ----------  настройки из окружения  ----------
+def _env_number(name: str) -> float | None:
+    value = os.environ.get(name, "")
+    if not value:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"{name}: ожидается число, получено {value!r}") from None
+    if number < 0:
+        raise ValueError(f"{name}: отрицательное значение {value!r}")
+    return number or None
+
+
+def record_dir_from_env(default: str = "records") -> str | None:
+    """NIIM_RECORD=0 ‒ не записывать (None), иначе каталог NIIM_RECORD_DIR или default."""
+    if os.environ.get("NIIM_RECORD", "1") in ("0", "no", "off"):
+        return None
+    return os.environ.get("NIIM_RECORD_DIR") or default
+
+
+def retention_from_env() -> dict:
+    """NIIM_RECORD_KEEP_GB, NIIM_RECORD_KEEP_DAYS ‒ сколько хранить (0 или не задано ‒ без предела)."""
+    keep_gb = _env_number("NIIM_RECORD_KEEP_GB")
+    keep_days = _env_number("NIIM_RECORD_KEEP_DAYS")
+    return {"max_total_bytes": keep_gb and int(keep_gb * 1024 ** 3),
+            "max_age": keep_days and keep_days * 86400}
+
+
+# ----------  преобразование пакетов в записи  ----------
+def exchange_records(batch: ExchangeBatch) -> np.ndarray:
+    records = np.empty(len(batch), dtype=EXCHANGE_RECORD_DTYPE)
+    records["t_ns"] = batch.t_ns
+    for name in EXCHANGE_DTYPE.names:
+        records[name] = batch.records[name]
+    return records
+
+
+def event_record(packet: dict) -> np.ndarray:
+    record = np.zeros(1, dtype=EVENT_RECORD_DTYPE)
+    record["t_ns"] = packet.get("T_NS") or time.monotonic_ns()
+    record["address"] = packet.get("ADDRESS", -1)
+    if "EEPROM_READ" in packet:
+        data = bytes(packet["EEPROM_READ"])
+        record["kind"] = EVENT_EEPROM
+        record["cmd_id"] = 0x12
+    else:
+        data = packet.get("ERROR_INFO", b"")
+        record["kind"] = EVENT_ERROR
+        record["cmd_id"] = packet.get("CMD_ID", 0)
+        record["error_code"] = packet.get("ERROR_CODE", 0)
+    data = data[:EVENT_DATA_SIZE]
+    record["length"] = min(len(data), 255)
+    record["data"][0, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+    return record
+
+
+class Recorder:
+    """Фоновая запись всех разобранных пакетов в файлы сегментов.
+
+    record() вызывается в потоке порта: он только превращает пакет в байты
+    и кладёт их в очередь. Диск трогает отдельный поток, пишущий большими
+    буферизованными блоками, так что чтение порта на записи не блокируется.
+    Новый сегмент начинается, когда текущий превысил max_bytes или
+    max_seconds. Перед открытием сегмента удаляются самые старые сегменты
+    каталога, пока все вместе не меньше max_total_bytes и ни один не старше
+    max_age секунд (None ‒ без предела); текущий сегмент не удаляется.
+    """
+
+    def __init__(self, out_dir: str = "records", max_bytes: int = 256 * 1024 * 1024,
+                 max_seconds: float = 3600, buffer_size: int = 1024 * 1024,
+                 max_pending: int = 100_000, max_total_bytes: int | None = None,
+                 max_age: float | None = None):
+        self.out_dir = out_dir
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.buffer_size = buffer_size
+        self.max_pending = max_pending
+        self.max_total_bytes = max_total_bytes
+        self.max_age = max_age
+
+        self._queue = SimpleQueue()
+        self._files = {}
+        self._segment = 0
+        self._segment_started = 0.0
+        self._segment_bytes = 0
+
+        self.records_written = 0
+        self.records_dropped = 0    # очередь переполнена (диск не успевает)
+        self.segments = []          # пути к .exch всех открытых сегментов
+        self.segments_deleted = 0   # удалено по max_total_bytes/max_age
+
+        os.makedirs(out_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="Recorder", daemon=True)
+        self._thread.start()
+
+    # ----------  сторона потока порта  ----------
+    def record(self, packet):
+        if self._queue.qsize() >= self.max_pending:
+            self.records_dropped += len(packet) if isinstance(packet, ExchangeBatch) else 1
+            return
+        if isinstance(packet, ExchangeBatch):
+            item = (KIND_EXCHANGE, exchange_records(packet))
+        else:
+            item = (KIND_EVENT, event_record(packet))
+        self._queue.put(item)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    # ----------  поток записи  ----------
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                self._write(*item)
+
+            now = time.monotonic()
+            if now - last_flush >= 1.0:
+                # раз в секунду сбрасываем буферы, чтобы запись можно было читать «вживую»
+                for f in self._files.values():
+                    f.flush()
+                last_flush = now
+        self._close_segment()
+
+    def _write(self, kind: int, records: np.ndarray):
+        try:
+            if not self._files or self._segment_bytes >= self.max_bytes \
+                    or time.monotonic() - self._segment_started >= self.max_seconds:
+                self._open_segment()
+            data = records.tobytes()
+            self._files[kind].write(data)
+            self._segment_bytes += len(data)
+            self.records_written += len(records)
+        except OSError as e:
+            logging.error(f"Ошибка записи телеметрии: {e}")
+
+    def _open_segment(self):
+        self._close_segment()
+        self._apply_retention()
+        self._segment += 1
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        base = os.path.join(self.out_dir, f"niim_{stamp}_{self._segment:03d}")
+        # прошлый сеанс мог начаться в ту же секунду ‒ его сегменты не затираем
+        while any(os.path.exists(base + ext) for ext in EXTENSIONS.values()):
+            self._segment += 1
+            base = os.path.join(self.out_dir, f"niim_{stamp}_{self._segment:03d}")
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["wall_ns"] = time.time_ns()
+        header["mono_ns"] = time.monotonic_ns()
+        for kind, ext in EXTENSIONS.items():
+            header["kind"] = kind
+            header["record_size"] = RECORD_DTYPES[kind].itemsize
+            f = open(base + ext, "wb", buffering=self.buffer_size)
+            f.write(header.tobytes())
+            self._files[kind] = f
+
+        self.segments.append(base + EXTENSIONS[KIND_EXCHANGE])
+        self._segment_started = time.monotonic()
+        self._segment_bytes = 0
+
+    def _close_segment(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+    def _apply_retention(self):
+        """Удалить старые сегменты: место под новый сегмент (max_bytes) входит в max_total_bytes."""
+        if self.max_total_bytes is None and self.max_age is None:
+            return
+        try:
+            segments = [(base, paths, sum(map(os.path.getsize, paths)), min(map(os.path.getmtime, paths)))
+                        for base, paths in segment_files(self.out_dir)]
+        except OSError as e:
+            logging.error(f"Хранение записей: не удалось прочитать {self.out_dir}: {e}")
+            return
+        total = sum(size for _, _, size, _ in segments)
+        now = time.time()
+        for base, paths, size, mtime in segments:
+            too_big = self.max_total_bytes is not None and total + self.max_bytes > self.max_total_bytes
+            too_old = self.max_age is not None and now - mtime > self.max_age
+            if not (too_big or too_old):
+                break
+            try:
+                for path in paths:
+                    os.remove(path)
+            except OSError as e:
+                logging.error(f"Хранение записей: не удалось удалить {base}: {e}")
+                return
+            total -= size
+            self.segments_deleted += 1
+            logging.info(f"Удалён старый сегмент записи {os.path.basename(base)} ({size / 1e6:.1f} МБ)")
@@ -0,0 +1,275 @@
+"""Воспроизведение записей через настоящий путь SerialWorker.
+
+Источник ‒ сырой захват байтов с линии (любой файл) или сеанс Recorder
+(.exch + .evt). Байты отдаются в псевдотерминал (SerialWorker открывает
+его как обычный порт) или в TCP-сокет (порт socket://хост:порт).
+
+    python Replay.py capture.bin --speed 10 --pty
+    python Replay.py records/niim_20240101_020000_001.exch --speed 0 --socket 127.0.0.1:7777
+    python Replay.py capture.bin --speed 0 --measure     # пропускная способность SerialWorker
+"""
+import argparse
+import heapq
+import os
+import select
+import socket
+import threading
+import time
+import tty
+
+import numpy as np
+
+from FrameParser import SYNC_EXCHANGE, encode_error, encode_eeprom_reply, encode_exchange
+from Recorder import open_records, EVENT_EEPROM
+
+
+# ----------  источники: последовательность (t_ns, байты)  ----------
+def capture_chunks(path: str, baudrate: int = 115200, chunk_size: int = 256):
+    """Сырой захват: времени в файле нет, темп задаёт скорость линии (10 бит на байт)."""
+    ns_per_byte = 10 * 1_000_000_000 // baudrate
+    sent = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield sent * ns_per_byte, chunk
+            sent += len(chunk)
+
+
+def _exchange_chunks(path: str):
+    records = open_records(path)
+    if not len(records):
+        return
+    # кадры одной записи без t_ns ‒ ровно те байты, что пришли с линии
+    frames = records.view(np.uint8).reshape(len(records), records.dtype.itemsize)[:, 8:]
+    t = records["t_ns"]
+    # кадры, прочитанные одним read(), отдаём одним куском
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(t)) + 1, [len(t)]))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        yield int(t[start]), frames[start:stop].tobytes()
+
+
+def _event_chunks(path: str):
+    if not os.path.exists(path):
+        return
+    for record in open_records(path):
+        data = record["data"][:record["length"]].tobytes()
+        if record["kind"] == EVENT_EEPROM:
+            packet = encode_eeprom_reply(data)
+        else:
+            packet = encode_error(int(record["cmd_id"]), int(record["error_code"]), data)
+        yield int(record["t_ns"]), packet
+
+
+def session_chunks(paths):
+    """Сеанс Recorder: кадры обмена и события, слитые по времени чтения."""
+    for path in paths:
+        base = os.path.splitext(path)[0]
+        yield from heapq.merge(_exchange_chunks(base + ".exch"), _event_chunks(base + ".evt"),
+                               key=lambda item: item[0])
+
+
+# ----------  воспроизведение  ----------
+class Replayer:
+    """Отдаёт куски в write() с темпом исходной записи, умноженным на speed.
+
+    speed = 1 ‒ реальное время, N ‒ в N раз быстрее, 0 ‒ без пауз.
+    """
+
+    def __init__(self, chunks, speed: float = 1.0):
+        self.chunks = chunks
+        self.speed = speed
+        self.bytes_sent = 0
+        self.chunks_sent = 0
+        self.elapsed = 0.0
+        self.is_running = True
+
+    def run(self, write):
+        started = time.perf_counter()
+        first_t = None
+        for t_ns, data in self.chunks:
+            if not self.is_running:
+                break
+            if first_t is None:
+                first_t = t_ns
+            if self.speed > 0:
+                delay = (t_ns - first_t) / 1e9 / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            write(data)
+            self.bytes_sent += len(data)
+            self.chunks_sent += 1
+        self.elapsed = time.perf_counter() - started
+
+    def stop(self):
+        self.is_running = False
+
+
+def with_handshake(chunks):
+    """SerialWorker ждёт первым байтом 0xAA ‒ добавляем его, если запись начинается иначе."""
+    first = next(iter(chunks), None)
+    if first is None:
+        return
+    t_ns, data = first
+    if data[:1] != bytes([SYNC_EXCHANGE]):
+        yield t_ns, bytes([SYNC_EXCHANGE])
+    yield first
+    yield from chunks
+
+
+# ----------  приёмники  ----------
+class PtyLink:
+    """Пара псевдотерминалов: в master пишем мы, slave открывает SerialWorker."""
+
+    def __init__(self):
+        self.master, self._slave = os.openpty()
+        # без этого терминал «съест» 0x0D и отправит эхо обратно
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._received = bytearray()     # забрано из терминала при write(), ещё не отдано drain()
+
+    def write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.master, view):]
+            self._read_available()
+
+    def _read_available(self):
+        while select.select([self.master], [], [], 0)[0]:
+            self._received += os.read(self.master, 4096)
+
+    def drain(self) -> bytes:
+        """Забрать то, что прислал SerialWorker (команды), чтобы буфер не забился."""
+        self._read_available()
+        received, self._received = bytes(self._received), bytearray()
+        return received
+
+    def close(self):
+        os.close(self.master)
+        os.close(self._slave)
+
+
+class SocketLink:
+    """TCP-сервер на одно подключение: SerialWorker открывает socket://хост:порт."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.server = socket.create_server((host, port))
+        host, port = self.server.getsockname()[:2]
+        self.port = f"socket://{host}:{port}"
+        self.conn = None
+
+    def accept(self, timeout: float | None = None):
+        self.server.settimeout(timeout)
+        self.conn, _ = self.server.accept()
+
+    def write(self, data: bytes):
+        if self.conn is None:
+            self.accept()
+        self.conn.sendall(data)
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+        self.server.close()
+
+
+# ----------  замер пропускной способности  ----------
+def measure_worker(chunks, speed: float = 0, baudrate: int = 115200) -> dict:
+    """Прогнать запись через SerialWorker на pty и посчитать принятые кадры."""
+    from main_imports import Qt
+    from SerialWorker import SerialWorker
+
+    link = PtyLink()
+    worker = SerialWorker(port=link.port, baudrate=baudrate)
+    counts = {"frames": 0, "packets": 0, "last": time.perf_counter()}
+
+    def on_batch(batch):
+        counts["frames"] += len(batch)
+        counts["last"] = time.perf_counter()
+
+    def on_packet(_):
+        counts["packets"] += 1
+        counts["last"] = time.perf_counter()
+
+    worker.batch_received.connect(on_batch, Qt.DirectConnection)
+    worker.data_received.connect(on_packet, Qt.DirectConnection)
+    thread = threading.Thread(target=worker.run_input, daemon=True)
+    thread.start()
+    # воркер считает порт подключённым, только когда опрос увидел 0xAA, а pyserial
+    # при открытии сбрасывает входной буфер ‒ шлём рукопожатие, пока воркер не подключится.
+    # Кадр целый, чтобы не сбить разбор записи; его и то, что он насчитал, из замера исключаем
+    handshake = encode_exchange({})
+    while worker.serial_connection is None and thread.is_alive():
+        link.write(handshake)
+        time.sleep(0.02)
+    time.sleep(0.1)
+    counts["frames"] = counts["packets"] = 0
+    resyncs, length_errors = worker.parser.resyncs, worker.parser.length_errors
+
+    started = time.perf_counter()
+    replayer = Replayer(with_handshake(iter(chunks)), speed)
+    replayer.run(link.write)
+    # ждём, пока воркер дочитает хвост
+    while time.perf_counter() - counts["last"] < 0.5:
+        link.drain()
+        time.sleep(0.05)
+    worker.stop()
+    thread.join(timeout=2)
+    link.close()
+
+    seconds = max(counts["last"] - started, 1e-9)
+    return {
+        "bytes": replayer.bytes_sent,
+        "frames": counts["frames"],
+        "packets": counts["packets"],
+        "seconds": seconds,
+        "frames_per_s": counts["frames"] / seconds,
+        "resyncs": worker.parser.resyncs - resyncs,
+        "length_errors": worker.parser.length_errors - length_errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записи в SerialWorker")
+    parser.add_argument("source", nargs="+", help="сырой захват или .exch сеанса Recorder")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="1 ‒ реальное время, N ‒ в N раз быстрее, 0 ‒ как можно быстрее")
+    parser.add_argument("--baudrate", type=int, default=115200,
+                        help="темп сырого захвата (у сеанса берётся время записи)")
+    sink = parser.add_mutually_exclusive_group()
+    sink.add_argument("--pty", action="store_true", help="создать псевдотерминал (по умолчанию)")
+    sink.add_argument("--socket", metavar="ХОСТ:ПОРТ", help="отдавать через TCP")
+    sink.add_argument("--measure", action="store_true",
+                      help="прогнать через SerialWorker и вывести пропускную способность")
+    args = parser.parse_args(argv)
+
+    if args.source[0].endswith((".exch", ".evt")):
+        chunks = session_chunks(args.source)
+    else:
+        chunks = (item for path in args.source for item in capture_chunks(path, args.baudrate))
+
+    if args.measure:
+        for key, value in measure_worker(chunks, args.speed, args.baudrate).items():
+            print(f"{key}: {value}")
+        return
+
+    if args.socket:
+        host, port = args.socket.rsplit(":", 1)
+        link = SocketLink(host, int(port))
+        print(f"Порт для SerialWorker: {link.port}, ждём подключения...")
+        link.accept()
+    else:
+        link = PtyLink()
+        print(f"Порт для SerialWorker: {link.port} (NIIM_PORT={link.port} python main.py)")
+        input("Нажмите Enter, когда приложение подключится к порту...")
+
+    replayer = Replayer(with_handshake(iter(chunks)), args.speed)
+    try:
+        replayer.run(link.write)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Отправлено {replayer.bytes_sent} байт за {replayer.elapsed:.2f} с")
+        link.close()
+
+
+if __name__ == "__main__":
+    main()
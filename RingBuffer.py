@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Кольцевой буфер фиксированной ёмкости с непрерывным представлением.
+
+    Память выделяется один раз. Каждый отсчёт пишется дважды ‒ в позицию
+    i % capacity и в её зеркало в верхней половине, поэтому последние
+    len(self) отсчётов всегда лежат подряд и view() отдаёт их без копии.
+
+    Отсчёты нумеруются сквозным (абсолютным) индексом: первый принятый ‒ 0.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError("Ёмкость буфера должна быть положительной")
+        self.capacity = capacity
+        self._buf = np.zeros(2 * capacity, dtype=dtype)
+        self.total = 0    # сколько отсчётов принято за всё время
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def first_index(self) -> int:
+        """Абсолютный индекс самого старого хранимого отсчёта."""
+        return self.total - len(self)
+
+    def clear(self):
+        self.total = 0
+
+    def append(self, value):
+        pos = self.total % self.capacity
+        self._buf[pos] = value
+        self._buf[pos + self.capacity] = value
+        self.total += 1
+
+    def extend(self, values):
+        values = np.asarray(values)
+        n = len(values)
+        if n == 0:
+            return
+        if n > self.capacity:
+            # всё равно уцелеют только последние capacity отсчётов
+            self.total += n - self.capacity
+            values = values[-self.capacity:]
+            n = self.capacity
+
+        cap = self.capacity
+        pos = self.total % cap
+        first = min(n, cap - pos)
+        for base in (0, cap):
+            self._buf[base + pos:base + pos + first] = values[:first]
+            self._buf[base:base + n - first] = values[first:]
+        self.total += n
+
+    def view(self, count: int | None = None) -> np.ndarray:
+        """Последние count отсчётов (по умолчанию все) ‒ view, не копия."""
+        size = len(self)
+        count = size if count is None else min(count, size)
+        end = self.total % self.capacity + self.capacity
+        return self._buf[end - count:end]
+
+    def view_range(self, start: int, stop: int) -> np.ndarray:
+        """Отсчёты с абсолютными индексами [start, stop), обрезанные по хранимому."""
+        start = max(start, self.first_index)
+        stop = min(stop, self.total)
+        if stop <= start:
+            return self._buf[:0]
+        end = self.total % self.capacity + self.capacity
+        return self._buf[end - (self.total - start):end - (self.total - stop)]
@@ -0,0 +1,299 @@
+"""Скользящая статистика каналов телеметрии: среднее, СКО, min/max и скорость изменения.
+
+Окна ‒ по времени кадров (t_ns). Пачка кадров становится куском: его
+моменты (число, средние, M2, ковариация со временем) и min/max numpy
+считает один раз. Итог по окну ведётся формулами Уэлфорда/Чана для
+объединения групп ‒ кусок прибавляется и вычитается за O(1), min/max ‒
+монотонные очереди кусков. Кусок, через который проходит граница окна,
+обрезается: пересчитывается только его остаток. Так на отсчёт приходится
+O(1) работы при любой длине окна, а не O(окно), как при пересчёте по
+массивам графиков.
+
+Скорость ‒ наклон МНК-прямой x(t) в окне, единиц в секунду. Для MIDA
+(log10 давления) это декады в секунду, по нему pumpdown_eta оценивает
+время до целевого давления.
+
+update() вызывается в потоке порта (как TelemetryTransport.push) и только
+складывает пачку: считать мелкие пачки по одной дорого (каждая ‒ десяток
+вызовов numpy на канал), поэтому они копятся до FLUSH_FRAMES кадров или
+до первого чтения результатов. Читать можно из любого потока.
+"""
+import math
+import threading
+from collections import deque
+from typing import NamedTuple
+
+import numpy as np
+
+CHANNELS = ("MIDA", "Magdischarge", "TEMP1", "TEMP2", "TMNrpm")
+WINDOWS = (10, 60, 600)            # с
+FLUSH_FRAMES = 256                 # сколько кадров копить до пересчёта
+
+# откачка: MIDA ‒ log10 давления
+PUMPDOWN_CHANNEL = "MIDA"
+PUMPDOWN_TARGET = -5.0
+PUMPDOWN_WINDOW = 60
+
+
+class Stats(NamedTuple):
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    rate: float                    # единиц в секунду; nan, пока в окне меньше двух моментов времени
+
+
+EMPTY = Stats(0, math.nan, math.nan, math.nan, math.nan, math.nan)
+
+
+class _Moments:
+    """Моменты группы отсчётов (t, x): складываются и вычитаются как группы."""
+
+    __slots__ = ("n", "mean_t", "mean_x", "m2", "c_tt", "c_tx")
+
+    def __init__(self, n=0, mean_t=0.0, mean_x=0.0, m2=0.0, c_tt=0.0, c_tx=0.0):
+        self.n = n
+        self.mean_t = mean_t
+        self.mean_x = mean_x
+        self.m2 = m2                # сумма (x - mean_x)^2
+        self.c_tt = c_tt            # сумма (t - mean_t)^2
+        self.c_tx = c_tx            # сумма (t - mean_t)(x - mean_x)
+
+    @classmethod
+    def of(cls, t: np.ndarray, x: np.ndarray) -> "_Moments":
+        n = len(x)
+        mean_t, mean_x = t.sum() / n, x.sum() / n
+        dt, dx = t - mean_t, x - mean_x
+        return cls(n, float(mean_t), float(mean_x), float(dx @ dx), float(dt @ dt), float(dt @ dx))
+
+    def add(self, other: "_Moments"):
+        if not other.n:
+            return
+        n = self.n + other.n
+        w = self.n * other.n / n
+        dt, dx = other.mean_t - self.mean_t, other.mean_x - self.mean_x
+        self.mean_t += dt * other.n / n
+        self.mean_x += dx * other.n / n
+        self.m2 += other.m2 + dx * dx * w
+        self.c_tt += other.c_tt + dt * dt * w
+        self.c_tx += other.c_tx + dt * dx * w
+        self.n = n
+
+    def remove(self, other: "_Moments"):
+        n = self.n - other.n
+        if n <= 0:
+            self.__init__()
+            return
+        mean_t = (self.n * self.mean_t - other.n * other.mean_t) / n
+        mean_x = (self.n * self.mean_x - other.n * other.mean_x) / n
+        w = n * other.n / self.n
+        dt, dx = other.mean_t - mean_t, other.mean_x - mean_x
+        self.m2 = max(self.m2 - other.m2 - dx * dx * w, 0.0)
+        self.c_tt = max(self.c_tt - other.c_tt - dt * dt * w, 0.0)
+        self.c_tx -= other.c_tx + dt * dx * w
+        self.n, self.mean_t, self.mean_x = n, mean_t, mean_x
+
+
+class _Chunk:
+    """Отсчёты одной пачки; не меняется (обрезка даёт новый кусок), поэтому общий для всех окон."""
+
+    __slots__ = ("t", "x", "moments", "min", "max", "end")
+
+    def __init__(self, t: np.ndarray, x: np.ndarray, moments: _Moments | None = None,
+                 low: float | None = None, high: float | None = None):
+        self.t = t
+        self.x = x
+        self.moments = moments or _Moments.of(t, x)
+        self.min = float(x.min()) if low is None else low
+        self.max = float(x.max()) if high is None else high
+        self.end = float(t[-1])
+
+    def after(self, horizon: float) -> "_Chunk | None":
+        """Отсчёты позже horizon (None ‒ таких нет)."""
+        keep = int(np.searchsorted(self.t, horizon, side="right"))
+        if keep >= len(self.t):
+            return None
+        return _Chunk(self.t[keep:], self.x[keep:])
+
+
+class WindowStats:
+    """Статистика одного канала в окне length секунд: (t_последний - length, t_последний]."""
+
+    def __init__(self, length: float):
+        self.length = length
+        self.chunks = deque()
+        self.total = _Moments()
+        self._mins = deque()        # куски по возрастанию min; старший кусок, если он тут, ‒ первый
+        self._maxs = deque()
+        self._removed = 0
+
+    def add(self, chunk: _Chunk):
+        self.chunks.append(chunk)
+        self.total.add(chunk.moments)
+        while self._mins and self._mins[-1].min >= chunk.min:
+            self._mins.pop()
+        self._mins.append(chunk)
+        while self._maxs and self._maxs[-1].max <= chunk.max:
+            self._maxs.pop()
+        self._maxs.append(chunk)
+
+    def evict(self, now: float):
+        """Убрать отсчёты старше now - length."""
+        horizon = now - self.length
+        chunks = self.chunks
+        while chunks and chunks[0].end <= horizon:
+            self._forget(chunks.popleft(), None)
+        if chunks and chunks[0].t[0] <= horizon:
+            old = chunks[0]
+            chunks[0] = new = old.after(horizon)
+            self._forget(old, new)
+            self.total.add(new.moments)
+
+        # вычитание накапливает ошибку округления ‒ раз в оборот окна итог собирается заново
+        if self._removed > 2 * len(chunks) + 16:
+            self.total = _Moments()
+            for chunk in chunks:
+                self.total.add(chunk.moments)
+            self._removed = 0
+
+    def _forget(self, old: _Chunk, new: _Chunk | None):
+        """old ушёл из начала окна; new ‒ его остаток. Остаток min/max не уменьшает."""
+        self.total.remove(old.moments)
+        self._removed += 1
+        for queue, better in ((self._mins, lambda a, b: a.min <= b.min), (self._maxs, lambda a, b: a.max >= b.max)):
+            if queue and queue[0] is old:
+                queue.popleft()
+                if new is not None and (not queue or better(new, queue[0])):
+                    queue.appendleft(new)
+
+    def stats(self) -> Stats:
+        m = self.total
+        if not m.n:
+            return EMPTY
+        std = math.sqrt(m.m2 / (m.n - 1)) if m.n > 1 else 0.0
+        rate = m.c_tx / m.c_tt if m.c_tt > 0 else math.nan
+        return Stats(m.n, m.mean_x, std, self._mins[0].min, self._maxs[0].max, rate)
+
+    def value_at(self, t: float) -> float:
+        """Значение МНК-прямой окна в момент t."""
+        m = self.total
+        if not m.n:
+            return math.nan
+        if m.c_tt <= 0:
+            return m.mean_x
+        return m.mean_x + m.c_tx / m.c_tt * (t - m.mean_t)
+
+
+class RollingStats:
+    """Скользящая статистика каналов по нескольким окнам для одного контроллера."""
+
+    def __init__(self, channels=CHANNELS, windows=WINDOWS):
+        self.channels = tuple(channels)
+        self.windows = tuple(windows)
+        self._stats = {(c, w): WindowStats(w) for c in self.channels for w in self.windows}
+        self._origin_ns = None      # время отсчитывается от первого кадра: точности float64 хватает на годы
+        self.last_t = None          # время последнего учтённого кадра, с от первого
+        self.samples = 0
+        self._pending = []          # (t_ns, {канал: значения}) ещё не учтённых пачек
+        self._pending_frames = 0
+        self._lock = threading.Lock()
+
+    def update(self, batch):
+        """batch ‒ ExchangeBatch (или любой объект с t_ns и batch[канал] -> массив)."""
+        self.update_arrays(batch.t_ns, {c: batch[c] for c in self.channels})
+
+    def push(self, t_ns: int, frame: dict):
+        """Один кадр в виде словаря полей."""
+        self.update_arrays(np.array([t_ns], dtype=np.int64), {c: [frame[c]] for c in self.channels})
+
+    def update_arrays(self, t_ns: np.ndarray, columns: dict):
+        if not len(t_ns):
+            return
+        with self._lock:
+            self._pending.append((t_ns, columns))
+            self._pending_frames += len(t_ns)
+            self.samples += len(t_ns)
+            if self._pending_frames >= FLUSH_FRAMES:
+                self._flush()
+
+    def _flush(self):
+        """Учесть накопленные пачки (вызывается под self._lock)."""
+        if not self._pending:
+            return
+        if len(self._pending) == 1:
+            t_ns, columns = self._pending[0]
+        else:
+            t_ns = np.concatenate([p[0] for p in self._pending])
+            columns = {c: np.concatenate([np.asarray(p[1][c], dtype=np.float64) for p in self._pending])
+                       for c in self.channels}
+        self._pending.clear()
+        self._pending_frames = 0
+
+        if self._origin_ns is None:
+            self._origin_ns = int(t_ns[0])
+        t = (np.asarray(t_ns, dtype=np.int64) - self._origin_ns) / 1e9
+        now = float(t[-1])
+        for channel, chunk in zip(self.channels, self._chunks(t, columns)):
+            for window in self.windows:
+                stats = self._stats[channel, window]
+                if chunk is not None:
+                    stats.add(chunk)
+                stats.evict(now)
+        self.last_t = now
+
+    def _chunks(self, t: np.ndarray, columns: dict) -> list:
+        """Куски пачки по каналам (None ‒ в пачке нет конечных значений канала).
+
+        Моменты считаются сразу для всех каналов матрицей каналы × кадры;
+        каналы с nan/inf ‒ по отдельности, без этих отсчётов.
+        """
+        x = np.array([columns[c] for c in self.channels], dtype=np.float64).reshape(len(self.channels), len(t))
+        finite = np.isfinite(x).all(axis=1)
+        n = len(t)
+        mean_t = t.sum() / n
+        dt = t - mean_t
+        c_tt = float(dt @ dt)
+        mean_x = x.sum(axis=1) / n
+        dx = x - mean_x[:, None]
+        m2 = np.einsum("ij,ij->i", dx, dx).tolist()
+        c_tx = (dx @ dt).tolist()
+        lows, highs = x.min(axis=1).tolist(), x.max(axis=1).tolist()
+        chunks = []
+        for i, mean in enumerate(mean_x.tolist()):
+            row = x[i]
+            if finite[i]:
+                moments = _Moments(n, float(mean_t), mean, m2[i], c_tt, c_tx[i])
+                chunks.append(_Chunk(t, row, moments, lows[i], highs[i]))
+            else:
+                keep = np.isfinite(row)
+                chunks.append(_Chunk(t[keep], row[keep]) if keep.any() else None)
+        return chunks
+
+    # ----------  результаты  ----------
+    def stats(self, channel: str, window: float) -> Stats:
+        with self._lock:
+            self._flush()
+            return self._stats[channel, window].stats()
+
+    def snapshot(self) -> dict:
+        """{канал: {окно: Stats}}."""
+        with self._lock:
+            self._flush()
+            return {c: {w: self._stats[c, w].stats() for w in self.windows} for c in self.channels}
+
+    def pumpdown_eta(self, target: float = PUMPDOWN_TARGET, channel: str = PUMPDOWN_CHANNEL,
+                     window: float = PUMPDOWN_WINDOW) -> float | None:
+        """Секунд до target по наклону канала в окне; None ‒ давление не падает или данных мало."""
+        with self._lock:
+            self._flush()
+            stats = self._stats[channel, window]
+            if stats.total.n < 2 or self.last_t is None:
+                return None
+            current = stats.value_at(self.last_t)
+            rate = stats.stats().rate
+        if current <= target:
+            return 0.0
+        if not rate < 0:
+            return None
+        return (target - current) / rate
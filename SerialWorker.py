@@ -1,213 +1,336 @@
-from main_imports import *
+import logging
+import struct
+import threading
+from collections import deque
+from time import monotonic, monotonic_ns
+
+import serial
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+
+from FrameParser import FrameParser, ExchangeBatch
+from EepromTransfer import EepromDump, EepromWrite
+from Correlator import Correlator
+from errors import EEPROM_TRANSFER_FAILED
+import PortDiscovery
+from PortDiscovery import Backoff
+from BufferWorker import CommandBuffer, Transmitter, PRIORITY_SAFETY, PRIORITY_NORMAL, PRIORITY_BULK
+
+# команды, которые обгоняют остальной трафик
+COMMAND_PRIORITY = {
+    0x01: PRIORITY_SAFETY,    # клапаны
+}
 
 class SerialWorker(QObject):
     data_received = pyqtSignal(dict)
+    batch_received = pyqtSignal(object)       # ExchangeBatch ‒ пачка кадров обмена
     error_occurred = pyqtSignal(str)
     connection_status = pyqtSignal(bool)      # True ‒ устройство есть, False ‒ потеряно
+    eeprom_progress = pyqtSignal(int, int)    # прочитано байт, всего байт
+    eeprom_dump_finished = pyqtSignal(int, bytes, float, str)   # начальный адрес, данные, байт/с, ошибка ("" ‒ нет)
+    eeprom_write_finished = pyqtSignal(list, str)  # записанные и проверенные блоки, ошибка ("" ‒ нет)
 
-    def __init__(self, port: str = "/dev/ttyUSB0", baudrate: int = 115200, timeout: int = 1):
+    def __init__(self, port: str = "/dev/ttyUSB0", baudrate: int = 115200, timeout: int = 1,
+                 device_id: str | None = None, discover: bool = False, handshake_timeout: float = 0.5,
+                 backoff: Backoff | None = None):
         super().__init__()
+        self.device_id = device_id    # метка контроллера в пакетах (несколько портов ‒ AcquisitionPool)
         self.port = port
         self.baudrate = baudrate
         self.timeout = timeout
 
-        self.sync_byte_exchange = 0xAA
-        self.sync_byte_error   = 0xBB
-        self.sync_byte_eprom   = 0xCC
+        # поиск контроллера: настроенный порт, последний удачный и (discover) все порты системы
+        self.discover = discover
+        self.handshake_timeout = handshake_timeout  # хватает на два кадра при 10 Гц с запасом
+        self.backoff = backoff or Backoff()
+        self.last_good_port = None    # порт, на котором контроллер отвечал в последний раз
+        self.connected_port = None
+        self.reconnects = 0
+        self.reconnect_seconds = None               # от потери связи до рукопожатия, последнее
+        self.reconnect_history = deque(maxlen=100)
+        self._lost_at = None
+        self._wakeup = threading.Event()            # прерывает паузу между попытками при stop()
+
+        self.parser = FrameParser(device_id)
+        self.recorder = None      # Recorder ‒ если задан, пишет каждый разобранный пакет
+        self.bytes_read = 0
 
         self.serial_connection = None
         self.is_running = True    # для корректной остановки из-вне
 
-        self.outgoing_buffer = Queue()
+        # отправка идёт своим потоком: run_input никогда не возвращается,
+        # и очередь слотов потока воркера до команд просто не доходит
+        self.outgoing_buffer = CommandBuffer()
+        # каждая команда регистрируется здесь, ответы 0xBB/0xCC сопоставляются с ней
+        self.correlator = Correlator()
+        self.transmitter = Transmitter(self.outgoing_buffer, lambda: self.serial_connection,
+                                       self.error_occurred.emit, on_sent=self.correlator.mark_sent)
+        self.eeprom_dump = None   # EepromDump ‒ пока идёт чтение диапазона
+        self.eeprom_write = None  # EepromWrite ‒ пока идёт запись с проверкой
 
+    # Слоты потокобезопасны и вызываются напрямую (Qt.DirectConnection) из GUI:
+    # они только собирают пакет и ставят его в очередь.
     @pyqtSlot(int, bytes)
     def handle_command(self, cmd_id: int, payload: bytes = b''):
-        self.outgoing_buffer.put([cmd_id, payload])
-        self.run_output()
+        try:
+            packet = self.build_command(cmd_id, payload)
+        except Exception as e:
+            self.error_occurred.emit(f"Ошибка при сборке/отправке команды: {e}")
+            logging.error(f"Ошибка при сборке/отправке команды: {e}")
+            return
+        self.request(cmd_id, packet, COMMAND_PRIORITY.get(cmd_id, PRIORITY_NORMAL)) \
+            .add_done_callback(self._report_failure)
 
     @pyqtSlot(int, int, bytes)
     def handle_eprom_command(self, command_id: int, address: int, data: bytes = b''):
-        self.outgoing_buffer.put([command_id, address, data])
-        self.run_output()
-
-    # ----------  парсинг пакетов  ----------
-    def parse_exchange_packet(self):
-        prot = {}
-        len1 = self.serial_connection.read(1)[0]
-        len4 = self.serial_connection.read(1)[0]
-        if len1 + 4 * len4 != 29:          # простой контроль длины
-            return
-        # 1-байтные
-        dt1 = [self.serial_connection.read(1)[0] for _ in range(len1)]
-        prot["ForVacuumState"], prot["TMNState"], prot["DU16"], prot["DU63"], \
-            prot["ElectroValveState"] = dt1[:len1]
-
-        # 4-байтные
-        dt4 = [self.serial_connection.read(4) for _ in range(len4)]
-        fields = ["TMNrpm", "MIDA", "Magdischarge", "ThermalIndicator",
-                  "TEMP1", "TEMP2", "Analogexit"]
-        for name, raw in zip(fields, dt4):
-            prot[name] = struct.unpack('<f', raw)[0] if name != "TMNrpm" else int.from_bytes(raw, 'little')
-
-        self.data_received.emit(prot)
-
-    def parse_error_packet(self):
-        prot = {
-            "CMD_ID":     self.serial_connection.read(1)[0],
-            "ERROR_CODE": self.serial_connection.read(1)[0],
-        }
-        length = self.serial_connection.read(1)[0]
-        prot["ERROR_INFO"] = self.serial_connection.read(length)
-        self.data_received.emit(prot)
-
-    def parse_eprom_packet(self):
         try:
-            cmd_id = self.serial_connection.read(1)[0]
-            if cmd_id != 0x12:
-                #self.error_occurred.emit(f"Неизвестный CMD_ID в EEPROM пакете: {cmd_id}")
-                return
-
-            length = self.serial_connection.read(1)[0]
-            data = self.serial_connection.read(length)
-
-            if len(data) != length:
-                self.error_occurred.emit("Неверная длина данных в EEPROM пакете")
-                return
-
-            # преобразуем в список int
-            data_list = list(data)
-
-            # можно послать в отдельный сигнал, если хочешь разделить
-            self.data_received.emit({
-                "EEPROM_READ": data_list
-            })
-            
+            packet = self.build_eprom_command(command_id, address, data)
         except Exception as e:
-            logging.error(f"Ошибка разбора EEPROM пакета: {e}")
-            self.error_occurred.emit(f"Ошибка разбора EEPROM пакета: {e}")
+            self.error_occurred.emit(f"Ошибка при сборке/отправке команды: {e}")
+            logging.error(f"Ошибка при сборке/отправке команды: {e}")
+            return
+        if command_id != 0x11:
+            self.request(command_id, packet, PRIORITY_BULK).add_done_callback(self._report_failure)
+            return
+        future = self.request(command_id, packet, PRIORITY_BULK, expect_length=packet[-1])
+        future.add_done_callback(lambda f: self._deliver_eeprom_read(f, address))
+
+    def request(self, cmd_id: int, packet: bytes, priority: int = PRIORITY_NORMAL,
+                expect_length: int | None = None, timeout: float | None = None):
+        """Зарегистрировать команду и поставить её в очередь; возвращает Future (см. Correlator)."""
+        future = self.correlator.register(cmd_id, packet, expect_length, timeout)
+        self.outgoing_buffer.add(packet, priority)
+        return future
+
+    def _report_failure(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            message = future.exception().args[0]
+            logging.error(message)
+            self.error_occurred.emit(message)
 
-    def send_command(self, cmd_id: int, payload: bytes = b''):
-        if not self.serial_connection or not self.serial_connection.is_open:
-            self.error_occurred.emit("Порт не открыт — команда не отправлена")
+    def _deliver_eeprom_read(self, future, address: int):
+        if future.cancelled() or future.exception() is not None:
+            self._report_failure(future)
             return
+        self.data_received.emit(dict(future.result(), ADDRESS=address))
 
+    @pyqtSlot(int, int)
+    def read_eeprom_range(self, start: int, length: int, window: int = 4):
+        """Прочитать length байт EEPROM с адреса start конвейером запросов 0x11.
+
+        Работает в отдельном потоке; ход чтения ‒ eeprom_progress,
+        результат (или ошибка) ‒ eeprom_dump_finished.
+        """
+        if self.eeprom_dump is not None or self.eeprom_write is not None:
+            self.eeprom_dump_finished.emit(start, b"", 0.0, "Чтение или запись EEPROM уже идёт")
+            return
         try:
-            header = bytes([0xAA])
-            cmd = bytes([cmd_id])
-            payload_len = bytes([len(payload)])
-            packet = header + cmd + payload_len + payload
-            self.serial_connection.write(packet)
-        except Exception as e:
-            logging.error(f"Ошибка отправки команды: {e}")
-            self.error_occurred.emit(f"Ошибка отправки команды: {e}")
+            dump = EepromDump(start, length, self._request_eeprom_chunk, window=window)
+        except ValueError as e:
+            self.eeprom_dump_finished.emit(start, b"", 0.0, str(e))
+            return
+        self.eeprom_dump = dump
+        threading.Thread(target=self._run_eeprom_dump, args=(dump,), name="EepromDump",
+                         daemon=True).start()
+
+    def _request_eeprom_chunk(self, address: int, count: int):
+        return self.request(0x11, self.build_eprom_command(0x11, address, bytes([count])),
+                            PRIORITY_BULK, expect_length=count)
 
-    def send_eprom_command(self, command_id: int, address: int, data: bytes = b''):
-        if not self.serial_connection or not self.serial_connection.is_open:
-            self.error_occurred.emit("Порт не открыт — команда к EEPROM не отправлена")
+    def _run_eeprom_dump(self, dump: EepromDump):
+        try:
+            data = dump.run(self.eeprom_progress.emit)
+        except EEPROM_TRANSFER_FAILED as e:
+            logging.error(f"Ошибка чтения EEPROM: {e}")
+            self.eeprom_dump_finished.emit(dump.start, b"", 0.0, f"Ошибка чтения EEPROM: {e}")
             return
+        finally:
+            self.eeprom_dump = None
+        logging.info(f"EEPROM: {dump.length} байт за {dump.elapsed:.2f} с, "
+                     f"{dump.bytes_per_s:.0f} Б/с, повторов {dump.retried}")
+        self.eeprom_dump_finished.emit(dump.start, data, dump.bytes_per_s, "")
+
+    @pyqtSlot(list)
+    def write_eeprom(self, blocks: list, window: int = 4):
+        """Записать блоки [(адрес, данные)] командами 0x10 и проверить чтением.
 
+        Работает в отдельном потоке; ход проверки ‒ eeprom_progress,
+        итог ‒ eeprom_write_finished.
+        """
+        if self.eeprom_dump is not None or self.eeprom_write is not None:
+            self.eeprom_write_finished.emit([], "Чтение или запись EEPROM уже идёт")
+            return
         try:
-            header = bytes([0xCC])
-            cmd = bytes([command_id])
-            addr = struct.pack('<H', address)
-
-            if command_id == 0x10:  # запись
-                length = bytes([2 + len(data)])  # 2 байта адрес + данные
-                packet = header + cmd + length + addr + data
-            elif command_id == 0x11:  # чтение
-                num_bytes = bytes([len(data)]) if data else b'\x01'  # по умолчанию читаем 1 байт
-                packet = header + cmd + addr + num_bytes
-            else:
-                self.error_occurred.emit("Неизвестная команда для EEPROM")
-                return
-
-            self.serial_connection.write(packet)
-        except Exception as e:
-            logging.error(f"Ошибка отправки команды: {e}")
-            self.error_occurred.emit(f"Ошибка отправки EEPROM-команды: {e}")
+            job = EepromWrite(blocks, self._request_eeprom_write, self._request_eeprom_chunk, window=window)
+        except ValueError as e:
+            self.eeprom_write_finished.emit([], str(e))
+            return
+        self.eeprom_write = job
+        threading.Thread(target=self._run_eeprom_write, args=(job,), name="EepromWrite",
+                         daemon=True).start()
 
-    # ----------  работа с портом  ----------
-    def _open_port(self) -> bool:
-        """Пробует открыть порт; True ‒ открылся и готов, False ‒ нет."""
+    def _request_eeprom_write(self, address: int, data: bytes):
+        return self.request(0x10, self.build_eprom_command(0x10, address, data), PRIORITY_BULK)
+
+    def _run_eeprom_write(self, job: EepromWrite):
         try:
-            self.serial_connection = serial.Serial(
-                port=self.port,
-                baudrate=self.baudrate,
-                timeout=self.timeout
-            )
-            return True
-        except Exception as e:
-            logging.error(f"Connection error: {e}")
-            self.error_occurred.emit(f"Connection error: {e}")
-            self.serial_connection = None
-            return False
+            blocks = job.run(self.eeprom_progress.emit)
+        except EEPROM_TRANSFER_FAILED as e:
+            logging.error(f"Ошибка записи EEPROM: {e}")
+            self.eeprom_write_finished.emit([], f"Ошибка записи EEPROM: {e}")
+            return
+        finally:
+            self.eeprom_write = None
+        logging.info(f"EEPROM: записано {job.bytes_total} байт командами 0x10 ({job.packets_sent} шт., "
+                     f"повторно {job.rewritten}) с проверкой за {job.elapsed:.2f} с")
+        self.eeprom_write_finished.emit(blocks, "")
+
+    # ----------  сборка пакетов  ----------
+    @staticmethod
+    def build_command(cmd_id: int, payload: bytes = b'') -> bytes:
+        header = bytes([0xAA])
+        cmd = bytes([cmd_id])
+        payload_len = bytes([len(payload)])
+        return header + cmd + payload_len + payload
+
+    @staticmethod
+    def build_eprom_command(command_id: int, address: int, data: bytes = b'') -> bytes:
+        header = bytes([0xCC])
+        cmd = bytes([command_id])
+        addr = struct.pack('<H', address)
+
+        if command_id == 0x10:  # запись
+            length = bytes([2 + len(data)])  # 2 байта адрес + данные
+            return header + cmd + length + addr + data
+        elif command_id == 0x11:  # чтение: data ‒ один байт с количеством
+            num_bytes = data[:1] if data else b'\x01'  # по умолчанию читаем 1 байт
+            return header + cmd + addr + num_bytes
+        raise ValueError("Неизвестная команда для EEPROM")
+
+    # ----------  работа с портом  ----------
+    def _connect(self) -> bytes | None:
+        """Найти контроллер; при успехе возвращает первые байты с линии (с первого кадра обмена).
+
+        Кандидаты опрашиваются параллельно, каждый ждёт двух кадров обмена
+        подряд не дольше handshake_timeout. Кроме имён устройств понимает URL pyserial:
+        socket://хост:порт, loop:// и т.п. (воспроизведение, симулятор).
+        """
+        ports = PortDiscovery.candidate_ports(self.port, self.last_good_port, self.discover)
+        found = PortDiscovery.discover(ports, self.baudrate, self.handshake_timeout)
+        if found is None:
+            return None
+        port, connection, first = found
+        connection.timeout = self.timeout
+        PortDiscovery.claim(port)
+        if port != self.port and port != self.last_good_port:
+            logging.info(f"Контроллер найден на {port} (настроен {self.port})")
+        self.serial_connection = connection
+        self.connected_port = self.last_good_port = port
+        return first
 
     def _close_port(self):
         if self.serial_connection and self.serial_connection.is_open:
             self.serial_connection.close()
         self.serial_connection = None
+        if self.connected_port:
+            PortDiscovery.release(self.connected_port)
+            self.connected_port = None
 
     # ----------  главный цикл потока  ----------
     def run_input(self):
+        self.correlator.start()
+        self.transmitter.start()
         while self.is_running:
-            # 1. Пытаемся найти устройство
-            while self.is_running and not self._open_port():
-                sleep(1)
-
+            # 1. Ищем устройство; между неудачными попытками ‒ растущая пауза
+            b = self._connect()
+            if b is None:
+                self._wakeup.wait(self.backoff.next())
+                continue
             if not self.is_running:
-                break
-            b = self.serial_connection.read(1)
-            try:
-                if b != b'\xAA':
-                    raise serial.SerialException("Handshake byte not received")
-            except Exception as e:
-                logging.error(f"Connection error: {e}")
-                self.error_occurred.emit(str(e))
                 self._close_port()
-                continue
+                break
             # Устройство нашлось
+            self.backoff.reset()
+            if self._lost_at is not None:
+                self.reconnects += 1
+                self.reconnect_seconds = monotonic() - self._lost_at
+                self.reconnect_history.append(self.reconnect_seconds)
+                logging.info(f"Связь восстановлена на {self.connected_port} "
+                             f"за {self.reconnect_seconds * 1000:.0f} мс")
+                self._lost_at = None
             self.connection_status.emit(True)
 
-            # 2. Читаем данные, пока порт открыт
+            # 2. Читаем данные, пока порт открыт: всё, что накопилось, одним вызовом.
+            #    Байты опроса ‒ уже кадры обмена, отдаём их разборщику.
+            self.parser.reset()
+            self.bytes_read += len(b)
+            self._dispatch(self.parser.feed(b, monotonic_ns()))
             while self.is_running and self.serial_connection and self.serial_connection.is_open:
                 try:
-                    byte = self.serial_connection.read(1)
-                    if not byte:
-                        continue
-                    if byte[0] == self.sync_byte_exchange:
-                        self.parse_exchange_packet()
-                    elif byte[0] == self.sync_byte_error:
-                        self.parse_error_packet()
-                    elif byte[0] == self.sync_byte_eprom:
-                        self.parse_eprom_packet()
-                    else:
+                    chunk = self.serial_connection.read(self.serial_connection.in_waiting or 1)
+                    if not chunk:
                         continue
+                    self.bytes_read += len(chunk)
+                    self._dispatch(self.parser.feed(chunk, monotonic_ns()))
                 except serial.SerialException as e:
+                    if not self.is_running:
+                        break             # порт закрыл stop()
                     self.error_occurred.emit(f"Read error: {e}")
                     logging.error(f"Read error: {e}")
                     break
                 except Exception as e:
+                    if not self.is_running:
+                        break
                     self.error_occurred.emit(f"Parse error: {e}")
                     logging.error(f"Parse error: {e}")
 
             # 3. Если мы здесь ‒ порт пропал
             self._close_port()
+            if self.is_running:
+                self._lost_at = monotonic()
             self.connection_status.emit(False)
 
-    def run_output(self):
-        while not self.outgoing_buffer.empty():
-            try:
-                dt = self.outgoing_buffer.get()
-                if len(dt) == 2:
-                    self.send_command(dt[0], dt[1])
-                elif len(dt) == 3:
-                    self.send_eprom_command(dt[0], dt[1], dt[2])
+    def _dispatch(self, packets: list):
+        """Разобранные пакеты ‒ в запись и сигналы; ответы на команды забирает коррелятор."""
+        for packet in packets:
+            if self.recorder:
+                self.recorder.record(packet)
+            if isinstance(packet, ExchangeBatch):
+                self.batch_received.emit(packet)
+            elif not self.correlator.match(packet):
+                self.data_received.emit(packet)
 
-            except Exception as e:
-                self.error_occurred.emit(f"Ошибка при сборке/отправке команды: {e}")
-                logging.error(f"Ошибка при сборке/отправке команды: {e}")
+    # ----------  счётчики  ----------
+    def stats(self) -> dict:
+        """Снимок счётчиков для метрик (Metrics.WORKER_METRICS); можно звать из любого потока."""
+        correlator = self.correlator
+        stats = {
+            "bytes_read": self.bytes_read,
+            "frames": dict(self.parser.frame_counts),
+            "resyncs": self.parser.resyncs,
+            "length_errors": self.parser.length_errors,
+            "outgoing_queue": len(self.outgoing_buffer),
+            "commands_sent": self.transmitter.packets_sent,
+            "in_flight": correlator.in_flight,
+            "replies": {"matched": correlator.matched, "expired": correlator.expired, "lost": correlator.lost,
+                        "device_error": correlator.device_errors, "stray": correlator.stray},
+            "latency_seconds": {f"0x{cmd:02X}": hist for cmd, hist in list(correlator.histograms.items())},
+            "connected": self.connected_port is not None,
+            "reconnects": self.reconnects,
+            "reconnect_seconds": self.reconnect_seconds,
+        }
+        if self.recorder:
+            stats["records_written"] = self.recorder.records_written
+            stats["records_dropped"] = self.recorder.records_dropped
+        return stats
 
     # ----------  остановка  ----------
     def stop(self):
         self.is_running = False
+        self._wakeup.set()
+        if self.eeprom_dump:
+            self.eeprom_dump.cancel()
+        if self.eeprom_write:
+            self.eeprom_write.cancel()
+        self.transmitter.stop()
+        self.correlator.stop()
         self._close_port()
\ No newline at end of file
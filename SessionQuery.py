@@ -0,0 +1,329 @@
+"""Выборка из записанных сеансов по времени и потоковая выгрузка в CSV/NPZ.
+
+    python SessionQuery.py records --info
+    python SessionQuery.py records --start 02:10 --end 02:40 --channels TEMP1,MIDA --output night.csv
+    python SessionQuery.py records/ст1 --start "2024-05-01 02:10" --end "2024-05-01 02:40" --output night.npz
+
+Для каждого сегмента (.exch, см. Recorder) строится разреженный индекс:
+t_ns каждой BLOCK-й записи. Он сохраняется рядом с сегментом
+(<сегмент>.idx.npz) и дополняется, если сегмент ещё пишется. Чтобы найти
+границы интервала, читаются только индекс и по одному блоку t_ns на каждую
+границу. Сами данные отображаются в память кусками по chunk_records
+записей: из куска копируются только нужные каналы, после чего отображение
+закрывается. Поэтому память не растёт с размером файла и длиной интервала.
+
+Время в запросах и результатах ‒ настенное, нс от эпохи (time.time_ns):
+wall = wall_ns + (t_ns - mono_ns) по заголовку сегмента.
+"""
+import argparse
+import csv
+import glob
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from FrameParser import EXCHANGE_FIELDS
+from Recorder import EXCHANGE_RECORD_DTYPE, HEADER_SIZE, KIND_EXCHANGE, read_header
+
+BLOCK = 4096                 # записей на отметку индекса (160 КБ кадров)
+CHUNK = 65536                # записей в куске выдачи
+INDEX_SUFFIX = ".idx.npz"
+
+
+class SegmentIndex:
+    """Разреженный индекс одного .exch: marks[k] ‒ t_ns записи k * block."""
+
+    def __init__(self, path: str, block: int = BLOCK):
+        header = read_header(path)
+        if int(header["kind"]) != KIND_EXCHANGE:
+            raise ValueError(f"{path}: не файл кадров обмена")
+        self.path = path
+        self.block = block
+        self.offset_ns = int(header["wall_ns"]) - int(header["mono_ns"])     # wall = t_ns + offset_ns
+        self.count = 0
+        self.marks = np.empty(0, dtype=np.int64)
+        self.last_t_ns = None
+        self._load()
+        self.refresh()
+
+    # ----------  индекс  ----------
+    def _load(self):
+        try:
+            with np.load(self.path + INDEX_SUFFIX) as saved:
+                if int(saved["block"]) == self.block:
+                    self.count, self.marks = int(saved["count"]), saved["marks"]
+        except (OSError, KeyError, ValueError):
+            pass                      # нет индекса или он чужой ‒ строим заново
+
+    def _save(self):
+        try:
+            with open(self.path + INDEX_SUFFIX, "wb") as f:
+                np.savez(f, block=self.block, count=self.count, marks=self.marks)
+        except OSError as e:          # каталог только для чтения ‒ индекс живёт в памяти
+            logging.debug(f"Индекс {self.path} не сохранён: {e}")
+
+    def refresh(self) -> bool:
+        """Дописать индекс, если сегмент вырос; True ‒ были новые записи."""
+        count = (os.path.getsize(self.path) - HEADER_SIZE) // EXCHANGE_RECORD_DTYPE.itemsize
+        if count < self.count:        # файл подменили ‒ индекс заново
+            self.count, self.marks = 0, np.empty(0, dtype=np.int64)
+        if count > self.count:
+            first = len(self.marks) * self.block
+            if first < count:
+                # шаг block: с диска читается по странице на отметку
+                new = np.array(self._map(first, count)["t_ns"][::self.block], dtype=np.int64)
+                self.marks = np.concatenate([self.marks, new])
+            self.count = count
+            self._save()
+            grown = True
+        else:
+            grown = False
+        if self.count and (grown or self.last_t_ns is None):
+            self.last_t_ns = int(self._map(self.count - 1, self.count)["t_ns"][0])
+        return grown
+
+    def _map(self, lo: int, hi: int) -> np.ndarray:
+        """Записи [lo, hi) через np.memmap только этого диапазона."""
+        if hi <= lo:
+            return np.empty(0, dtype=EXCHANGE_RECORD_DTYPE)
+        return np.memmap(self.path, dtype=EXCHANGE_RECORD_DTYPE, mode="r",
+                         offset=HEADER_SIZE + lo * EXCHANGE_RECORD_DTYPE.itemsize, shape=(hi - lo,))
+
+    # ----------  время  ----------
+    @property
+    def start_ns(self) -> int | None:
+        return int(self.marks[0]) + self.offset_ns if len(self.marks) else None
+
+    @property
+    def end_ns(self) -> int | None:
+        return self.last_t_ns + self.offset_ns if self.last_t_ns is not None else None
+
+    def locate(self, start_ns: int, end_ns: int) -> tuple:
+        """Номера записей [lo, hi) с настенным временем в [start_ns, end_ns]."""
+        if not self.count:
+            return 0, 0
+        return self._position(start_ns - self.offset_ns, "left"), self._position(end_ns - self.offset_ns, "right")
+
+    def _position(self, t_ns: int, side: str) -> int:
+        # блок по индексу, точное место ‒ поиском в t_ns одного блока
+        block = max(int(np.searchsorted(self.marks, t_ns, side="right")) - 1, 0)
+        lo = block * self.block
+        times = self._map(lo, min(lo + self.block, self.count))["t_ns"]
+        return lo + int(np.searchsorted(times, np.uint64(max(t_ns, 0)), side=side))
+
+
+class QueryChunk:
+    """Кусок результата: wall_ns (настенное время, нс) и столбцы каналов; chunk["TEMP1"] -> массив."""
+
+    __slots__ = ("wall_ns", "columns")
+
+    def __init__(self, wall_ns: np.ndarray, columns: dict):
+        self.wall_ns = wall_ns
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.wall_ns)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+
+class SessionQuery:
+    """Все сегменты каталога записи (одного устройства), упорядоченные по времени."""
+
+    def __init__(self, directory: str, block: int = BLOCK):
+        self.directory = directory
+        self.segments = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.exch"))):
+            try:
+                segment = SegmentIndex(path, block)
+            except (OSError, ValueError) as e:
+                logging.error(f"Сегмент {path} пропущен: {e}")
+                continue
+            if segment.count:
+                self.segments.append(segment)
+        self.segments.sort(key=lambda s: s.start_ns)
+
+    @property
+    def start_ns(self) -> int | None:
+        return self.segments[0].start_ns if self.segments else None
+
+    @property
+    def end_ns(self) -> int | None:
+        return max(s.end_ns for s in self.segments) if self.segments else None
+
+    def _ranges(self, start_ns: int, end_ns: int) -> list:
+        ranges = []
+        for segment in self.segments:
+            if segment.end_ns < start_ns or segment.start_ns > end_ns:
+                continue
+            lo, hi = segment.locate(start_ns, end_ns)
+            if hi > lo:
+                ranges.append((segment, lo, hi))
+        return ranges
+
+    def count(self, start_ns: int, end_ns: int) -> int:
+        return sum(hi - lo for _, lo, hi in self._ranges(start_ns, end_ns))
+
+    def chunks(self, start_ns: int, end_ns: int, channels=None, chunk_records: int = CHUNK):
+        """Куски QueryChunk по chunk_records записей за [start_ns, end_ns]."""
+        channels = list(channels or EXCHANGE_FIELDS)
+        unknown = [c for c in channels if c not in EXCHANGE_FIELDS]
+        if unknown:
+            raise ValueError(f"Неизвестные каналы: {', '.join(unknown)}")
+        for segment, lo, hi in self._ranges(start_ns, end_ns):
+            for first in range(lo, hi, chunk_records):
+                records = segment._map(first, min(first + chunk_records, hi))
+                wall = records["t_ns"].astype(np.int64) + segment.offset_ns
+                columns = {c: np.array(records[c]) for c in channels}
+                del records               # отображение закрывается, в памяти ‒ только копии столбцов
+                yield QueryChunk(wall, columns)
+
+    # ----------  выгрузка  ----------
+    def to_csv(self, path: str, start_ns: int, end_ns: int, channels=None, chunk_records: int = CHUNK) -> int:
+        """CSV: time (местное, до мс) и каналы; возвращает число строк."""
+        channels = list(channels or EXCHANGE_FIELDS)
+        rows = 0
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["time"] + channels)
+            for chunk in self.chunks(start_ns, end_ns, channels, chunk_records):
+                # float32 ‒ кратчайшей записью, которая читается обратно в то же число (99.12517, а не 99.12516784667969)
+                columns = [chunk[c].astype(str).tolist() if chunk[c].dtype.kind == "f" else chunk[c].tolist()
+                           for c in channels]
+                writer.writerows(zip(format_times(chunk.wall_ns), *columns))
+                rows += len(chunk)
+        return rows
+
+    def to_npz(self, path: str, start_ns: int, end_ns: int, channels=None, chunk_records: int = CHUNK) -> int:
+        """NPZ: time_ns (настенное, нс) и по массиву на канал; возвращает число записей.
+
+        np.savez держал бы всё в памяти ‒ здесь каждый массив пишется
+        кусками во временный .npy, а потом переносится в архив.
+        """
+        channels = list(channels or EXCHANGE_FIELDS)
+        total = self.count(start_ns, end_ns)
+        dtypes = {"time_ns": np.dtype(np.int64)}
+        dtypes.update({c: EXCHANGE_RECORD_DTYPE[c] for c in channels})
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as tmp:
+            files = {}
+            try:
+                for name, dtype in dtypes.items():
+                    f = files[name] = open(os.path.join(tmp, name + ".npy"), "wb")
+                    np.lib.format.write_array_header_2_0(
+                        f, {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": (total,)})
+                written = 0
+                for chunk in self.chunks(start_ns, end_ns, channels, chunk_records):
+                    files["time_ns"].write(chunk.wall_ns.tobytes())
+                    for c in channels:
+                        files[c].write(chunk[c].astype(dtypes[c], copy=False).tobytes())
+                    written += len(chunk)
+            finally:
+                for f in files.values():
+                    f.close()
+            if written != total:          # сегмент дописывался во время выгрузки
+                raise ValueError(f"Записей выгружено {written}, ожидалось {total}")
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for name in dtypes:
+                    archive.write(os.path.join(tmp, name + ".npy"), name + ".npy")
+        return total
+
+
+# ----------  вспомогательное  ----------
+def format_times(wall_ns: np.ndarray) -> list:
+    """Настенное время -> "ГГГГ-ММ-ДД чч:мм:сс.ммм" местного времени (смещение пояса ‒ по первой записи)."""
+    if not len(wall_ns):
+        return []
+    offset = time.localtime(int(wall_ns[0]) // 1_000_000_000).tm_gmtoff * 1_000_000_000
+    text = np.datetime_as_string((wall_ns + offset).astype("datetime64[ns]"), unit="ms")
+    return np.char.replace(text, "T", " ").tolist()
+
+
+def decimate(chunk: QueryChunk, factor: int) -> QueryChunk:
+    """Огибающая min/max по блокам из factor записей (две точки на блок) ‒ для показа длинных интервалов."""
+    if factor <= 1 or len(chunk) <= 2:
+        return chunk
+    blocks = -(-len(chunk) // factor)
+    pad = blocks * factor - len(chunk)
+    columns = {}
+    for name, values in chunk.columns.items():
+        v = values.astype(np.float64)
+        if pad:
+            v = np.concatenate([v, np.full(pad, v[-1])])
+        v = v.reshape(blocks, factor)
+        columns[name] = np.column_stack([v.min(axis=1), v.max(axis=1)]).ravel()
+    starts = chunk.wall_ns[::factor]
+    ends = chunk.wall_ns[np.minimum(np.arange(blocks) * factor + factor - 1, len(chunk) - 1)]
+    return QueryChunk(np.column_stack([starts, (starts + ends) // 2]).ravel(), columns)
+
+
+def parse_time(text: str, now: datetime | None = None) -> int:
+    """"ГГГГ-ММ-ДД чч:мм[:сс]" или "чч:мм[:сс]" (последний такой момент, не позже now) -> нс."""
+    now = now or datetime.now()
+    text = text.strip()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return int(datetime.strptime(text, fmt).timestamp() * 1e9)
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            parsed = datetime.strptime(text, fmt).time()
+        except ValueError:
+            continue
+        moment = datetime.combine(now.date(), parsed)
+        if moment > now:
+            moment -= timedelta(days=1)          # «02:10» днём ‒ это прошлая ночь
+        return int(moment.timestamp() * 1e9)
+    raise ValueError(f"Не понимаю время «{text}»: ожидается ГГГГ-ММ-ДД чч:мм[:сс] или чч:мм[:сс]")
+
+
+def _format_ns(ns: int) -> str:
+    return datetime.fromtimestamp(ns / 1e9).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выборка из записей NIIM по времени")
+    parser.add_argument("directory", help="каталог сегментов (records или records/<устройство>)")
+    parser.add_argument("--info", action="store_true", help="показать сегменты и их интервалы")
+    parser.add_argument("--start", help="начало: ГГГГ-ММ-ДД чч:мм[:сс] или чч:мм[:сс]")
+    parser.add_argument("--end", help="конец (чч:мм ‒ ближайший такой момент после начала)")
+    parser.add_argument("--channels", help=f"через запятую, по умолчанию все: {','.join(EXCHANGE_FIELDS)}")
+    parser.add_argument("--output", help="файл .csv или .npz")
+    parser.add_argument("--chunk", type=int, default=CHUNK, help="записей в куске (память ~ chunk × каналы)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    session = SessionQuery(args.directory)
+    if not session.segments:
+        parser.error(f"в {args.directory} нет сегментов .exch")
+    if args.info or not args.output:
+        for s in session.segments:
+            print(f"{os.path.basename(s.path)}: {_format_ns(s.start_ns)} ‒ {_format_ns(s.end_ns)}, {s.count} записей")
+        if not args.output:
+            return
+
+    if not args.output.endswith((".csv", ".npz")):
+        parser.error("--output: ожидается .csv или .npz")
+    started = time.perf_counter()
+    try:
+        start = parse_time(args.start) if args.start else session.start_ns
+        # чч:мм конца ‒ ближайший такой момент после начала: «--start 23:30 --end 01:00» ‒ через полночь
+        end = parse_time(args.end, datetime.fromtimestamp(start / 1e9) + timedelta(days=1)) if args.end \
+            else session.end_ns
+        channels = args.channels.split(",") if args.channels else None
+        export = session.to_npz if args.output.endswith(".npz") else session.to_csv
+        rows = export(args.output, start, end, channels, args.chunk)
+    except ValueError as e:
+        parser.error(str(e))
+    logging.info(f"{args.output}: {rows} записей за {_format_ns(start)} ‒ {_format_ns(end)}, "
+                 f"{time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
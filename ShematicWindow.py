@@ -1,4 +1,52 @@
+from time import perf_counter
+
 from main_imports import *
+from Metrics import Histogram, UPDATE_BUCKETS_MS
+
+# ----------  привязка схемы к кадру обмена  ----------
+# ElectroValveState: бит (N-1) ‒ клапан VN. VF в байте состояния нет.
+VALVE_BITS = {"V1": 0, "V2": 1, "V3": 2, "V4": 3, "V5": 4, "V6": 5, "V7": 6, "V8": 7}
+PUMP_FIELDS = {"NR": "ForVacuumState", "NI": "TMNState"}
+# датчик -> (канал, канал уже в log10); у P3 своего канала в кадре нет
+GAUGE_CHANNELS = {"P1": ("MIDA", True), "P2": ("Magdischarge", False)}
+GAUGE_DECADES = (-7.0, 3.0)      # шкала датчика: log10 давления, стрелка 0°..180°
+
+# кисти и перья создаются один раз: смена состояния ‒ только setBrush готового объекта
+VALVE_BRUSHES = {None: QBrush(QColor("gray")), False: QBrush(QColor("gray")), True: QBrush(QColor("green"))}
+PUMP_BRUSHES = {None: QBrush(QColor("gray")), False: QBrush(QColor("gray")), True: QBrush(QColor("blue"))}
+PUMP_BODY_BRUSH = QBrush(QColor("lightblue"))
+LABEL_FONT = QFont()
+LABEL_FONT.setBold(True)
+
+
+def schematic_state(frame: dict) -> dict:
+    """Состояние элементов схемы по кадру обмена: клапаны и насосы ‒ bool, датчики ‒ угол стрелки."""
+    state = {}
+    valves = frame.get("ElectroValveState")
+    if valves is not None:
+        for name, bit in VALVE_BITS.items():
+            state[name] = bool(valves >> bit & 1)
+    for name, field in PUMP_FIELDS.items():
+        if field in frame:
+            state[name] = bool(frame[field])
+    for name, (channel, is_log) in GAUGE_CHANNELS.items():
+        angle = gauge_angle(frame.get(channel), is_log)
+        if angle is not None:
+            state[name] = angle
+    return state
+
+
+def gauge_angle(value, is_log: bool = False) -> float | None:
+    """Угол стрелки: 180° ‒ верх шкалы (атмосфера), 0° ‒ низ (глубокий вакуум)."""
+    if value is None or value != value:
+        return None
+    if not is_log:
+        if value <= 0:
+            return 0.0
+        value = math.log10(value)
+    low, high = GAUGE_DECADES
+    return 180.0 * min(max((value - low) / (high - low), 0.0), 1.0)
+
 
 class ValveSymbol(QGraphicsPolygonItem):
     def __init__(self, label, set, center_x, center_y, orientation='h'):
@@ -34,14 +82,13 @@ class ValveSymbol(QGraphicsPolygonItem):
 
         self.triangle1_item = QGraphicsPolygonItem(triangle1)
         self.triangle2_item = QGraphicsPolygonItem(triangle2)
-        self.triangle1_item.setBrush(QBrush(QColor("gray")))
-        self.triangle2_item.setBrush(QBrush(QColor("gray")))
+        self.state = None               # None ‒ состояние ещё не пришло
+        self.triangle1_item.setBrush(VALVE_BRUSHES[None])
+        self.triangle2_item.setBrush(VALVE_BRUSHES[None])
 
         # Добавляем подпись слева от клапана
         self.label_item = QGraphicsTextItem(label)
-        font = QFont()
-        font.setBold(True)
-        self.label_item.setFont(font)
+        self.label_item.setFont(LABEL_FONT)
         if set == "l":
             label_x = center_x - size - 30
             label_y = center_y - 10
@@ -61,26 +108,28 @@ class ValveSymbol(QGraphicsPolygonItem):
         scene.addItem(self.triangle2_item)
         scene.addItem(self.label_item)
 
+    def set_state(self, is_open: bool):
+        self.state = is_open
+        brush = VALVE_BRUSHES[is_open]
+        self.triangle1_item.setBrush(brush)
+        self.triangle2_item.setBrush(brush)
+
     def toggle_color(self):
-        current_color = self.triangle1_item.brush().color().name()
-        new_color = "green" if current_color == "#808080" else "gray"
-        self.triangle1_item.setBrush(QBrush(QColor(new_color)))
-        self.triangle2_item.setBrush(QBrush(QColor(new_color)))
+        self.set_state(not self.state)
 
 class PumpSymbol(QGraphicsRectItem):
     def __init__(self, name, center_x, center_y):
         size = 40
         super().__init__(center_x - size / 2, center_y - size / 2, size, size)
-        self.setBrush(QBrush(QColor("lightblue")))
+        self.setBrush(PUMP_BODY_BRUSH)
 
         circle = QGraphicsEllipseItem(center_x - size / 4, center_y - size / 4, size / 2, size / 2)
-        circle.setBrush(QBrush(QColor("blue")))
+        circle.setBrush(PUMP_BRUSHES[None])
         self.circle = circle
+        self.state = None
 
         self.label_item = QGraphicsTextItem(name)
-        font = QFont()
-        font.setBold(True)
-        self.label_item.setFont(font)
+        self.label_item.setFont(LABEL_FONT)
         self.label_item.setPos(center_x - size - 5, center_y - 10)
 
     def add_to_scene(self, scene):
@@ -88,6 +137,10 @@ class PumpSymbol(QGraphicsRectItem):
         scene.addItem(self.circle)
         scene.addItem(self.label_item)
 
+    def set_state(self, running: bool):
+        self.state = running
+        self.circle.setBrush(PUMP_BRUSHES[running])
+
 class VacuumGauge:
     def __init__(self, name, set, center_x, center_y, radius=15):
         self.center_x = center_x
@@ -102,12 +155,12 @@ class VacuumGauge:
         # Красная стрелка
         self.arrow = QGraphicsLineItem()
         self.arrow.setPen(QPen(Qt.red, 2))
+        self.angle = 0.0
+        self.target = 0.0               # куда идёт стрелка (см. SchematicWidget.animate)
         self.set_angle(0)
 
         self.label = QGraphicsTextItem(name)
-        font = QFont()
-        font.setBold(True)
-        self.label.setFont(font)
+        self.label.setFont(LABEL_FONT)
         if set == "l":
             label_x = center_x - radius - 30
             label_y = center_y - 10
@@ -123,6 +176,7 @@ class VacuumGauge:
         self.label.setPos(label_x, label_y)
 
     def set_angle(self, angle_deg):
+        self.angle = angle_deg
         angle_rad = math.radians(angle_deg)
         end_x = self.center_x + self.radius * math.cos(angle_rad)
         end_y = self.center_y - self.radius * math.sin(angle_rad)
@@ -134,6 +188,17 @@ class VacuumGauge:
         scene.addItem(self.label)
 
 class SchematicWidget(QGraphicsView):
+    """Мнемосхема, которую рисует телеметрия.
+
+    show_frame() только запоминает последний кадр; применяет его таймер с
+    частотой обновления экрана, так что пачки, пришедшие между двумя
+    кадрами экрана, стоят одного сравнения. Меняются только элементы, чьё
+    состояние отличается от нарисованного; стрелки датчиков догоняют
+    новое значение плавно. Пока нечего применять и двигать, таймер стоит.
+    """
+    NEEDLE_TIME = 0.15       # постоянная сглаживания стрелки, с
+    NEEDLE_EPSILON = 0.2     # ближе этого (градусы) стрелка встаёт на место
+
     def __init__(self):
         super().__init__()
         self.scene = QGraphicsScene()
@@ -195,6 +260,19 @@ class SchematicWidget(QGraphicsView):
         self.draw_line(140, 80, 140, 120)
         self.draw_line(120, 100, 160, 100)
 
+        self.pending = None          # последний ещё не показанный кадр (ExchangeBatch или dict)
+        self.rendered = {}           # имя элемента -> нарисованное состояние
+        self.moving = set()          # датчики, стрелка которых ещё не дошла до цели
+        self.item_updates = 0        # сколько раз менялся элемент сцены
+        self.paint_time = Histogram(UPDATE_BUCKETS_MS)    # длительность paintEvent, мс
+
+        screen = QApplication.primaryScreen()
+        refresh_hz = screen.refreshRate() if screen else 0
+        self.timer = QTimer(self)
+        self.timer.setInterval(round(1000 / (refresh_hz if refresh_hz > 0 else 60)))
+        self.timer.timeout.connect(self._tick)
+        self._last_tick = 0.0
+
     def draw_line(self, x1, y1, x2, y2):
         line = self.scene.addLine(x1, y1, x2, y2)
 
@@ -205,4 +283,68 @@ class SchematicWidget(QGraphicsView):
 
     def toggle_valve(self, name):
         self.items[name].toggle_color()
+        self.rendered[name] = self.items[name].state
+
+    # ----------  телеметрия  ----------
+    def show_frame(self, frame):
+        """frame ‒ ExchangeBatch (берётся последний кадр) или словарь полей."""
+        self.pending = frame
+        self._schedule()
+
+    def _schedule(self):
+        if self.isVisible() and not self.timer.isActive():
+            self._last_tick = perf_counter()
+            self.timer.start()
+
+    def _tick(self):
+        now = perf_counter()
+        dt, self._last_tick = now - self._last_tick, now
+        if self.pending is not None:
+            frame, self.pending = self.pending, None
+            self.apply_state(schematic_state(frame.last() if hasattr(frame, "last") else frame))
+        self.animate(dt)
+        if not self.moving:
+            self.timer.stop()
+
+    def apply_state(self, state: dict):
+        """Перенести на сцену то, что отличается от нарисованного."""
+        for name, value in state.items():
+            if self.rendered.get(name) == value:
+                continue
+            self.rendered[name] = value
+            item = self.items[name]
+            if isinstance(item, VacuumGauge):
+                item.target = value
+                self.moving.add(name)
+            else:
+                item.set_state(value)
+                self.item_updates += 1
+
+    def animate(self, dt: float):
+        """Сдвинуть стрелки к цели: экспоненциально, с постоянной NEEDLE_TIME."""
+        k = min(dt / self.NEEDLE_TIME, 1.0)
+        for name in list(self.moving):
+            gauge = self.items[name]
+            delta = gauge.target - gauge.angle
+            if abs(delta) <= self.NEEDLE_EPSILON:
+                gauge.set_angle(gauge.target)
+                self.moving.discard(name)
+            else:
+                gauge.set_angle(gauge.angle + delta * k)
+            self.item_updates += 1
+
+    # ----------  отрисовка  ----------
+    def paintEvent(self, event):
+        started = perf_counter()
+        super().paintEvent(event)
+        self.paint_time.observe((perf_counter() - started) * 1000)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.pending is not None or self.moving:
+            self._schedule()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()        # скрытая схема только запоминает последний кадр
 
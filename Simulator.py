@@ -0,0 +1,255 @@
+"""Виртуальный контроллер NIIM на псевдотерминале.
+
+    python Simulator.py --rate 50
+    NIIM_PORT=/dev/pts/N python main.py
+
+Шлёт рукопожатие 0xAA и кадры обмена с заданной частотой, отвечает на
+команды клапанов (0x01) и на запись/чтение EEPROM (0x10/0x11), по запросу
+подмешивает пакеты ошибок и испорченные байты.
+"""
+import argparse
+import logging
+import math
+import random
+import struct
+import threading
+import time
+from collections import deque
+
+from FrameParser import (
+    SYNC_EXCHANGE, SYNC_EPROM, EXCHANGE_FRAME,
+    encode_exchange, encode_error, encode_eeprom_reply,
+)
+from EepromTransfer import EEPROM_SIZE
+from Replay import PtyLink
+
+CMD_VALVE = 0x01
+CMD_EEPROM_WRITE = 0x10
+CMD_EEPROM_READ = 0x11
+
+# коды ошибок, которые отдаёт симулятор
+ERR_UNKNOWN_COMMAND = 0x01
+ERR_BAD_ARGUMENT = 0x02
+ERR_INJECTED = 0x7F
+
+
+class CommandParser:
+    """Разбор пакетов, которые SerialWorker шлёт контроллеру.
+
+    AA cmd len payload            ‒ обычная команда
+    CC 10 len addr_lo addr_hi data ‒ запись EEPROM (len = 2 + длина данных)
+    CC 11 addr_lo addr_hi count    ‒ чтение EEPROM
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        buf = self._buf
+        buf += data
+        commands = []
+        while buf:
+            if buf[0] == SYNC_EXCHANGE:
+                if len(buf) < 3 or len(buf) < 3 + buf[2]:
+                    break
+                end = 3 + buf[2]
+                commands.append((buf[1], bytes(buf[3:end])))
+            elif buf[0] == SYNC_EPROM:
+                if len(buf) < 3:
+                    break
+                if buf[1] == CMD_EEPROM_WRITE:
+                    end = 3 + buf[2]
+                elif buf[1] == CMD_EEPROM_READ:
+                    end = 5
+                else:
+                    del buf[:1]
+                    continue
+                if len(buf) < end:
+                    break
+                commands.append((buf[1], bytes(buf[2:end])))
+            else:
+                del buf[:1]
+                continue
+            del buf[:end]
+        return commands
+
+
+class ControllerSimulator:
+    """Контроллер, работающий в отдельном потоке поверх PtyLink.
+
+    rate ‒ кадров обмена в секунду; 0 ‒ насыщение линии на скорости baudrate
+    (baudrate / 10 / 32 кадров в секунду). Выше насыщения частоту не поднимаем.
+    """
+
+    def __init__(self, rate: float = 10, baudrate: int = 115200, link=None,
+                 error_every: int = 0, corrupt: float = 0.0, reply_delay: float = 0.0,
+                 seed: int | None = None):
+        self.link = link or PtyLink()
+        self.port = self.link.port
+        self.max_rate = baudrate / 10 / EXCHANGE_FRAME
+        self.rate = self.max_rate if rate <= 0 else min(rate, self.max_rate)
+        self.error_every = error_every      # каждый N-й кадр ‒ пакет ошибки
+        self.corrupt = corrupt              # вероятность испортить байт кадра
+        self.reply_delay = reply_delay      # время «обработки» команды контроллером, с
+        self.random = random.Random(seed)
+
+        self.eeprom = bytearray(b"\xff" * EEPROM_SIZE)
+        self.valve_state = 0                # ElectroValveState, бит (N-1) ‒ клапан VN
+        self.commands = CommandParser()
+
+        self.frames_sent = 0
+        self.commands_received = 0
+        self.is_running = False
+        self._replies = deque()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._started = 0.0
+
+    # ----------  управление  ----------
+    def start(self):
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="ControllerSimulator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.is_running = False
+        if self._thread:
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+        self.link.close()
+
+    def inject_error(self, cmd_id: int = 0, error_code: int = ERR_INJECTED, info: bytes = b""):
+        self._reply(encode_error(cmd_id, error_code, info))
+
+    def inject_garbage(self, count: int = 8):
+        self._reply(bytes(self.random.randrange(256) for _ in range(count)))
+
+    def _reply(self, data: bytes):
+        # ответы уходят по порядку: каждый не раньше reply_delay после своей команды
+        with self._lock:
+            self._replies.append((time.perf_counter() + self.reply_delay, data))
+
+    # ----------  телеметрия  ----------
+    def telemetry(self, t: float) -> dict:
+        """Правдоподобная откачка: давление падает экспоненциально, ТМН разгоняется."""
+        pressure = 1e-6 + 1e3 * math.exp(-t / 60)
+        return {
+            "ForVacuumState": 1,
+            "TMNState": 1 if t > 5 else 0,
+            "DU16": 1,
+            "DU63": 0,
+            "ElectroValveState": self.valve_state,
+            "TMNrpm": int(min(t, 60) / 60 * 60000),
+            "MIDA": math.log10(pressure),
+            "Magdischarge": pressure,
+            "ThermalIndicator": 20 + 5 * math.sin(t / 10),
+            "TEMP1": 25 + min(t, 600) / 60,
+            "TEMP2": 25 + self.random.gauss(0, 0.1),
+        }
+
+    def _frame(self, t: float) -> bytes:
+        frame = encode_exchange(self.telemetry(t))
+        if self.corrupt and self.random.random() < self.corrupt:
+            frame = bytearray(frame)
+            frame[self.random.randrange(len(frame))] = self.random.randrange(256)
+            frame = bytes(frame)
+        return frame
+
+    # ----------  команды  ----------
+    def handle(self, cmd_id: int, payload: bytes):
+        self.commands_received += 1
+        if cmd_id == CMD_VALVE:
+            if len(payload) != 1 or not 1 <= payload[0] <= 8:
+                self._reply(encode_error(cmd_id, ERR_BAD_ARGUMENT))
+                return
+            self.valve_state ^= 1 << (payload[0] - 1)
+
+        elif cmd_id == CMD_EEPROM_WRITE:
+            address = struct.unpack_from("<H", payload, 1)[0]
+            data = payload[3:]
+            if address + len(data) > EEPROM_SIZE:
+                self._reply(encode_error(cmd_id, ERR_BAD_ARGUMENT))
+                return
+            self.eeprom[address:address + len(data)] = data
+
+        elif cmd_id == CMD_EEPROM_READ:
+            address, count = struct.unpack("<HB", payload)
+            if address + count > EEPROM_SIZE:
+                self._reply(encode_error(cmd_id, ERR_BAD_ARGUMENT))
+                return
+            self._reply(encode_eeprom_reply(self.eeprom[address:address + count]))
+
+        else:
+            self._reply(encode_error(cmd_id, ERR_UNKNOWN_COMMAND))
+
+    # ----------  главный цикл  ----------
+    def _run(self):
+        self._started = time.perf_counter()
+        self.link.write(bytes([SYNC_EXCHANGE]))    # рукопожатие
+        period = 1 / self.rate
+        while self.is_running:
+            for cmd_id, payload in self.commands.feed(self.link.drain()):
+                try:
+                    self.handle(cmd_id, payload)
+                except Exception as e:
+                    # кривая команда не должна останавливать поток кадров
+                    logging.error(f"Симулятор: команда 0x{cmd_id:02X} {payload.hex()} не обработана: {e}")
+                    self._reply(encode_error(cmd_id, ERR_BAD_ARGUMENT))
+
+            out = bytearray()
+            with self._lock:
+                now = time.perf_counter()
+                while self._replies and self._replies[0][0] <= now:
+                    out += self._replies.popleft()[1]
+
+            # сколько кадров положено к этому моменту ‒ столько и досылаем одним write
+            t = time.perf_counter() - self._started
+            due = int(t * self.rate) - self.frames_sent
+            for _ in range(due):
+                self.frames_sent += 1
+                if self.error_every and self.frames_sent % self.error_every == 0:
+                    out += encode_error(0, ERR_INJECTED)
+                out += self._frame(t)
+
+            if out:
+                self.link.write(bytes(out))
+            time.sleep(min(period, 0.002, self.reply_delay or 0.002))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Виртуальный контроллер NIIM на pty")
+    parser.add_argument("--rate", type=float, default=10,
+                        help="кадров обмена в секунду (0 ‒ насыщение линии)")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--error-every", type=int, default=0, help="пакет ошибки каждые N кадров")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="вероятность испортить кадр")
+    parser.add_argument("--reply-delay", type=float, default=0.0,
+                        help="задержка ответа на команду, мс (для подбора окна конвейера)")
+    parser.add_argument("--eeprom", help="образ EEPROM для начальной загрузки")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    sim = ControllerSimulator(args.rate, args.baudrate, error_every=args.error_every,
+                              corrupt=args.corrupt, reply_delay=args.reply_delay / 1000,
+                              seed=args.seed)
+    if args.eeprom:
+        with open(args.eeprom, "rb") as f:
+            image = f.read(EEPROM_SIZE)
+        sim.eeprom[:len(image)] = image
+
+    print(f"Контроллер на {sim.port}, {sim.rate:.1f} кадров/с (NIIM_PORT={sim.port} python main.py)")
+    sim.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+        print(f"Отправлено кадров: {sim.frames_sent}, принято команд: {sim.commands_received}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from collections import deque
+from threading import Lock
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
+
+from FrameParser import ExchangeBatch
+
+# ----------  политика переполнения  ----------
+KEEP_LATEST = "keep_latest"    # хранить только самый свежий кадр
+KEEP_ALL    = "keep_all"       # копить до max_frames, новые сверх лимита отбрасываются
+DROP_OLDEST = "drop_oldest"    # копить до max_frames, вытесняя самые старые
+POLICIES = (KEEP_LATEST, KEEP_ALL, DROP_OLDEST)
+
+
+class TelemetryTransport(QObject):
+    """Передача кадров из потока порта в GUI с прореживанием по времени.
+
+    push() вызывается прямо в потоке SerialWorker и только складывает пачку
+    в ограниченную очередь. Таймер в GUI-потоке rate_hz раз в секунду
+    склеивает накопленное в одну ExchangeBatch и отдаёт сигналом delivered.
+    Пока GUI занят, очередь не растёт сверх max_frames.
+    """
+    delivered = pyqtSignal(object)
+
+    def __init__(self, rate_hz: float = 30, policy: str = DROP_OLDEST, max_frames: int = 10000,
+                 device: str | None = None):
+        super().__init__()
+        self.device = device          # пачки одного контроллера ‒ у каждого свой транспорт
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {policy}")
+        self.policy = policy
+        self.max_frames = 1 if policy == KEEP_LATEST else max_frames
+
+        self._lock = Lock()
+        self._pending = deque()       # пары (записи EXCHANGE_DTYPE, t_ns)
+        self._pending_frames = 0
+
+        self.received_frames = 0
+        self.delivered_frames = 0
+        self.dropped_frames = 0
+        self.deliveries = 0
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.flush)
+        self.set_rate(rate_hz)
+
+    def set_rate(self, rate_hz: float):
+        self.rate_hz = rate_hz
+        self.timer.start(max(1, int(1000 / rate_hz)))
+
+    def stop(self):
+        self.timer.stop()
+
+    @property
+    def depth(self) -> int:
+        """Сколько кадров ждут отправки в GUI."""
+        return self._pending_frames
+
+    # ----------  сторона потока порта  ----------
+    @pyqtSlot(object)
+    def push(self, batch: ExchangeBatch):
+        records, t_ns = batch.records, batch.t_ns
+        with self._lock:
+            self.received_frames += len(records)
+            free = self.max_frames - self._pending_frames
+
+            if self.policy == KEEP_ALL:
+                if free <= 0:
+                    self.dropped_frames += len(records)
+                    return
+                if len(records) > free:
+                    self.dropped_frames += len(records) - free
+                    records, t_ns = records[:free], t_ns[:free]
+            else:
+                # KEEP_LATEST и DROP_OLDEST: новое всегда принимаем, вытесняя старое
+                if len(records) > self.max_frames:
+                    self.dropped_frames += len(records) - self.max_frames
+                    records, t_ns = records[-self.max_frames:], t_ns[-self.max_frames:]
+                self._evict(len(records) - free)
+
+            self._pending.append((records, t_ns))
+            self._pending_frames += len(records)
+
+    def _evict(self, count: int):
+        while count > 0 and self._pending:
+            records, t_ns = self._pending[0]
+            if len(records) <= count:
+                self._pending.popleft()
+                taken = len(records)
+            else:
+                self._pending[0] = (records[count:], t_ns[count:])
+                taken = count
+            self._pending_frames -= taken
+            self.dropped_frames += taken
+            count -= taken
+
+    # ----------  сторона GUI  ----------
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            chunks = list(self._pending)
+            self._pending.clear()
+            self._pending_frames = 0
+
+        batch = ExchangeBatch(*chunks[0], self.device) if len(chunks) == 1 \
+            else ExchangeBatch.concat([ExchangeBatch(*chunk, self.device) for chunk in chunks])
+        self.delivered_frames += len(batch)
+        self.deliveries += 1
+        self.delivered.emit(batch)
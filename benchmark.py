@@ -0,0 +1,564 @@
+"""Замеры производительности конвейера приёма и отображения.
+
+    python benchmark.py parser                 # кадров/с через FrameParser
+    python benchmark.py worker-gui --seconds 5 # задержка сигнала поток порта -> GUI (offscreen)
+    python benchmark.py full-stack             # байты в pty -> GraphPanel.update_plots
+    python benchmark.py decimation             # стоимость перерисовки от длины истории
+    python benchmark.py startup                # запуск main.py до первого кадра и разбор импортов
+    python benchmark.py logging                # сколько поток порта ждёт журнал на медленном диске
+    python benchmark.py rolling                # RollingStats: стоимость кадра против пересчёта окна
+    python benchmark.py alarms                 # AlarmEngine: время проверки пачки от числа правил
+    python benchmark.py query                  # SessionQuery: индекс, поиск интервала, выгрузка CSV/NPZ
+    python benchmark.py all --output bench.json
+
+Каждый этап печатает таблицу и (с --output) пишет JSON: p50/p99 задержки,
+процессорное время на кадр и пиковый RSS. При нескольких этапах каждый
+запускается в отдельном процессе, чтобы пиковый RSS не смешивался.
+Симулятор контроллера работает в том же процессе, его CPU входит в замер.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from Decimation import MinMaxPyramid
+from FrameParser import FrameParser, encode_exchange, encode_error
+
+STAGES = ("parser", "worker-gui", "full-stack", "decimation", "startup", "logging", "rolling", "alarms", "query")
+
+# бюджет запуска, мс от старта процесса (медиана по запускам)
+STARTUP_BUDGET_MS = {"loading_shown": 400, "first_frame": 1500}
+
+
+def _timeit(fn, repeat: int) -> float:
+    """Медианное время одного вызова fn, мкс."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples)) * 1e6
+
+
+def _peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss    # Linux: КБ
+
+
+def _latency_summary(latencies_ns) -> dict:
+    if not len(latencies_ns):
+        return {"latency_p50_ms": None, "latency_p99_ms": None, "latency_max_ms": None}
+    lat = np.asarray(latencies_ns, dtype=np.float64) / 1e6
+    return {
+        "latency_p50_ms": float(np.percentile(lat, 50)),
+        "latency_p99_ms": float(np.percentile(lat, 99)),
+        "latency_max_ms": float(lat.max()),
+    }
+
+
+# ----------  только разбор  ----------
+def bench_parser(frames: int = 200_000, chunk: int = 4096) -> dict:
+    stream = bytearray()
+    for i in range(frames):
+        stream += encode_exchange({"TMNrpm": i, "MIDA": i * 0.5})
+        if i % 1000 == 0:
+            stream += encode_error(1, 2, b"x")
+    stream = bytes(stream)
+
+    parser = FrameParser()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    for k in range(0, len(stream), chunk):
+        parser.feed(stream[k:k + chunk])
+    wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    return {
+        "frames": parser.frames,
+        "frames_per_s": parser.frames / wall,
+        "cpu_us_per_frame": cpu / parser.frames * 1e6,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+# ----------  поток порта -> GUI и полный стек  ----------
+def _qt_app():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(sys.argv)
+
+
+def _run_pipeline(seconds: float, rate: float, with_graph: bool, transport_hz: float,
+                  baudrate: int) -> dict:
+    """Симулятор на pty -> SerialWorker в QThread -> TelemetryTransport -> слот в GUI.
+
+    with_graph ‒ слот вызывает GraphPanel.update_plots, и задержка считается
+    от записи кадра в pty до окончания перерисовки. Иначе ‒ от чтения кадра
+    воркером (batch.t_ns) до получения пачки в GUI-потоке.
+    """
+    app = _qt_app()
+    from PyQt5.QtCore import QThread, QTimer, Qt
+    from Simulator import ControllerSimulator
+    from SerialWorker import SerialWorker
+    from TelemetryTransport import TelemetryTransport
+
+    sent_ns = {}
+
+    class StampedSimulator(ControllerSimulator):
+        # номер кадра уходит в TMNrpm, время отправки запоминаем
+        def telemetry(self, t):
+            values = super().telemetry(t)
+            values["TMNrpm"] = self.frames_sent
+            sent_ns[self.frames_sent] = time.monotonic_ns()
+            return values
+
+    # pty не ограничивает скорость ‒ потолок частоты кадров задаёт baudrate симулятора
+    sim = StampedSimulator(rate=rate, baudrate=baudrate)
+    worker = SerialWorker(port=sim.port)
+    thread = QThread()
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run_input)
+    transport = TelemetryTransport(rate_hz=transport_hz)
+    worker.batch_received.connect(transport.push, Qt.DirectConnection)
+
+    graph = None
+    if with_graph:
+        from GraphWindow import GraphPanel
+        graph = GraphPanel()
+        graph.resize(800, 600)
+        graph.show()
+
+    latencies = []
+    counts = {"frames": 0}
+
+    def on_batch(batch):
+        if graph is not None:
+            graph.update_plots(batch)
+            now = time.monotonic_ns()
+            sent = np.array([sent_ns.get(int(seq), now) for seq in batch["TMNrpm"]], dtype=np.int64)
+            latencies.extend((now - sent).tolist())
+        else:
+            now = time.monotonic_ns()
+            latencies.extend((now - batch.t_ns.astype(np.int64)).tolist())
+        counts["frames"] += len(batch)
+
+    transport.delivered.connect(on_batch)
+
+    sim.start()
+    thread.start()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    QTimer.singleShot(int(seconds * 1000), app.quit)
+    app.exec_()
+    wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+
+    worker.stop()
+    thread.quit()
+    thread.wait()
+    transport.stop()
+    sim.close()
+
+    frames = counts["frames"]
+    result = {
+        "rate_requested": sim.rate,
+        "frames_sent": sim.frames_sent,
+        "frames": frames,
+        "frames_per_s": frames / wall,
+        "dropped": transport.dropped_frames,
+        "cpu_us_per_frame": cpu / frames * 1e6 if frames else None,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+    result.update(_latency_summary(latencies))
+    return result
+
+
+def bench_worker_gui(seconds: float = 5, rate: float = 0, transport_hz: float = 60,
+                     baudrate: int = 115200) -> dict:
+    return _run_pipeline(seconds, rate, False, transport_hz, baudrate)
+
+
+def bench_full_stack(seconds: float = 5, rate: float = 0, transport_hz: float = 60,
+                     baudrate: int = 115200) -> dict:
+    return _run_pipeline(seconds, rate, True, transport_hz, baudrate)
+
+
+# ----------  пирамида min/max  ----------
+def bench_decimation(histories=(10_000, 100_000, 1_000_000, 10_000_000), pixels: int = 1000,
+                     repeat: int = 50, with_qt: bool = False) -> list:
+    """Перерисовка всей истории и последних 10 000 отсчётов при разной длине истории.
+
+    with_qt ‒ дополнительно мерить setData у pyqtgraph (offscreen).
+    """
+    curve = None
+    if with_qt:
+        _qt_app()
+        import pyqtgraph as pg
+        curve = pg.PlotDataItem()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for history in histories:
+        pyramid = MinMaxPyramid(history)
+        chunk = rng.normal(size=min(history, 1_000_000)).astype(np.float32)
+        while pyramid.total < history:
+            pyramid.extend(chunk[:history - pyramid.total])
+
+        append_us = _timeit(lambda: pyramid.extend(chunk[:100]), repeat)
+
+        def full():
+            x, y = pyramid.select(pyramid.first_index, pyramid.total, pixels)
+            if curve is not None:
+                curve.setData(x, y)
+            return x
+
+        def recent():
+            x, y = pyramid.select(pyramid.total - 10_000, pyramid.total, pixels)
+            if curve is not None:
+                curve.setData(x, y)
+            return x
+
+        results.append({
+            "history": history,
+            "points": len(full()),
+            "append_100_us": append_us,
+            "redraw_full_us": _timeit(full, repeat),
+            "redraw_recent_us": _timeit(recent, repeat),
+        })
+    return results
+
+
+# ----------  скользящая статистика  ----------
+def bench_rolling(seconds: float = 1200, rate: float = 360, batches=(1, 12, 256)) -> list:
+    """RollingStats на seconds секундах телеметрии при разном размере пачки.
+
+    Для сравнения ‒ пересчёт тех же величин по массиву окна (как если бы
+    считать по истории графиков) на каждую пачку из 12 кадров.
+    """
+    from FrameParser import EXCHANGE_DTYPE, ExchangeBatch
+    from RollingStats import RollingStats, WINDOWS
+
+    frames = int(seconds * rate)
+    records = np.zeros(frames, dtype=EXCHANGE_DTYPE)
+    rng = np.random.default_rng(0)
+    for name in ("MIDA", "Magdischarge", "TEMP1", "TEMP2", "TMNrpm"):
+        records[name] = rng.normal(size=frames)
+    t_ns = (np.arange(frames) * (1e9 / rate)).astype(np.int64)
+
+    results = []
+    for size in batches:
+        stats = RollingStats()
+        started = time.perf_counter()
+        for i in range(0, frames, size):
+            stats.update(ExchangeBatch(records[i:i + size], t_ns[i:i + size]))
+        stats.snapshot()
+        results.append({"method": f"RollingStats, пачка {size}",
+                        "us_per_frame": (time.perf_counter() - started) / frames * 1e6})
+
+    # пересчёт окна на каждую пачку ‒ только последние 100 пачек, иначе слишком долго
+    window = int(max(WINDOWS) * rate)
+    x = records["MIDA"].astype(np.float64)
+    t = t_ns / 1e9
+    started = time.perf_counter()
+    for end in range(frames - 100 * 12, frames, 12):
+        for length in (int(w * rate) for w in WINDOWS):
+            xs, ts = x[end - length:end], t[end - length:end]
+            xs.mean(), xs.std(), xs.min(), xs.max(), np.polyfit(ts, xs, 1)
+    per_batch = (time.perf_counter() - started) / 100
+    results.append({"method": f"пересчёт окна ({window} кадров), пачка 12",
+                    "us_per_frame": per_batch * 5 / 12 * 1e6})     # 5 каналов
+    return results
+
+
+# ----------  тревоги  ----------
+def bench_alarms(rule_counts=(10, 100, 500), batch: int = 18, batches: int = 500) -> list:
+    """Проверка пачки (batch кадров ‒ 50 мс при 360 кадр/с) при разном числе правил."""
+    from AlarmEngine import AlarmEngine, AlarmRule
+
+    channels = ("MIDA", "Magdischarge", "TEMP1", "TEMP2", "TMNrpm", "ThermalIndicator")
+    rng = np.random.default_rng(0)
+    frames = batch * batches
+    columns = {c: rng.normal(size=frames) for c in channels}
+    columns["ElectroValveState"] = rng.integers(0, 256, frames).astype(np.uint8)
+    t_ns = (np.arange(frames) * (1e9 / 360)).astype(np.int64)
+
+    results = []
+    for count in rule_counts:
+        # пороги за 2.5σ: тревоги редки, как в жизни, и время уходит на проверку, а не на события
+        rules = [AlarmRule(f"r{i}", channels[i % len(channels)], ">" if i % 2 else "<", 2.5 if i % 2 else -2.5,
+                           kind="rate" if i % 10 == 9 else "threshold", window=1 + i % 5 if i % 10 == 9 else None,
+                           hysteresis=0.5, delay=i % 3,
+                           when=[{"channel": "ElectroValveState", "bit": i % 8}] if i % 4 == 0 else ())
+                 for i in range(count)]
+        engine = AlarmEngine(rules)
+        started = time.perf_counter()
+        events = 0
+        for i in range(0, frames, batch):
+            events += len(engine.evaluate(t_ns[i:i + batch], {c: v[i:i + batch] for c, v in columns.items()}))
+        elapsed = time.perf_counter() - started
+        results.append({"rules": count, "us_per_batch": elapsed / batches * 1e6,
+                        "us_per_rule_frame": elapsed / frames / count * 1e6, "events": events})
+    return results
+
+
+# ----------  запуск приложения  ----------
+def _import_breakdown(stderr: str, top: int) -> dict:
+    """Вывод python -X importtime -> {модуль верхнего уровня: накопленное время, мс}."""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  ") and name.strip():      # вложенные импорты ‒ с отступом
+            times[name.strip()] = int(cumulative) / 1000
+    return dict(sorted(times.items(), key=lambda item: -item[1])[:top])
+
+
+def bench_startup(runs: int = 3, top: int = 8) -> list:
+    """main.py на симуляторе (offscreen) до первого отрисованного кадра.
+
+    Отметки App.timer считаются от запуска процесса (вместе со стартом
+    интерпретатора); в строках import ‒ накопленное время импорта модулей
+    верхнего уровня из последнего запуска.
+    """
+    import tempfile
+    from Simulator import ControllerSimulator
+
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    sim = ControllerSimulator(rate=100)
+    sim.start()
+    marks, imports = {}, {}
+    try:
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as cwd:           # records/ и niim.log ‒ во временном каталоге
+                report_path = os.path.join(cwd, "startup.json")
+                env = dict(os.environ, NIIM_PORT=sim.port, NIIM_STARTUP_REPORT=report_path)
+                env.pop("NIIM_PORTS", None)
+                env.setdefault("QT_QPA_PLATFORM", "offscreen")
+                launched = time.time()
+                proc = subprocess.run([sys.executable, "-X", "importtime", main_py], cwd=cwd, env=env,
+                                      capture_output=True, text=True, timeout=60)
+                with open(report_path) as f:
+                    report = json.load(f)
+            interpreter_ms = (report["started_wall"] - launched) * 1000
+            marks.setdefault("interpreter", []).append(interpreter_ms)
+            for name, ms in report["marks_ms"].items():
+                marks.setdefault(name, []).append(interpreter_ms + ms)
+            imports = _import_breakdown(proc.stderr, top)
+    finally:
+        sim.close()
+
+    rows = []
+    for name, values in marks.items():
+        budget = STARTUP_BUDGET_MS.get(name)
+        median = float(np.median(values))
+        rows.append({"what": name, "ms": median, "budget_ms": budget,
+                     "ok": "" if budget is None else ("да" if median <= budget else "ПРЕВЫШЕН")})
+    for name, ms in imports.items():
+        rows.append({"what": f"import {name}", "ms": ms, "budget_ms": None, "ok": ""})
+    return rows
+
+
+# ----------  журнал  ----------
+def bench_logging(messages: int = 5000, disk_delay_ms: float = 0.5) -> list:
+    """Задержка вызова logging.error в потоке-источнике: запись в файл напрямую и через Logs.LogPipeline.
+
+    Диск медленный: каждая запись в файл ждёт disk_delay_ms. 90% сообщений
+    одинаковые (поток ошибок разбора), остальные разные.
+    """
+    import logging
+    import tempfile
+    import threading
+    from Logs import LogPipeline
+
+    class SlowFileHandler(logging.FileHandler):
+        written = 0
+
+        def emit(self, record):
+            time.sleep(disk_delay_ms / 1000)
+            super().emit(record)
+            self.written += 1
+
+    rows = []
+    for mode in ("sync", "queue"):
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = logging.getLogger(f"bench.{mode}")
+            logger.propagate = False
+            logger.setLevel(logging.DEBUG)
+            file_handler = SlowFileHandler(os.path.join(tmp, "niim.log"))
+            pipeline = None
+            if mode == "sync":
+                logger.addHandler(file_handler)
+            else:
+                pipeline = LogPipeline([file_handler], logging.DEBUG)
+                pipeline.start(logger)
+
+            calls = []
+
+            def produce():
+                for i in range(messages):
+                    msg = f"Read error {i}" if i % 10 == 0 else "Parse error: unpack requires a buffer of 4 bytes"
+                    t0 = time.perf_counter_ns()
+                    logger.error(msg)
+                    calls.append(time.perf_counter_ns() - t0)
+
+            t0 = time.perf_counter()
+            thread = threading.Thread(target=produce, name="SerialWorker")   # как поток порта
+            thread.start()
+            thread.join()
+            producer_s = time.perf_counter() - t0
+            if pipeline:
+                pipeline.stop()
+            else:
+                logger.removeHandler(file_handler)
+                file_handler.close()
+
+        us = np.asarray(calls, dtype=np.float64) / 1e3
+        rows.append({
+            "mode": mode,
+            "calls": messages,
+            "producer_s": producer_s,
+            "call_p50_us": float(np.percentile(us, 50)),
+            "call_p99_us": float(np.percentile(us, 99)),
+            "call_max_us": float(us.max()),
+            "lines_written": file_handler.written,
+            "dropped": pipeline.handler.dropped if pipeline else 0,
+        })
+    return rows
+
+
+# ----------  выборка из записей  ----------
+def bench_query(hours: float = 2, rate: float = 360) -> list:
+    """SessionQuery на сегменте в hours часов: построение и загрузка индекса,
+    поиск 10-минутного интервала, выгрузка получаса в CSV и NPZ."""
+    import tempfile
+    from Recorder import EXCHANGE_RECORD_DTYPE, HEADER_DTYPE, KIND_EXCHANGE, MAGIC, VERSION
+    from SessionQuery import SessionQuery
+
+    frames = int(hours * 3600 * rate)
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"], header["version"], header["kind"] = MAGIC, VERSION, KIND_EXCHANGE
+        header["record_size"] = EXCHANGE_RECORD_DTYPE.itemsize
+        header["wall_ns"] = time.time_ns() - int(hours * 3600e9)
+        with open(os.path.join(directory, "niim_bench_001.exch"), "wb") as f:
+            f.write(header.tobytes())
+            for first in range(0, frames, 1_000_000):
+                records = np.zeros(min(1_000_000, frames - first), dtype=EXCHANGE_RECORD_DTYPE)
+                records["t_ns"] = ((first + np.arange(len(records))) * (1e9 / rate)).astype(np.uint64)
+                for name in ("MIDA", "Magdischarge", "TEMP1", "TMNrpm"):
+                    records[name] = rng.random(len(records)) * 100
+                f.write(records.tobytes())
+
+        for method in ("построение индекса", "загрузка индекса"):
+            started = time.perf_counter()
+            session = SessionQuery(directory)
+            results.append({"method": method, "ms": (time.perf_counter() - started) * 1000, "records": frames})
+
+        start = session.start_ns + int(1800e9)
+        end = start + int(600e9)
+        results.append({"method": "поиск интервала 10 мин", "ms": _timeit(lambda: session.count(start, end), 200) / 1000,
+                        "records": session.count(start, end)})
+
+        end = start + int(1800e9)
+        for method, export, channels in (("CSV, полчаса, 3 канала", session.to_csv, ("MIDA", "TEMP1", "TMNrpm")),
+                                         ("NPZ, полчаса, все каналы", session.to_npz, None)):
+            path = os.path.join(directory, "out" + (".csv" if export == session.to_csv else ".npz"))
+            started = time.perf_counter()
+            rows = export(path, start, end, channels)
+            results.append({"method": method, "ms": (time.perf_counter() - started) * 1000, "records": rows})
+    return results
+
+
+# ----------  запуск  ----------
+def run_stage(stage: str, args) -> dict | list:
+    if stage == "parser":
+        return bench_parser(args.frames)
+    if stage == "worker-gui":
+        return bench_worker_gui(args.seconds, args.rate, args.transport_hz, args.baudrate)
+    if stage == "full-stack":
+        return bench_full_stack(args.seconds, args.rate, args.transport_hz, args.baudrate)
+    if stage == "startup":
+        return bench_startup(args.startup_runs)
+    if stage == "logging":
+        return bench_logging()
+    if stage == "rolling":
+        return bench_rolling()
+    if stage == "alarms":
+        return bench_alarms()
+    if stage == "query":
+        return bench_query()
+    return bench_decimation(pixels=args.pixels, repeat=args.repeat, with_qt=args.qt)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _print_table(rows):
+    rows = rows if isinstance(rows, list) else [rows]
+    if not rows:
+        return
+    keys = list(rows[0])
+    print("  ".join(f"{k:>16}" for k in keys))
+    for row in rows:
+        print("  ".join(f"{row[k]:>16.1f}" if isinstance(row[k], float) else f"{str(row[k]):>16}"
+                        for k in keys))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности NIIM")
+    parser.add_argument("stage", nargs="+", choices=STAGES + ("all",))
+    parser.add_argument("--output", help="записать результаты в JSON")
+    parser.add_argument("--frames", type=int, default=200_000, help="кадров для этапа parser")
+    parser.add_argument("--seconds", type=float, default=5, help="длительность этапов с симулятором")
+    parser.add_argument("--rate", type=float, default=0, help="кадров/с симулятора (0 ‒ насыщение)")
+    parser.add_argument("--baudrate", type=int, default=115200,
+                        help="скорость линии симулятора (потолок при --rate 0)")
+    parser.add_argument("--transport-hz", type=float, default=60, help="частота выдачи в GUI")
+    parser.add_argument("--pixels", type=int, default=1000, help="ширина графика в пикселях")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--qt", action="store_true", help="включить setData pyqtgraph в замер")
+    parser.add_argument("--startup-runs", type=int, default=3, help="запусков main.py для этапа startup")
+    parser.add_argument("--json-stdout", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    stages = STAGES if "all" in args.stage else tuple(dict.fromkeys(args.stage))
+
+    if args.json_stdout:
+        print(json.dumps(run_stage(stages[0], args)))
+        return
+
+    results = {}
+    for stage in stages:
+        if len(stages) == 1:
+            results[stage] = run_stage(stage, args)
+        else:
+            # отдельный процесс на этап ‒ честный пиковый RSS
+            cmd = [sys.executable, os.path.abspath(__file__), stage, "--json-stdout"] \
+                + [a for a in (argv if argv is not None else sys.argv[1:]) if a not in STAGES + ("all",)]
+            out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            results[stage] = json.loads(out.strip().splitlines()[-1])
+        print(f"== {stage}")
+        _print_table(results[stage])
+
+    if args.output:
+        report = {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "stages": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,4 +2,20 @@ from logging import exception
 
 
 class BROKEN_POCKET(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class EEPROM_TRANSFER_FAILED(Exception):
+    pass
+
+
+class REQUEST_TIMEOUT(Exception):
+    pass
+
+
+class DEVICE_ERROR(Exception):
+    pass
+
+
+class REPLY_LOST(REQUEST_TIMEOUT):
+    pass
@@ -0,0 +1,223 @@
+"""Сбор и запись данных без графического интерфейса.
+
+    python headless.py --port /dev/ttyUSB0 --output /data/records --keep-gb 50 --keep-days 30
+    python headless.py --port ст1=/dev/ttyUSB0 --port ст2=/dev/ttyUSB1 --baudrate 115200
+
+Для узлов, которые только пишут данные: тот же SerialWorker и Recorder,
+что и в приложении, но без QApplication, окон и pyqtgraph (из Qt
+загружается только QtCore ‒ ради сигналов SerialWorker). Останавливается
+по SIGTERM/SIGINT: воркеры закрывают порты, Recorder дописывает сегменты.
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+
+from PyQt5.QtCore import Qt
+
+from SerialWorker import SerialWorker
+from Recorder import Recorder, record_dir_from_env, retention_from_env
+from AcquisitionPool import discover_from_env, parse_ports
+from Logs import setup_logging
+from Metrics import DEFAULT_PORT, MetricsRegistry, alarm_samples, rolling_samples, start_server, worker_samples
+from AlarmEngine import AlarmEngine, load_rules, rules_from_env
+from RollingStats import RollingStats
+
+
+class HeadlessNode:
+    """Воркеры портов в обычных потоках; сигналы SerialWorker ‒ прямые вызовы."""
+
+    def __init__(self, ports: dict, baudrate: int = 115200, out_dir: str | None = "records",
+                 max_bytes: int = 256 * 1024 * 1024, max_seconds: float = 3600, discover: bool = False,
+                 alarm_rules: list = (), retention: dict | None = None):
+        self.workers = {}
+        self.stats = {}
+        self.alarms = {}
+        self.threads = {}
+        self.connected = {}
+        for device_id, port in ports.items():
+            worker = SerialWorker(port=port, baudrate=baudrate, device_id=device_id,
+                                  discover=discover and len(ports) == 1)
+            if out_dir:
+                directory = os.path.join(out_dir, device_id) if len(ports) > 1 else out_dir
+                worker.recorder = Recorder(directory, max_bytes=max_bytes, max_seconds=max_seconds,
+                                           **(retention or {}))
+            # цикла событий нет ‒ только прямые вызовы в потоке, испустившем сигнал
+            worker.error_occurred.connect(lambda msg, d=device_id: logging.error(f"{d}: {msg}"),
+                                          Qt.DirectConnection)
+            worker.connection_status.connect(lambda ok, d=device_id: self._on_status(d, ok),
+                                             Qt.DirectConnection)
+            self.stats[device_id] = RollingStats()
+            worker.batch_received.connect(self.stats[device_id].update, Qt.DirectConnection)
+            if alarm_rules:
+                self.alarms[device_id] = AlarmEngine(alarm_rules)
+                worker.batch_received.connect(lambda batch, d=device_id: self._check_alarms(d, batch),
+                                              Qt.DirectConnection)
+            self.workers[device_id] = worker
+            self.connected[device_id] = False
+        self.stopped = threading.Event()
+
+    def _on_status(self, device_id: str, connected: bool):
+        self.connected[device_id] = connected
+        worker = self.workers[device_id]
+        logging.info(f"{device_id} ({worker.connected_port or worker.port}): "
+                     f"{'подключено' if connected else 'нет подключения'}")
+        if not connected and device_id in self.alarms:
+            self._log_alarms(device_id, self.alarms[device_id].flush)
+
+    def _check_alarms(self, device_id: str, batch):
+        self._log_alarms(device_id, self.alarms[device_id].feed, batch)
+
+    def _flush_alarms(self):
+        # кадры, которые AlarmEngine ещё копит, когда поток кадров встал
+        while not self.stopped.wait(0.1):
+            for device_id, engine in self.alarms.items():
+                self._log_alarms(device_id, engine.flush_stale)
+
+    def _log_alarms(self, device_id: str, check, *args):
+        with self.alarms[device_id].lock:
+            for event in check(*args):
+                if event.active:
+                    logging.warning(f"{device_id}: тревога «{event.rule}»: {event.message} ({event.value:.4g})")
+                else:
+                    logging.info(f"{device_id}: тревога «{event.rule}» снята")
+
+    def start(self):
+        for device_id, worker in self.workers.items():
+            thread = threading.Thread(target=worker.run_input, name=f"SerialWorker-{device_id}")
+            thread.start()
+            self.threads[device_id] = thread
+        if self.alarms:
+            threading.Thread(target=self._flush_alarms, name="AlarmFlush", daemon=True).start()
+
+    def stop(self):
+        """Можно вызывать из обработчика сигнала: только ставит флаг."""
+        self.stopped.set()
+
+    def status(self) -> str:
+        parts = []
+        for device_id, worker in self.workers.items():
+            recorder = worker.recorder
+            parts.append(f"{device_id}: {'есть связь' if self.connected[device_id] else 'нет связи'}, "
+                         f"кадров {worker.parser.frames}, ресинхр. {worker.parser.resyncs}, "
+                         f"переподключений {worker.reconnects}, "
+                         + (f"записано {recorder.records_written}, потеряно записей {recorder.records_dropped}"
+                            if recorder else "запись отключена")
+                         + self._eta_text(device_id))
+        return "; ".join(parts)
+
+    def _eta_text(self, device_id: str) -> str:
+        eta = self.stats[device_id].pumpdown_eta()
+        return "" if eta is None else f", до целевого давления ~{eta:.0f} с"
+
+    def metrics(self) -> list:
+        """Сборщик для MetricsRegistry ‒ те же счётчики воркеров, что и в приложении."""
+        samples = []
+        for device_id, worker in self.workers.items():
+            samples += worker_samples(device_id, worker.stats())
+            samples += rolling_samples(device_id, self.stats[device_id])
+            if device_id in self.alarms:
+                samples += alarm_samples(device_id, self.alarms[device_id])
+        return samples
+
+    def wait(self, status_interval: float = 60):
+        while not self.stopped.wait(status_interval or None):
+            logging.info(self.status())
+        self.shutdown()
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            worker.stop()
+        for thread in self.threads.values():
+            thread.join()
+        for device_id, engine in self.alarms.items():
+            self._log_alarms(device_id, engine.flush)
+        for worker in self.workers.values():
+            if worker.recorder:
+                worker.recorder.close()
+        logging.info(f"Остановлено. {self.status()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сбор данных NIIM без графического интерфейса")
+    parser.add_argument("--port", action="append",
+                        help="порт или ИМЯ=ПОРТ, можно несколько раз (по умолчанию NIIM_PORTS/NIIM_PORT)")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--output", help="каталог записей (по умолчанию NIIM_RECORD_DIR или records)")
+    parser.add_argument("--no-record", action="store_true", help="не записывать (или NIIM_RECORD=0)")
+    parser.add_argument("--segment-mb", type=float, default=256, help="размер сегмента записи, МБ")
+    parser.add_argument("--segment-seconds", type=float, default=3600, help="длительность сегмента, с")
+    parser.add_argument("--keep-gb", type=float,
+                        help="хранить не больше стольких ГБ записей, старые удалять (NIIM_RECORD_KEEP_GB)")
+    parser.add_argument("--keep-days", type=float,
+                        help="удалять сегменты старше стольких дней (NIIM_RECORD_KEEP_DAYS)")
+    parser.add_argument("--status-interval", type=float, default=60,
+                        help="как часто писать в журнал состояние, с (0 ‒ не писать)")
+    parser.add_argument("--discover", action="store_true", default=discover_from_env(),
+                        help="искать контроллер на всех портах системы (только для одного устройства; "
+                             "по умолчанию NIIM_DISCOVER)")
+    parser.add_argument("--metrics-port", type=int,
+                        default=int(os.environ.get("NIIM_METRICS_PORT", DEFAULT_PORT)),
+                        help="порт /metrics для Prometheus (0 ‒ не запускать)")
+    parser.add_argument("--metrics-host", default=os.environ.get("NIIM_METRICS_HOST", "127.0.0.1"))
+    parser.add_argument("--alarms", help="файл правил тревог (по умолчанию NIIM_ALARMS или alarms.json)")
+    parser.add_argument("--log-file", default="niim.log", help="журнал (кроме stderr)")
+    parser.add_argument("--log-mb", type=float, default=10, help="размер файла журнала до ротации, МБ")
+    args = parser.parse_args(argv)
+    try:
+        retention = retention_from_env()
+    except ValueError as e:
+        parser.error(str(e))
+    if args.keep_gb is not None:
+        retention["max_total_bytes"] = int(args.keep_gb * 1024 ** 3) or None
+    if args.keep_days is not None:
+        retention["max_age"] = args.keep_days * 86400 or None
+    output = None if args.no_record else args.output or record_dir_from_env()
+
+    setup_logging(args.log_file or None, logging.INFO, max_bytes=int(args.log_mb * 1024 * 1024),
+                  console=True)
+
+    if args.port:
+        ports = parse_ports(",".join(args.port))
+    else:
+        from AcquisitionPool import ports_from_env
+        ports = ports_from_env()
+
+    # явно указанный файл правил обязан загрузиться; alarms.json по умолчанию (или NIIM_ALARMS) ‒
+    # если есть, а ошибка в нём, как и в приложении, не мешает сбору данных
+    if args.alarms:
+        rules = load_rules(args.alarms)
+    else:
+        try:
+            rules = rules_from_env()
+        except (OSError, ValueError, TypeError) as e:
+            logging.error(f"Правила тревог не загружены: {e}")
+            rules = []
+    if rules:
+        logging.info(f"Правил тревог: {len(rules)}")
+
+    node = HeadlessNode(ports, args.baudrate, output,
+                        max_bytes=int(args.segment_mb * 1024 * 1024), max_seconds=args.segment_seconds,
+                        discover=args.discover, alarm_rules=rules, retention=retention)
+    signal.signal(signal.SIGTERM, lambda *_: node.stop())
+    signal.signal(signal.SIGINT, lambda *_: node.stop())
+
+    logging.info(f"Сбор данных: {', '.join(f'{d}={p}' for d, p in ports.items())} -> {output or 'без записи'}")
+    server = None
+    if args.metrics_port:
+        registry = MetricsRegistry()
+        registry.add_collector(node.metrics)
+        server = start_server(registry, args.metrics_port, args.metrics_host)
+
+    started = time.perf_counter()
+    node.start()
+    node.wait(args.status_interval)
+    if server:
+        server.stop()
+    logging.info(f"Работали {time.perf_counter() - started:.0f} с")
+
+
+if __name__ == "__main__":
+    main()
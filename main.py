@@ -1,6 +1,191 @@
-from main_imports import *
-from MainWindow import MainWindow, App
+"""Точка входа приложения.
 
+Запуск выстроен так, чтобы окно ожидания появилось как можно раньше: до
+него загружаются только QtWidgets. Приём (numpy, pyserial) запускается
+после показа окна, главное окно с графиками (pyqtgraph) импортируется,
+пока ждём контроллер, и создаётся при первом подключении.
 
-if __name__ == "__main__":
+Замеры запуска (время до окна ожидания, до главного окна, до первого
+отрисованного кадра) пишутся в журнал. NIIM_STARTUP_REPORT=путь.json ‒
+записать их в файл и выйти после первого кадра (python benchmark.py startup).
+"""
+import time
+
+STARTED = time.perf_counter()
+STARTED_WALL = time.time()
+
+import json
+import logging
+import os
+import sys
+
+from PyQt5.QtCore import QTimer, Qt
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel
+
+from Logs import setup_logging
+
+
+class StartupTimer:
+    """Отметки времени от начала выполнения main.py, мс; повторная отметка не перезаписывает первую."""
+
+    def __init__(self, started: float = STARTED):
+        self.started = started
+        self.marks = {}
+
+    def mark(self, name: str):
+        if name in self.marks:
+            return
+        self.marks[name] = ms = (time.perf_counter() - self.started) * 1000
+        logging.info(f"Запуск: {name} ‒ {ms:.0f} мс")
+
+    def report(self) -> dict:
+        return {"started_wall": STARTED_WALL, "marks_ms": self.marks}
+
+
+class LoadingWindow(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Ожидание устройства...")
+        self.setGeometry(100, 100, 300, 100)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Ожидание подключения по COM..."))
+
+
+class App:
+    def __init__(self):
+        self.timer = StartupTimer()
+        self.report_path = os.environ.get("NIIM_STARTUP_REPORT")
+        self.qt_app = QApplication(sys.argv)
+
+        # окно ожидания (может быстро исчезнуть, если контроллер уже подключён)
+        self.loading = LoadingWindow()
+        self.loading.show()
+        self.qt_app.processEvents()          # отрисовать окно до тяжёлых импортов
+        self.timer.mark("loading_shown")
+
+        from AcquisitionPool import AcquisitionPool, discover_from_env, ports_from_env, process_mode_from_env
+        from AlarmEngine import rules_from_env
+        from Metrics import MetricsRegistry, server_from_env
+        from Recorder import record_dir_from_env, retention_from_env
+
+        # по воркеру и потоку на порт. Порты ‒ NIIM_PORTS="ст1=/dev/ttyUSB0,ст2=/dev/ttyUSB1"
+        # или один NIIM_PORT (pty симулятора, socket:// воспроизведения)
+        # кадры обмена идут в GUI не по одному сигналу на пачку, а через транспорт
+        # каждого устройства: push в потоке порта, выдача ‒ по таймеру в GUI-потоке
+        # NIIM_ACQUISITION=process ‒ порты читают отдельные процессы
+        # NIIM_DISCOVER=1 ‒ единственный контроллер искать на всех портах системы
+        # правила тревог ‒ alarms.json или NIIM_ALARMS; ошибка в файле не мешает приёму
+        try:
+            rules = rules_from_env()
+        except (OSError, ValueError, TypeError) as e:
+            logging.error(f"Правила тревог не загружены: {e}")
+            rules = []
+        # запись ‒ в records (NIIM_RECORD=0 ‒ не писать), хранение ‒ NIIM_RECORD_KEEP_GB/_DAYS
+        try:
+            retention = retention_from_env()
+        except ValueError as e:
+            logging.error(f"Хранение записей: {e}; старые сегменты не удаляются")
+            retention = {}
+        self.pool = AcquisitionPool(ports_from_env(), rate_hz=30, record_dir=record_dir_from_env(),
+                                    out_of_process=process_mode_from_env(), alarm_rules=rules,
+                                    discover=discover_from_env(), retention=retention)
+        self.pool.connection_status.connect(self._on_connection_status)
+        self.pool.alarm_changed.connect(self._on_alarm)
+        self.pool.start()
+        self.timer.mark("acquisition_started")
+
+        # метрики: окно «Логи → Диагностика» и http://127.0.0.1:9105/metrics (NIIM_METRICS_PORT)
+        self.metrics = MetricsRegistry()
+        self.metrics.add_collector(self.pool.metrics)
+        self.metrics_server = server_from_env(self.metrics)
+        self.main = None
+
+        # модуль главного окна (pyqtgraph) грузим, пока контроллер ещё не ответил
+        QTimer.singleShot(0, self._preload_main_window)
+
+    def _preload_main_window(self):
+        import MainWindow  # noqa: F401
+        self.timer.mark("main_window_imported")
+
+    # ----------  реакции на (от-)подключение устройства  ----------
+    def _on_connection_status(self, device: str, connected: bool):
+        if connected:
+            # если главное окно ещё не создано – создаём
+            if self.main is None:
+                self._launch_main_window()
+            self.main.update_connection_status(device, True)
+
+            # убираем окно ожидания
+            if self.loading.isVisible():
+                self.loading.hide()
+        else:
+            # устройство исчезло; окно ожидания ‒ только если не осталось ни одного
+            if self.main:
+                self.main.update_connection_status(device, False)
+            if not any(d.connected for d in self.pool.devices.values()) and not self.loading.isVisible():
+                self.loading.show()
+
+    def _on_alarm(self, device: str, event):
+        if event.active:
+            logging.warning(f"{device}: тревога «{event.rule}»: {event.message} ({event.value:.4g})")
+        else:
+            logging.info(f"{device}: тревога «{event.rule}» снята")
+        if self.main:
+            self.main.display_alarm(device, event)
+
+    def _launch_main_window(self):
+        from MainWindow import MainWindow
+
+        self.main = MainWindow(self.pool.device_ids, self.metrics,
+                               {d.id: d.stats for d in self.pool.devices.values()})
+        self.metrics.add_collector(self.main.metrics)
+        for device in self.pool.devices.values():
+            self.main.update_connection_status(device.id, device.connected)
+
+        # перенаправляем сигналы сразу в интерфейс
+        self.pool.data_received.connect(self.main.display_data)
+        self.pool.batch_delivered.connect(self.main.display_batch)
+        self.pool.error_occurred.connect(self.main.display_error)
+        self.pool.eeprom_progress.connect(self.main.display_eeprom_progress)
+        self.pool.eeprom_dump_finished.connect(self.main.display_eeprom_dump)
+        self.pool.eeprom_write_finished.connect(self.main.display_eeprom_write)
+        # после display_batch ‒ первый кадр уже на графике
+        self.pool.batch_delivered.connect(self._on_first_batch)
+
+        # команды ставятся в очередь передатчика прямо из GUI-потока (слоты потокобезопасны)
+        self.main.send_command_signal.connect(self.pool.handle_command, Qt.DirectConnection)
+        self.main.read_eeprom_range_signal.connect(self.pool.read_eeprom_range, Qt.DirectConnection)
+        self.main.write_eeprom_signal.connect(self.pool.write_eeprom, Qt.DirectConnection)
+
+        self.main.show()
+        self.timer.mark("main_window_shown")
+
+    def _on_first_batch(self, device: str, batch):
+        self.pool.batch_delivered.disconnect(self._on_first_batch)
+        self.timer.mark("first_frame")
+        if self.report_path:
+            with open(self.report_path, "w") as f:
+                json.dump(self.timer.report(), f)
+            self.qt_app.quit()
+
+    # ----------  корректное закрытие  ----------
+    def _stop_serial_thread(self):
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.pool.stop()
+
+    def run(self):
+        exit_code = self.qt_app.exec_()
+        self._stop_serial_thread()
+        sys.exit(exit_code)
+
+
+def main():
+    setup_logging()
     App().run()
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()      # NIIM_ACQUISITION=process в сборке PyInstaller
+    main()
@@ -1,4 +1,6 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Сборка в каталог (onedir): один exe распаковывал бы всё во временную папку
+# при каждом запуске. UPX выключен ‒ сжатые библиотеки распаковываются при загрузке.
 
 
 a = Analysis(
@@ -10,7 +12,9 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # не используются, а pyqtgraph/numpy тянут их при анализе
+    excludes=['tkinter', 'matplotlib', 'scipy', 'IPython', 'pyqtgraph.opengl', 'pyqtgraph.examples',
+              'PyQt5.QtWebEngineWidgets', 'PyQt5.QtQml', 'PyQt5.QtQuick'],
     noarchive=False,
     optimize=0,
 )
@@ -19,16 +23,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +37,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main',
+)
@@ -11,18 +11,13 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QBrush, QColor, QPolygonF, QPen, QFont, QPainter
 from PyQt5.QtCore import QTimer, QPointF, Qt
-import pyqtgraph as pg
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
-import serial
 import struct
 from time import sleep
 from queue import Queue
 
 import logging
 
-logging.basicConfig(
-    filename="niim.log",  # файл логов
-    filemode="a",          # дописывать, не перезаписывать
-    level=logging.DEBUG,   # уровень логирования
-    format="%(asctime)s | %(levelname)s | %(message)s",
-)
\ No newline at end of file
+# pyqtgraph (~0.15 с на импорт) и pyserial сюда не входят: графики импортируют
+# pyqtgraph сами (GraphWindow), порт ‒ SerialWorker/PortDiscovery. Журнал при
+# импорте не настраивается ‒ это делает точка входа (Logs.setup_logging).
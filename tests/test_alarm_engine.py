@@ -0,0 +1,155 @@
+"""Правила тревог (AlarmEngine): гистерезис, задержка, условия блокировки, скорость, досрочная проверка."""
+import json
+
+import numpy as np
+import pytest
+
+from AlarmEngine import AlarmEngine, AlarmRule, load_rules
+from FrameParser import EXCHANGE_DTYPE, ExchangeBatch
+
+MS = 1_000_000
+
+
+def frames(t_ms, **channels) -> ExchangeBatch:
+    """Пачка кадров: t_ms ‒ время каждого кадра, мс; channels ‒ значения каналов (число или список)."""
+    t_ms = np.atleast_1d(np.asarray(t_ms, dtype=np.int64))
+    records = np.zeros(len(t_ms), dtype=EXCHANGE_DTYPE)
+    for name, values in channels.items():
+        records[name] = values
+    return ExchangeBatch(records, (t_ms * MS).astype(np.uint64))
+
+
+def states(events) -> list:
+    return [(e.rule, e.active, e.t_ns // MS) for e in events]
+
+
+def test_threshold_with_hysteresis():
+    engine = AlarmEngine([AlarmRule("горячо", "TEMP1", ">", 60, hysteresis=2)])
+    temp = [59, 61, 59, 58.5, 57.9, 61]
+    events = engine.evaluate(np.arange(6) * 100 * MS, {"TEMP1": np.array(temp)})
+    # 59 и 58.5 ‒ ещё в полосе гистерезиса, снимается только ниже 58
+    assert states(events) == [("горячо", True, 100), ("горячо", False, 400), ("горячо", True, 500)]
+    assert engine.active == ["горячо"]
+
+
+def test_low_threshold():
+    engine = AlarmEngine([AlarmRule("ТМН тормозит", "TMNrpm", "<", 30000, hysteresis=1000)])
+    events = engine.evaluate(np.arange(4) * MS, {"TMNrpm": np.array([31000, 29000, 30500, 31001])})
+    assert [e.active for e in events] == [True, False]
+    assert events[0].value == 29000
+
+
+def test_delay_across_batches():
+    engine = AlarmEngine([AlarmRule("горячо", "TEMP1", ">", 60, delay=1)])
+    # условие выполняется с 0 мс; тревога ‒ не раньше 1000 мс, даже если пачки разные
+    assert engine.evaluate(np.array([0, 400]) * MS, {"TEMP1": np.array([61, 62])}) == []
+    assert engine.evaluate(np.array([800]) * MS, {"TEMP1": np.array([63])}) == []
+    events = engine.evaluate(np.array([1000, 1200]) * MS, {"TEMP1": np.array([61, 61])})
+    assert states(events) == [("горячо", True, 1000)]
+
+
+def test_delay_restarts_after_dip():
+    engine = AlarmEngine([AlarmRule("горячо", "TEMP1", ">", 60, delay=1)])
+    t = np.array([0, 500, 900, 1000, 1500, 1900, 2000])
+    temp = np.array([61, 61, 59, 61, 61, 61, 61])
+    assert states(engine.evaluate(t * MS, {"TEMP1": temp})) == [("горячо", True, 2000)]
+
+
+def test_when_bit_gate():
+    rule = AlarmRule("ТМН при открытом V1", "TMNrpm", "<", 30000,
+                     when=[{"channel": "ElectroValveState", "bit": 0}])
+    engine = AlarmEngine([rule])
+    rpm = np.array([20000, 20000, 20000, 20000])
+    valves = np.array([0b10, 0b01, 0b11, 0b00])
+    events = engine.evaluate(np.arange(4) * MS, {"TMNrpm": rpm, "ElectroValveState": valves})
+    # V1 закрыт ‒ правило не проверяется, а поднятая тревога снимается
+    assert [(e.active, e.t_ns // MS) for e in events] == [(True, 1), (False, 3)]
+
+
+def test_when_compare_gate():
+    rule = AlarmRule("давление", "MIDA", ">", 1.0, when=[{"channel": "TMNState", "op": "==", "value": 1}])
+    engine = AlarmEngine([rule])
+    events = engine.evaluate(np.arange(3) * MS, {"MIDA": np.array([2.0, 2.0, 2.0]),
+                                                 "TMNState": np.array([0, 1, 1])})
+    assert states(events) == [("давление", True, 1)]
+
+
+def test_rate_rule():
+    engine = AlarmEngine([AlarmRule("натекание", "MIDA", ">", 0.05, kind="rate", window=10)])
+    t = np.arange(0, 30_000, 1000)                     # кадр в секунду, 30 с
+    mida = np.where(t < 15_000, 1.0, 1.0 + (t - 15_000) / 1000 * 0.1)   # с 15 с растёт на 0.1/с
+    events = []
+    for i in range(0, len(t), 7):                       # пачками: хвост окна переносится между ними
+        events += engine.evaluate(t[i:i + 7] * MS, {"MIDA": mida[i:i + 7]})
+    [event] = events
+    assert event.active
+    # скорость за 10 с превышает 0.05/с, когда рост идёт больше 5 с
+    assert 20_000 <= event.t_ns // MS <= 21_000
+    assert event.value > 0.05
+
+
+def test_rate_needs_half_window_of_history():
+    engine = AlarmEngine([AlarmRule("натекание", "MIDA", "<", -0.1, kind="rate", window=10)])
+    # резкое падение в самом начале, истории меньше 5 с ‒ скорость не считается
+    assert engine.evaluate(np.array([0, 1000, 2000]) * MS, {"MIDA": np.array([10.0, 5.0, 1.0])}) == []
+
+
+# ----------  накопление и досрочная проверка  ----------
+def test_feed_waits_for_max_delay():
+    engine = AlarmEngine([AlarmRule("горячо", "TEMP1", ">", 60)], max_delay=0.05)
+    assert engine.feed(frames(0, TEMP1=61)) == []
+    assert engine.feed(frames(20, TEMP1=61)) == []
+    assert states(engine.feed(frames(60, TEMP1=61))) == [("горячо", True, 0)]
+
+
+def test_last_frames_before_pause_are_flushed_by_timer():
+    engine = AlarmEngine([AlarmRule("горячо", "TEMP1", ">", 60)], max_delay=0.05)
+    assert engine.feed(frames(1000, TEMP1=70)) == []
+    # поток кадров встал: рано ‒ ждём, позже max_delay ‒ проверяем
+    assert engine.flush_stale(now_ns=1020 * MS) == []
+    assert states(engine.flush_stale(now_ns=1060 * MS)) == [("горячо", True, 1000)]
+    assert engine.flush_stale(now_ns=2000 * MS) == []
+
+
+def test_flush_on_disconnect():
+    engine = AlarmEngine([AlarmRule("горячо", "TEMP1", ">", 60)], max_delay=10)
+    engine.feed(frames([0, 10, 20], TEMP1=[50, 65, 70]))
+    assert states(engine.flush()) == [("горячо", True, 10)]
+    assert engine.flush() == []
+
+
+def test_feed_without_rules():
+    engine = AlarmEngine([])
+    assert engine.feed(frames(0, TEMP1=100)) == [] and engine.flush() == []
+
+
+# ----------  правила из файла  ----------
+def test_load_rules(tmp_path):
+    path = tmp_path / "alarms.json"
+    path.write_text(json.dumps([
+        {"name": "горячо", "channel": "TEMP1", "op": ">", "value": 60, "severity": "warning"},
+        {"name": "натекание", "channel": "MIDA", "kind": "rate", "window": 10, "op": ">", "value": 0.05},
+    ]), encoding="utf-8")
+    rules = load_rules(str(path))
+    assert [r.name for r in rules] == ["горячо", "натекание"]
+    assert rules[0].message == "TEMP1 > 60" and rules[1].message == "MIDA (скорость) > 0.05"
+
+
+@pytest.mark.parametrize("item", [
+    {"name": "x", "channel": "TEMP1", "op": ">=", "value": 1},
+    {"name": "x", "channel": "MIDA", "kind": "rate", "op": ">", "value": 1},
+    {"name": "x", "channel": "TEMP1", "op": ">", "value": 1, "severity": "fatal"},
+    {"name": "x", "channel": "TEMP1", "op": ">", "value": 1, "delay": -1},
+    {"name": "x", "channel": "TEMP1", "op": ">", "value": 1, "when": [{"channel": "DU16", "op": "~"}]},
+])
+def test_invalid_rules(item):
+    with pytest.raises(ValueError):
+        AlarmRule(**item)
+
+
+def test_duplicate_rule_names(tmp_path):
+    path = tmp_path / "alarms.json"
+    rule = {"name": "горячо", "channel": "TEMP1", "op": ">", "value": 60}
+    path.write_text(json.dumps([rule, rule]), encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_rules(str(path))
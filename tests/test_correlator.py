@@ -0,0 +1,205 @@
+"""Сопоставление ответов с командами (Correlator): порядок, потери, сроки, чужие ответы."""
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+from PyQt5.QtCore import Qt
+
+from Correlator import Correlator
+from errors import DEVICE_ERROR, REPLY_LOST, REQUEST_TIMEOUT
+from FrameParser import encode_eeprom_reply, encode_error
+from Metrics import worker_samples
+
+CMD_VALVE = 0x01
+CMD_EEPROM_READ = 0x11
+
+
+def eeprom_reply(data: bytes, t_ns: int | None = None) -> dict:
+    return {"EEPROM_READ": list(data), "T_NS": t_ns, "DEVICE": None}
+
+
+def error_reply(cmd_id: int, code: int = 2) -> dict:
+    return {"CMD_ID": cmd_id, "ERROR_CODE": code, "ERROR_INFO": b"", "T_NS": None, "DEVICE": None}
+
+
+def read_request(correlator: Correlator, length: int, timeout: float | None = None):
+    packet = bytes([0xCC, CMD_EEPROM_READ, 0, 0, length])
+    future = correlator.register(CMD_EEPROM_READ, packet, expect_length=length, timeout=timeout)
+    correlator.mark_sent([packet], time.monotonic_ns())
+    return future
+
+
+def test_in_order_replies():
+    correlator = Correlator()
+    futures = [read_request(correlator, 4) for _ in range(3)]
+    for i in range(3):
+        assert correlator.match(eeprom_reply(bytes([i]) * 4))
+    assert [f.result(0)["EEPROM_READ"] for f in futures] == [[0] * 4, [1] * 4, [2] * 4]
+    assert correlator.matched == 3 and correlator.in_flight == 0
+    assert sum(count for _, count in correlator.latency_histogram(CMD_EEPROM_READ)) == 3
+
+
+def test_latency_in_seconds():
+    correlator = Correlator()
+    packet = bytes([0xCC, CMD_EEPROM_READ, 0, 0, 4])
+    future = correlator.register(CMD_EEPROM_READ, packet, expect_length=4)
+    correlator.mark_sent([packet], 1_000_000_000)
+    correlator.match(eeprom_reply(b"\x00" * 4, t_ns=1_003_000_000))   # ответ через 3 мс
+    assert future.done()
+    assert dict(correlator.latency_histogram(CMD_EEPROM_READ))[0.005] == 1
+    assert correlator.histograms[CMD_EEPROM_READ].sum == pytest.approx(0.003)
+
+
+def test_reply_for_later_read_marks_earlier_as_lost():
+    # ответ на 8 байт пришёл раньше ответа на 4: ответы одного вида не обгоняют
+    # друг друга, значит ответ на первое чтение потерян
+    correlator = Correlator()
+    first, second = read_request(correlator, 4), read_request(correlator, 8)
+    assert correlator.match(eeprom_reply(b"\x01" * 8))
+    assert second.result(0)["EEPROM_READ"] == [1] * 8
+    with pytest.raises(REPLY_LOST):
+        first.result(0)
+    assert correlator.lost == 1 and correlator.in_flight == 0
+
+
+def test_errors_out_of_order():
+    correlator = Correlator()
+    valve = correlator.register(CMD_VALVE, b"valve", timeout=10)
+    read = read_request(correlator, 4)
+    # ошибка на чтение приходит раньше, чем истёк срок команды клапана
+    assert correlator.match(error_reply(CMD_EEPROM_READ))
+    with pytest.raises(DEVICE_ERROR):
+        read.result(0)
+    assert not valve.done()
+    # ошибка не по нашей команде остаётся GUI
+    assert not correlator.match(error_reply(0x42))
+    assert correlator.match(error_reply(CMD_VALVE))
+    with pytest.raises(DEVICE_ERROR):
+        valve.result(0)
+    assert correlator.device_errors == 2
+
+
+def test_lost_reply_times_out():
+    correlator = Correlator()
+    read = read_request(correlator, 4, timeout=0.05)
+    valve = correlator.register(CMD_VALVE, b"valve", timeout=0.05)
+    correlator.expire(time.monotonic_ns() + int(1e9))
+    with pytest.raises(REQUEST_TIMEOUT):
+        read.result(0)
+    # команда без ответа за срок без ошибки ‒ выполнена
+    assert valve.result(0) is None
+    assert correlator.expired == 1 and correlator.in_flight == 0
+
+
+def test_expiry_thread():
+    correlator = Correlator()
+    correlator.start()
+    try:
+        read = read_request(correlator, 4, timeout=0.05)
+        with pytest.raises(REQUEST_TIMEOUT):
+            read.result(timeout=2)
+    finally:
+        correlator.stop()
+
+
+def test_late_reply_after_timeout_is_stray():
+    correlator = Correlator()
+    read = read_request(correlator, 4, timeout=0.01)
+    correlator.expire(time.monotonic_ns() + int(1e9))
+    assert correlator.match(eeprom_reply(b"\x00" * 4))   # поглощён, но никому не достался
+    assert correlator.stray == 1 and correlator.matched == 0
+    with pytest.raises(REQUEST_TIMEOUT):
+        read.result(0)
+
+
+def test_stray_reply_does_not_complete_other_length():
+    correlator = Correlator()
+    read = read_request(correlator, 4)
+    assert correlator.match(eeprom_reply(b"\x00" * 16))
+    assert correlator.stray == 1 and not read.done()
+    assert correlator.match(eeprom_reply(b"\x05" * 4))
+    assert read.result(0)["EEPROM_READ"] == [5] * 4
+
+
+def test_stop_cancels_pending():
+    correlator = Correlator()
+    correlator.start()
+    read = read_request(correlator, 4)
+    correlator.stop()
+    with pytest.raises(CancelledError):
+        read.result(0)
+
+
+# ----------  через порт: SerialWorker и симулятор контроллера  ----------
+@pytest.fixture
+def worker():
+    from Simulator import ControllerSimulator
+    from SerialWorker import SerialWorker
+
+    sim = ControllerSimulator(rate=100, reply_delay=0.005)
+    sim.eeprom[:256] = bytes(range(256))
+    sim.start()
+    worker = SerialWorker(port=sim.port)
+    thread = threading.Thread(target=worker.run_input, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while worker.serial_connection is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.serial_connection is not None, "воркер не подключился к симулятору"
+    worker.sim = sim
+    yield worker
+    worker.stop()
+    thread.join(timeout=2)
+    sim.close()
+
+
+def read_eeprom(worker, address: int, count: int, timeout: float | None = None):
+    packet = worker.build_eprom_command(CMD_EEPROM_READ, address, bytes([count]))
+    return worker.request(CMD_EEPROM_READ, packet, expect_length=count, timeout=timeout)
+
+
+def test_pipelined_reads_through_simulator(worker):
+    futures = [read_eeprom(worker, address, 16) for address in range(0, 128, 16)]
+    for address, future in zip(range(0, 128, 16), futures):
+        assert future.result(timeout=2)["EEPROM_READ"] == list(range(address, address + 16))
+    assert worker.correlator.matched == 8
+    assert worker.correlator.lost == worker.correlator.stray == 0
+    [latency] = [s for s in worker_samples("1", worker.stats()) if s.name == "niim_reply_latency_seconds"]
+    assert latency.labels == {"device": "1", "cmd": "0x11"} and latency.value.count == 8
+    assert 0 < latency.value.sum / 8 < 1
+
+
+def test_device_error_through_simulator(worker):
+    # адрес за концом EEPROM ‒ симулятор отвечает ошибкой на эту команду
+    future = read_eeprom(worker, 0xFFF0, 32)
+    with pytest.raises(DEVICE_ERROR):
+        future.result(timeout=2)
+
+
+def test_stray_reply_through_simulator(worker):
+    worker.sim._reply(encode_eeprom_reply(b"\x00" * 3))
+    deadline = time.monotonic() + 2
+    while worker.correlator.stray == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.correlator.stray == 1
+    # следующий обмен не сбит чужим ответом
+    assert read_eeprom(worker, 0, 4).result(timeout=2)["EEPROM_READ"] == [0, 1, 2, 3]
+
+
+def test_unknown_error_reaches_gui(worker):
+    errors = []
+    worker.data_received.connect(errors.append, Qt.DirectConnection)
+    worker.sim._reply(encode_error(0x42, 7))
+    deadline = time.monotonic() + 2
+    while not errors and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert errors and errors[0]["CMD_ID"] == 0x42
+
+
+def test_malformed_command_does_not_stop_simulator(worker):
+    # запись EEPROM без адреса: симулятор отвечает ошибкой и продолжает работать
+    future = worker.request(0x10, bytes([0xCC, 0x10, 0x01, 0x00]))
+    with pytest.raises(DEVICE_ERROR):
+        future.result(timeout=2)
+    assert read_eeprom(worker, 0, 4).result(timeout=2)["EEPROM_READ"] == [0, 1, 2, 3]
@@ -0,0 +1,199 @@
+"""Чтение и запись EEPROM (EepromTransfer): конвейер, планирование записи, выгрузка в Intel HEX."""
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+from PyQt5.QtCore import Qt
+
+from EepromTransfer import (
+    EEPROM_SIZE, MAX_CHUNK, MAX_WRITE, EepromDump, plan_writes, read_ranges, write_intel_hex,
+)
+from errors import EEPROM_TRANSFER_FAILED, REQUEST_TIMEOUT
+
+
+# ----------  EepromDump без порта  ----------
+class FakeDevice:
+    """send(адрес, число байт) сразу завершает Future данными образа; fail ‒ какие запросы «теряются»."""
+
+    def __init__(self, image: bytes, fail=lambda n, address: False):
+        self.image = image
+        self.fail = fail
+        self.requests = []
+
+    def send(self, address: int, count: int) -> Future:
+        self.requests.append((address, count))
+        future = Future()
+        if self.fail(len(self.requests), address):
+            future.set_exception(REQUEST_TIMEOUT("нет ответа"))
+        else:
+            future.set_result({"EEPROM_READ": list(self.image[address:address + count])})
+        return future
+
+
+def test_dump_chunks_cover_range_with_distinct_lengths_in_window():
+    image = bytes(random.Random(1).randrange(256) for _ in range(4000))
+    device = FakeDevice(image)
+    dump = EepromDump(100, 3000, device.send, window=4, timeout=0.01)
+    assert dump.run() == image[100:3100]
+    assert all(size <= MAX_CHUNK for _, size in dump.chunks)
+    # в одном окне длины не повторяются ‒ ответ 0xCC узнаётся по длине
+    # (последний кусок укорочен остатком ‒ за него отвечает _sendable)
+    sizes = [size for _, size in dump.chunks[:-1]]
+    for i in range(len(sizes) - 3):
+        assert len(set(sizes[i:i + 4])) == 4
+
+
+def test_dump_retries_lost_chunk():
+    image = bytes(range(256)) * 4
+    device = FakeDevice(image, fail=lambda n, address: n == 2)
+    dump = EepromDump(0, len(image), device.send, timeout=0.01)
+    assert dump.run() == image
+    assert dump.retried == 1
+
+
+def test_dump_gives_up_after_retries():
+    device = FakeDevice(bytes(512), fail=lambda n, address: address == 0)
+    dump = EepromDump(0, 512, device.send, timeout=0.001, retries=2)
+    with pytest.raises(EEPROM_TRANSFER_FAILED):
+        dump.run()
+
+
+@pytest.mark.parametrize("start, length", [(-1, 10), (0, 0), (EEPROM_SIZE - 4, 8)])
+def test_dump_rejects_range_outside_eeprom(start, length):
+    with pytest.raises(ValueError):
+        EepromDump(start, length, None)
+
+
+# ----------  планирование записи  ----------
+def test_plan_merges_adjacent_bytes():
+    assert plan_writes({10: 1, 11: 2, 12: 3, 20: 4}) == [(10, b"\x01\x02\x03"), (20, b"\x04")]
+
+
+def test_plan_splits_long_runs():
+    changes = {a: a & 0xFF for a in range(1000)}
+    blocks = plan_writes(changes)
+    assert [len(data) for _, data in blocks] == [MAX_WRITE] * 3 + [1000 - 3 * MAX_WRITE]
+    assert b"".join(data for _, data in blocks) == bytes(a & 0xFF for a in range(1000))
+    assert [start for start, _ in blocks] == [0, MAX_WRITE, 2 * MAX_WRITE, 3 * MAX_WRITE]
+
+
+def test_plan_respects_page_boundaries():
+    changes = {a: 0x55 for a in range(60, 140)}
+    blocks = plan_writes(changes, page_size=64)
+    assert blocks == [(60, b"\x55" * 4), (64, b"\x55" * 64), (128, b"\x55" * 12)]
+    for start, data in blocks:
+        assert start // 64 == (start + len(data) - 1) // 64
+
+
+def test_plan_fills_small_gaps_only_with_known_bytes():
+    image = bytes(range(256))
+    changes = {10: 0xAA, 13: 0xBB}
+    # разрыв без known не закрывается
+    assert plan_writes(changes, max_gap=4) == [(10, b"\xaa"), (13, b"\xbb")]
+    # с known ‒ одна команда, в разрыве прежние байты
+    assert plan_writes(changes, known=lambda a: image[a], max_gap=4) == [(10, b"\xaa\x0b\x0c\xbb")]
+    # разрыв длиннее max_gap и неизвестный байт в разрыве
+    assert len(plan_writes(changes, known=lambda a: image[a], max_gap=1)) == 2
+    assert len(plan_writes(changes, known=lambda a: None if a == 11 else image[a], max_gap=4)) == 2
+
+
+def test_read_ranges_join_close_blocks():
+    blocks = [(0, b"\x00" * 4), (10, b"\x00" * 2), (100, b"\x00")]
+    assert read_ranges(blocks, max_gap=8) == [(0, 12), (100, 1)]
+
+
+# ----------  Intel HEX  ----------
+def parse_hex(path) -> list:
+    records = []
+    for line in open(path):
+        line = line.strip()
+        assert line.startswith(":")
+        raw = bytes.fromhex(line[1:])
+        assert raw[0] == len(raw) - 5, "длина записи не совпадает с числом байт данных"
+        assert sum(raw) & 0xFF == 0, f"неверная контрольная сумма: {line}"
+        records.append((raw[3], int.from_bytes(raw[1:3], "big"), raw[4:-1]))
+    return records
+
+
+def test_intel_hex_layout(tmp_path):
+    path = tmp_path / "eeprom.hex"
+    data = bytes(range(40))
+    write_intel_hex(str(path), data, start=0x100)
+    records = parse_hex(path)
+    assert [(kind, address, len(payload)) for kind, address, payload in records] == [
+        (0x00, 0x100, 16), (0x00, 0x110, 16), (0x00, 0x120, 8), (0x01, 0, 0)]
+    assert b"".join(payload for kind, _, payload in records if kind == 0) == data
+    assert open(path).read().splitlines()[-1] == ":00000001FF"
+
+
+def test_intel_hex_known_record(tmp_path):
+    path = tmp_path / "eeprom.hex"
+    write_intel_hex(str(path), bytes([0x02, 0x33, 0x7A]), start=0x0030)
+    assert open(path).read().splitlines()[0] == ":0300300002337A1E"
+
+
+def test_intel_hex_crosses_64k_boundary(tmp_path):
+    path = tmp_path / "eeprom.hex"
+    write_intel_hex(str(path), bytes(range(20)), start=0xFFF8)
+    records = parse_hex(path)
+    assert [(kind, address, payload) for kind, address, payload in records[:3]] == [
+        (0x00, 0xFFF8, bytes(range(8))), (0x04, 0, b"\x00\x01"), (0x00, 0x0000, bytes(range(8, 20)))]
+
+
+# ----------  через порт: SerialWorker и симулятор с EEPROM на 64 КБ  ----------
+@pytest.fixture
+def worker():
+    from Simulator import ControllerSimulator
+    from SerialWorker import SerialWorker
+
+    sim = ControllerSimulator(rate=100)
+    sim.eeprom[:] = bytes(random.Random(2).randrange(256) for _ in range(EEPROM_SIZE))
+    sim.start()
+    worker = SerialWorker(port=sim.port)
+    thread = threading.Thread(target=worker.run_input, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while worker.serial_connection is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.serial_connection is not None, "воркер не подключился к симулятору"
+    worker.sim = sim
+    yield worker
+    worker.stop()
+    thread.join(timeout=2)
+    sim.close()
+
+
+def wait_signal(signal, action, timeout: float = 30):
+    results = []
+    done = threading.Event()
+    signal.connect(lambda *args: (results.append(args), done.set()), Qt.DirectConnection)
+    action()
+    assert done.wait(timeout), "операция с EEPROM не завершилась"
+    return results[0]
+
+
+def test_full_dump_through_simulator(worker):
+    start, data, rate, error = wait_signal(worker.eeprom_dump_finished,
+                                           lambda: worker.read_eeprom_range(0, EEPROM_SIZE))
+    assert error == "" and start == 0
+    assert data == bytes(worker.sim.eeprom)
+    assert rate > 0
+
+
+def test_write_round_trip_through_simulator(worker):
+    image = bytes(worker.sim.eeprom)
+    changes = {a: image[a] ^ 0xFF for a in (*range(0x100, 0x180), *range(0xFFF0, 0x10000), 0x8000)}
+    blocks = plan_writes(changes, page_size=64)
+    verified, error = wait_signal(worker.eeprom_write_finished, lambda: worker.write_eeprom(blocks))
+    assert error == ""
+    assert verified == blocks
+    expected = bytearray(image)
+    for address, value in changes.items():
+        expected[address] = value
+    assert bytes(worker.sim.eeprom) == bytes(expected)
+
+    start, data, _, error = wait_signal(worker.eeprom_dump_finished,
+                                        lambda: worker.read_eeprom_range(0xFF00, 0x100))
+    assert error == "" and data == bytes(expected[0xFF00:])
@@ -0,0 +1,167 @@
+"""FrameParser.feed на раздробленных и испорченных потоках байт."""
+import random
+
+import pytest
+
+from FrameParser import (
+    EXCHANGE_FRAME, FrameParser, encode_eeprom_reply, encode_error, encode_exchange,
+)
+
+NOISE = b"\x01\x02\x03\x04"          # без синхробайтов
+
+
+def frames(count: int) -> list:
+    return [encode_exchange({"TMNrpm": i, "MIDA": float(i)}) for i in range(count)]
+
+
+def feed_chunks(parser: FrameParser, data: bytes, sizes) -> list:
+    packets = []
+    pos = 0
+    for size in sizes:
+        packets += parser.feed(data[pos:pos + size])
+        pos += size
+    packets += parser.feed(data[pos:])
+    return packets
+
+
+def exchange_values(packets) -> list:
+    return [int(v) for p in packets if not isinstance(p, dict) for v in p["TMNrpm"]]
+
+
+def random_splits(length: int, rng: random.Random) -> list:
+    sizes = []
+    while sum(sizes) < length:
+        sizes.append(rng.randint(1, 2 * EXCHANGE_FRAME))
+    return sizes
+
+
+# ----------  дробление  ----------
+@pytest.mark.parametrize("seed", range(20))
+def test_arbitrary_chunk_splits(seed):
+    data = b"".join(frames(50))
+    parser = FrameParser()
+    packets = feed_chunks(parser, data, random_splits(len(data), random.Random(seed)))
+    assert exchange_values(packets) == list(range(50))
+    assert parser.frame_counts["exchange"] == 50
+    assert parser.resyncs == 0 and parser.length_errors == 0
+    assert parser.pending == 0
+
+
+def test_single_byte_feed():
+    data = b"".join(frames(5))
+    parser = FrameParser()
+    packets = feed_chunks(parser, data, [1] * len(data))
+    assert exchange_values(packets) == list(range(5))
+    assert parser.resyncs == 0
+
+
+# ----------  мусор между кадрами  ----------
+@pytest.mark.parametrize("seed", range(10))
+def test_garbage_between_frames(seed):
+    # шум после каждого 7-го кадра: кадр перед шумом не теряется, где бы ни кончился кусок
+    parts = []
+    for i, frame in enumerate(frames(50)):
+        parts.append(frame)
+        if i % 7 == 3:
+            parts.append(NOISE)
+    data = b"".join(parts)
+    parser = FrameParser()
+    packets = feed_chunks(parser, data, random_splits(len(data), random.Random(seed)))
+    assert exchange_values(packets) == list(range(50))
+    assert parser.resyncs == 7
+    assert parser.length_errors == 0
+
+
+def test_garbage_runs_in_separate_feeds_are_counted_separately():
+    # кусок кончился мусором, следующий ‒ чистый кадр, третий снова начинается с мусора
+    first, second, third = frames(3)
+    parser = FrameParser()
+    packets = parser.feed(first + NOISE)
+    packets += parser.feed(second)
+    packets += parser.feed(NOISE + third)
+    assert exchange_values(packets) == [0, 1, 2]
+    assert parser.resyncs == 2
+
+
+def test_garbage_run_split_across_feeds_is_one_resync():
+    first, second = frames(2)
+    parser = FrameParser()
+    packets = parser.feed(first + NOISE[:2])
+    packets += parser.feed(NOISE[2:] + second)
+    assert exchange_values(packets) == [0, 1]
+    assert parser.resyncs == 1
+
+
+def test_garbage_at_stream_start():
+    parser = FrameParser()
+    packets = parser.feed(b"\x00\xff\x10" + b"".join(frames(3)))
+    assert exchange_values(packets) == [0, 1, 2]
+    assert parser.resyncs == 1
+
+
+# ----------  обрывы и неверные заголовки  ----------
+def test_truncated_frame_waits_for_rest():
+    data = b"".join(frames(2))
+    parser = FrameParser()
+    assert exchange_values(parser.feed(data[:EXCHANGE_FRAME + 10])) == [0]
+    assert parser.pending == 10
+    assert exchange_values(parser.feed(data[EXCHANGE_FRAME + 10:])) == [1]
+    assert parser.pending == 0
+
+
+def test_truncated_frame_followed_by_new_frame():
+    # оборванный кадр с верным заголовком забирает начало следующего кадра,
+    # остаток следующего пропускается как мусор, дальше разбор идёт как обычно
+    first, second, third, fourth, fifth = frames(5)
+    parser = FrameParser()
+    packets = parser.feed(first + second[:12] + third + fourth + fifth)
+    values = exchange_values(packets)
+    assert values[0] == 0
+    assert values[-2:] == [3, 4]
+    assert len(values) == 4             # 0, склейка 1+2, 3, 4
+    assert parser.resyncs == 1
+    assert parser.pending == 0
+
+
+@pytest.mark.parametrize("header", [b"\xaa\x04\x06", b"\xaa\x05\x07", b"\xaa\x00\x00"])
+def test_bad_lengths(header):
+    good = frames(2)
+    bad = header + bytes(EXCHANGE_FRAME - 3)
+    parser = FrameParser()
+    packets = parser.feed(good[0] + bad + good[1])
+    assert exchange_values(packets) == [0, 1]
+    assert parser.length_errors == 1
+    assert parser.resyncs == 1          # остаток испорченного кадра
+
+
+# ----------  пакеты ошибок и EEPROM  ----------
+def test_mixed_packets():
+    data = (frames(1)[0] + encode_eeprom_reply(bytes(range(16))) + encode_error(0x10, 3, b"xy")
+            + frames(2)[1] + b"\xee\xee" + encode_eeprom_reply(b"\x55" * 4) + frames(3)[2])
+    for seed in range(10):
+        parser = FrameParser()
+        packets = feed_chunks(parser, data, random_splits(len(data), random.Random(seed)))
+        kinds = [("eeprom" if "EEPROM_READ" in p else "error") if isinstance(p, dict) else "exchange"
+                 for p in packets]
+        assert kinds == ["exchange", "eeprom", "error", "exchange", "eeprom", "exchange"]
+        assert packets[1]["EEPROM_READ"] == list(range(16))
+        assert packets[2]["CMD_ID"] == 0x10 and packets[2]["ERROR_CODE"] == 3 and packets[2]["ERROR_INFO"] == b"xy"
+        assert parser.frame_counts == {"exchange": 3, "error": 1, "eeprom": 2}
+        assert parser.resyncs == 1      # 0xEE 0xEE ‒ неизвестный синхробайт
+        assert parser.length_errors == 0
+
+
+def test_eeprom_reply_before_noise():
+    parser = FrameParser()
+    packets = parser.feed(encode_eeprom_reply(b"\x01\x02") + NOISE + frames(1)[0])
+    assert packets[0]["EEPROM_READ"] == [1, 2]
+    assert exchange_values(packets) == [0]
+    assert parser.resyncs == 1
+
+
+def test_eeprom_wrong_command_is_resynced():
+    parser = FrameParser()
+    packets = parser.feed(b"\xcc\x13\x02\x01\x02" + frames(1)[0])
+    assert exchange_values(packets) == [0]
+    assert parser.frame_counts["eeprom"] == 0
+    assert parser.resyncs >= 1
@@ -0,0 +1,130 @@
+"""Журнал через Logs.LogPipeline: поток порта не ждёт диск, повторы сворачиваются."""
+import logging
+import threading
+import time
+
+import pytest
+
+from Logs import LogPipeline, RepeatLimiter
+
+# вызов logging.* в потоке порта ‒ микросекунды; пределы с запасом на медленную машину
+CALL_P99_MS = 5
+CALL_MAX_MS = 50
+
+
+class BlockingHandler(logging.Handler):
+    """«Диск», который стоит, пока не откроют unblocked, и потом пишет по delay секунд на запись."""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.unblocked = threading.Event()
+        self.delay = delay
+        self.messages = []
+
+    def emit(self, record):
+        self.unblocked.wait()
+        time.sleep(self.delay)
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def logger(request):
+    logger = logging.getLogger(f"test.{request.node.name}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    yield logger
+    logger.handlers.clear()
+
+
+def log_from_reader_thread(logger, messages) -> list:
+    """Вызвать logger.error для каждого сообщения в отдельном потоке; длительности вызовов, с."""
+    calls = []
+
+    def produce():
+        for message in messages:
+            started = time.perf_counter()
+            logger.error(message)
+            calls.append(time.perf_counter() - started)
+
+    thread = threading.Thread(target=produce, name="SerialWorker")
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "поток порта завис на записи журнала"
+    return calls
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def test_reader_thread_does_not_wait_for_blocked_disk(logger):
+    disk = BlockingHandler()
+    pipeline = LogPipeline([disk], logging.DEBUG, queue_size=100)
+    pipeline.start(logger)
+    try:
+        calls = log_from_reader_thread(logger, [f"Read error {i}" for i in range(2000)])
+    finally:
+        disk.unblocked.set()
+        pipeline.stop()
+
+    assert percentile(calls, 0.99) * 1000 < CALL_P99_MS
+    assert max(calls) * 1000 < CALL_MAX_MS
+    # очередь переполнилась: лишнее отброшено, а не дождалось диска
+    assert pipeline.handler.dropped > 0
+    assert len(disk.messages) < 2000
+
+
+def test_reader_thread_latency_with_slow_disk(logger):
+    disk = BlockingHandler(delay=0.001)
+    disk.unblocked.set()
+    pipeline = LogPipeline([disk], logging.DEBUG)
+    pipeline.start(logger)
+    calls = log_from_reader_thread(logger, [f"Read error {i}" for i in range(500)])
+    pipeline.stop()
+
+    # 500 записей по 1 мс на диске, а поток порта на каждой ‒ не дольше предела
+    assert percentile(calls, 0.99) * 1000 < CALL_P99_MS
+    assert max(calls) * 1000 < CALL_MAX_MS
+    assert len(disk.messages) == 500            # очередь не переполнялась ‒ всё дописано при stop()
+
+
+def test_repeats_are_suppressed_and_summarised(logger):
+    disk = BlockingHandler()
+    disk.unblocked.set()
+    pipeline = LogPipeline([disk], logging.DEBUG, burst=5, interval=60)
+    pipeline.start(logger)
+    message = "Parse error: unpack requires a buffer of 4 bytes"
+    calls = log_from_reader_thread(logger, [message] * 1000 + ["Read error"])
+    pipeline.stop()
+
+    assert max(calls) * 1000 < CALL_MAX_MS
+    assert disk.messages[:5] == [message] * 5
+    assert "Read error" in disk.messages
+    summaries = [m for m in disk.messages if "повторилось ещё" in m]
+    assert len(summaries) == 1 and summaries[0].startswith(f"{message} ‒ повторилось ещё 995 раз")
+    assert len(disk.messages) == 7
+
+
+def make_record(message: str, created: float) -> logging.LogRecord:
+    record = logging.makeLogRecord({"name": "SerialWorker", "levelno": logging.ERROR,
+                                    "levelname": "ERROR", "msg": message})
+    record.created = created
+    return record
+
+
+def test_repeat_limiter_window():
+    limiter = RepeatLimiter(burst=2, interval=10)
+    passed = [r for t in range(6) for r in limiter.check(make_record("same", 100 + t))]
+    assert [r.getMessage() for r in passed] == ["same", "same"]
+
+    # новое окно: сначала сводка по прошлому, потом сама запись
+    passed = limiter.check(make_record("same", 111))
+    assert [r.getMessage() for r in passed] == ["same ‒ повторилось ещё 4 раз за 5 с", "same"]
+
+
+def test_repeat_limiter_keys_differ_by_text():
+    limiter = RepeatLimiter(burst=1, interval=10)
+    passed = [r for i in range(5) for r in limiter.check(make_record(f"Read error {i}", 100))]
+    assert len(passed) == 5
+    assert limiter.flush(200) == []              # ничего не подавлено ‒ сводок нет
@@ -0,0 +1,107 @@
+"""Параметры в EEPROM (ParameterStore): карта, правки, план записи, подтверждённая запись."""
+import json
+
+import pytest
+
+from EepromTransfer import EEPROM_SIZE
+from ParameterStore import Parameter, ParameterStore, load_parameter_map
+
+PARAMETERS = [
+    {"name": "PumpDelay", "address": 0x100, "type": "uint", "width": 2},
+    {"name": "Offset", "address": 0x102, "type": "int", "width": 1},
+    {"name": "Gain", "address": 0x106, "type": "float", "width": 4},
+    {"name": "Mode", "address": 0x200, "type": "uint", "width": 1},
+]
+
+
+@pytest.fixture
+def store():
+    store = ParameterStore([Parameter(**item) for item in PARAMETERS])
+    store.shadow.update(0x100, bytes(range(0x20)))
+    store.shadow.update(0x200, b"\x01")
+    return store
+
+
+def test_changes_only_bytes_that_differ(store):
+    # PumpDelay: в тени 00 01, меняется только старший байт
+    store.set("PumpDelay", 0x0500)
+    assert store.changes() == {0x101: 0x05}
+    assert store.value("PumpDelay") == 0x0500 and store.device_value("PumpDelay") == 0x0100
+
+
+def test_setting_device_value_drops_edit(store):
+    store.set("Offset", -1)
+    assert store.is_edited("Offset")
+    store.set("Offset", 2)                 # в тени по адресу 0x102 ‒ 0x02
+    assert not store.is_edited("Offset") and store.changes() == {}
+
+
+def test_unknown_shadow_bytes_are_written():
+    store = ParameterStore([Parameter(**PARAMETERS[0])])
+    store.set("PumpDelay", 0)
+    assert store.changes() == {0x100: 0, 0x101: 0}
+
+
+def test_plan_fills_small_gap_with_shadow_bytes(store):
+    store.set("PumpDelay", 0x0500)         # байт 0x101
+    store.set("Gain", 1.0)                 # байты 0x106..0x109
+    store.set("Mode", 7)
+    blocks = store.plan()
+    # разрыв 0x102..0x105 из известных байт закрыт одной командой, Mode далеко ‒ отдельно
+    assert blocks == [(0x101, b"\x05\x02\x03\x04\x05\x00\x00\x80\x3f"), (0x200, b"\x07")]
+    assert store.plan(max_gap=0) == [(0x101, b"\x05"), (0x106, b"\x00\x00\x80\x3f"), (0x200, b"\x07")]
+
+
+def test_apply_written_updates_shadow_and_clears_edits(store):
+    store.set("PumpDelay", 0x0500)
+    store.set("Mode", 7)
+    blocks = store.plan()
+    store.apply_written(blocks[:1])
+    assert not store.is_edited("PumpDelay") and store.is_edited("Mode")
+    assert store.device_value("PumpDelay") == 0x0500
+    store.apply_written(blocks[1:])
+    assert store.edits == {} and store.plan() == []
+
+
+def test_apply_written_keeps_edit_changed_meanwhile(store):
+    store.set("Mode", 7)
+    blocks = store.plan()
+    store.set("Mode", 9)                   # правка после отправки ‒ записано не то
+    store.apply_written(blocks)
+    assert store.device_value("Mode") == 7 and store.value("Mode") == 9
+
+
+def test_span(store):
+    assert store.span == (0x100, 0x101)
+    assert ParameterStore([]).span == (0, 0)
+
+
+@pytest.mark.parametrize("name, text", [("Offset", "200"), ("PumpDelay", "1.5"), ("Gain", "nan"), ("Mode", "abc")])
+def test_parse_rejects_bad_values(store, name, text):
+    with pytest.raises(ValueError):
+        store.by_name[name].parse(text)
+
+
+def test_parse_accepts_hex_and_comma(store):
+    assert store.by_name["PumpDelay"].parse("0x1F") == 31
+    assert store.by_name["Gain"].parse("2,5") == 2.5
+
+
+# ----------  карта из файла  ----------
+def test_load_parameter_map(tmp_path):
+    path = tmp_path / "parameters.json"
+    path.write_text(json.dumps(PARAMETERS), encoding="utf-8")
+    assert [p.name for p in load_parameter_map(str(path))] == [p["name"] for p in PARAMETERS]
+
+
+@pytest.mark.parametrize("items", [
+    [PARAMETERS[0], PARAMETERS[0]],
+    [PARAMETERS[0], {"name": "Overlap", "address": 0x101, "type": "uint", "width": 1}],
+    [{"name": "Past", "address": EEPROM_SIZE - 1, "type": "uint", "width": 2}],
+    [{"name": "Odd", "address": 0, "type": "float", "width": 2}],
+])
+def test_invalid_parameter_map(tmp_path, items):
+    path = tmp_path / "parameters.json"
+    path.write_text(json.dumps(items), encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_parameter_map(str(path))
@@ -0,0 +1,41 @@
+"""Опрос порта PortDiscovery: контроллер узнаётся только по целым кадрам обмена."""
+from FrameParser import EXCHANGE_FRAME, SYNC_EXCHANGE, encode_exchange
+from PortDiscovery import find_frames
+
+FRAME = encode_exchange({"MIDA": 1.5})
+
+
+def test_two_frames_in_a_row():
+    buf = bytearray(b"\x01\x02" + FRAME + FRAME)
+    assert find_frames(buf) == 2
+
+
+def test_one_frame_is_not_enough():
+    buf = bytearray(FRAME)
+    assert find_frames(buf) == -1
+    # кадр остаётся в буфере ‒ ждём второго
+    assert bytes(buf) == FRAME
+    buf += FRAME
+    assert find_frames(buf) == 0
+
+
+def test_lone_sync_byte_is_not_a_controller():
+    # чужое устройство: 0xAA попадается, а заголовка кадра нет
+    buf = bytearray(bytes([SYNC_EXCHANGE, 0x00, 0x41]) * 40)
+    assert find_frames(buf) == -1
+    assert len(buf) < 3
+
+
+def test_header_followed_by_garbage_is_rejected():
+    buf = bytearray(FRAME + b"\x00" * EXCHANGE_FRAME)
+    assert find_frames(buf) == -1
+    buf += FRAME + FRAME
+    pos = find_frames(buf)
+    assert bytes(buf[pos:]) == FRAME + FRAME
+
+
+def test_header_split_between_reads():
+    buf = bytearray(b"\x07" + FRAME[:2])
+    assert find_frames(buf) == -1
+    buf += FRAME[2:] + FRAME
+    assert bytes(buf[find_frames(buf):]) == FRAME + FRAME
@@ -0,0 +1,167 @@
+"""Запись (Recorder) и чтение обратно (SessionQuery): заголовки, сегменты, события, хранение."""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from FrameParser import EXCHANGE_DTYPE, ExchangeBatch
+from Recorder import (
+    EVENT_EEPROM, EVENT_ERROR, EVENT_RECORD_DTYPE, EXCHANGE_RECORD_DTYPE, HEADER_SIZE, KIND_EVENT,
+    KIND_EXCHANGE, MAGIC, VERSION, Recorder, open_records, read_header, record_dir_from_env,
+    retention_from_env, segment_files,
+)
+from SessionQuery import SessionQuery
+
+FRAMES_PER_BATCH = 100
+T0_NS = time.monotonic_ns()
+
+
+def batch(first: int, count: int = FRAMES_PER_BATCH) -> ExchangeBatch:
+    """Кадры first..first+count-1: номер в TMNrpm, MIDA = номер / 10, t_ns = номер мс от T0_NS."""
+    records = np.zeros(count, dtype=EXCHANGE_DTYPE)
+    numbers = np.arange(first, first + count)
+    records["sync"], records["len1"], records["len4"] = 0xAA, 5, 6
+    records["TMNrpm"] = numbers
+    records["MIDA"] = numbers / 10
+    return ExchangeBatch(records, (T0_NS + numbers * 1_000_000).astype(np.uint64))
+
+
+def record(directory, batches, events=(), **options) -> Recorder:
+    recorder = Recorder(str(directory), **options)
+    for item in batches:
+        recorder.record(item)
+    for packet in events:
+        recorder.record(packet)
+    recorder.close()
+    return recorder
+
+
+def test_round_trip_through_session_query(tmp_path):
+    started_ns = time.time_ns()
+    recorder = record(tmp_path, [batch(i * FRAMES_PER_BATCH) for i in range(5)])
+    assert recorder.records_written == 500 and recorder.records_dropped == 0
+
+    [path] = recorder.segments
+    header = read_header(path)
+    assert header["magic"] == MAGIC and int(header["version"]) == VERSION
+    assert int(header["kind"]) == KIND_EXCHANGE
+    assert int(header["record_size"]) == EXCHANGE_RECORD_DTYPE.itemsize
+    assert started_ns <= int(header["wall_ns"]) <= time.time_ns()
+    assert os.path.getsize(path) == HEADER_SIZE + 500 * EXCHANGE_RECORD_DTYPE.itemsize
+
+    session = SessionQuery(str(tmp_path))
+    assert session.count(session.start_ns, session.end_ns) == 500
+    chunks = list(session.chunks(session.start_ns, session.end_ns, ["TMNrpm", "MIDA"], chunk_records=128))
+    assert np.array_equal(np.concatenate([c["TMNrpm"] for c in chunks]), np.arange(500))
+    assert np.allclose(np.concatenate([c["MIDA"] for c in chunks]), np.arange(500) / 10)
+    wall = np.concatenate([c.wall_ns for c in chunks])
+    assert np.all(np.diff(wall) == 1_000_000)
+    # интервал по настенному времени: кадры 100..199
+    assert session.count(int(wall[100]), int(wall[199])) == 100
+
+
+def test_rollover_splits_segments_and_query_joins_them(tmp_path):
+    # сегмент закрывается, как только в нём больше 150 кадров
+    recorder = record(tmp_path, [batch(i * FRAMES_PER_BATCH) for i in range(6)],
+                      max_bytes=150 * EXCHANGE_RECORD_DTYPE.itemsize)
+    assert len(recorder.segments) == 3
+    assert [len(open_records(p)) for p in recorder.segments] == [200, 200, 200]
+    for path in recorder.segments:
+        assert os.path.exists(path[:-len(".exch")] + ".evt")
+
+    session = SessionQuery(str(tmp_path))
+    assert len(session.segments) == 3
+    numbers = np.concatenate([c["TMNrpm"] for c in session.chunks(session.start_ns, session.end_ns)])
+    assert np.array_equal(numbers, np.arange(600))
+
+
+def test_event_layout(tmp_path):
+    t_ns = time.monotonic_ns()
+    events = [
+        {"CMD_ID": 0x11, "ERROR_CODE": 2, "ERROR_INFO": b"\x01\x02", "T_NS": t_ns, "DEVICE": None},
+        {"EEPROM_READ": list(range(16)), "ADDRESS": 0x0100, "T_NS": t_ns + 1, "DEVICE": None},
+    ]
+    recorder = record(tmp_path, [batch(0)], events)
+    evt = recorder.segments[0][:-len(".exch")] + ".evt"
+    header = read_header(evt)
+    assert int(header["kind"]) == KIND_EVENT
+    assert int(header["record_size"]) == EVENT_RECORD_DTYPE.itemsize == 272
+
+    error, eeprom = open_records(evt)
+    assert (int(error["t_ns"]), int(error["kind"]), int(error["cmd_id"]), int(error["error_code"])) == \
+        (t_ns, EVENT_ERROR, 0x11, 2)
+    assert int(error["length"]) == 2 and bytes(error["data"][:2]) == b"\x01\x02"
+    assert int(error["address"]) == -1
+    assert (int(eeprom["kind"]), int(eeprom["cmd_id"]), int(eeprom["address"]), int(eeprom["length"])) == \
+        (EVENT_EEPROM, 0x12, 0x0100, 16)
+    assert bytes(eeprom["data"][:16]) == bytes(range(16))
+    assert not eeprom["data"][16:].any()
+
+
+# ----------  хранение  ----------
+def test_retention_by_total_size(tmp_path):
+    segment_bytes = 100 * EXCHANGE_RECORD_DTYPE.itemsize
+    recorder = record(tmp_path, [batch(i * FRAMES_PER_BATCH) for i in range(8)],
+                      max_bytes=segment_bytes, max_total_bytes=4 * segment_bytes)
+    remaining = [base for base, _ in segment_files(str(tmp_path))]
+    # на новый сегмент оставляется место: с ним вместе не больше 4 сегментов
+    assert len(remaining) == 3
+    assert recorder.segments_deleted == 5
+    assert [os.path.basename(b) for b in remaining] == \
+        [os.path.basename(p)[:-len(".exch")] for p in recorder.segments[-3:]]
+    session = SessionQuery(str(tmp_path))
+    numbers = np.concatenate([c["TMNrpm"] for c in session.chunks(session.start_ns, session.end_ns)])
+    assert np.array_equal(numbers, np.arange(500, 800))
+
+
+def test_retention_by_age_removes_index_too(tmp_path):
+    record(tmp_path, [batch(0)])
+    SessionQuery(str(tmp_path))                 # индекс .idx.npz рядом со старым сегментом
+    old = segment_files(str(tmp_path))[0]
+    assert any(p.endswith(".idx.npz") for p in old[1])
+    week_ago = time.time() - 7 * 86400
+    for path in old[1]:
+        os.utime(path, (week_ago, week_ago))
+
+    recorder = record(tmp_path, [batch(100)], max_age=86400)
+    assert recorder.segments_deleted == 1
+    assert not os.path.exists(old[0] + ".exch.idx.npz")
+    [(base, paths)] = segment_files(str(tmp_path))
+    assert np.array_equal(open_records(base + ".exch")["TMNrpm"], np.arange(100, 200))
+
+
+def test_session_started_in_the_same_second_does_not_overwrite(tmp_path):
+    first = record(tmp_path, [batch(0)])
+    second = record(tmp_path, [batch(100)])
+    assert first.segments[0] != second.segments[0]
+    assert len(segment_files(str(tmp_path))) == 2
+
+
+def test_no_retention_keeps_everything(tmp_path):
+    record(tmp_path, [batch(i * FRAMES_PER_BATCH) for i in range(4)],
+           max_bytes=100 * EXCHANGE_RECORD_DTYPE.itemsize)
+    assert len(segment_files(str(tmp_path))) == 4
+
+
+# ----------  окружение  ----------
+def test_record_switch_from_env(monkeypatch):
+    monkeypatch.delenv("NIIM_RECORD", raising=False)
+    monkeypatch.delenv("NIIM_RECORD_DIR", raising=False)
+    assert record_dir_from_env() == "records"
+    monkeypatch.setenv("NIIM_RECORD_DIR", "/data/niim")
+    assert record_dir_from_env() == "/data/niim"
+    monkeypatch.setenv("NIIM_RECORD", "0")
+    assert record_dir_from_env() is None
+
+
+def test_retention_from_env(monkeypatch):
+    monkeypatch.delenv("NIIM_RECORD_KEEP_GB", raising=False)
+    monkeypatch.delenv("NIIM_RECORD_KEEP_DAYS", raising=False)
+    assert retention_from_env() == {"max_total_bytes": None, "max_age": None}
+    monkeypatch.setenv("NIIM_RECORD_KEEP_GB", "1.5")
+    monkeypatch.setenv("NIIM_RECORD_KEEP_DAYS", "30")
+    assert retention_from_env() == {"max_total_bytes": int(1.5 * 1024 ** 3), "max_age": 30 * 86400}
+    monkeypatch.setenv("NIIM_RECORD_KEEP_DAYS", "месяц")
+    with pytest.raises(ValueError):
+        retention_from_env()
@@ -0,0 +1,119 @@
+"""Кольцо кадров в разделяемой памяти (ProcessAcquisition.ShmRing)."""
+import os
+import subprocess
+import sys
+import threading
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pytest
+
+from FrameParser import EXCHANGE_DTYPE, ExchangeBatch
+import ProcessAcquisition
+from ProcessAcquisition import ShmRing
+
+
+def batch(first: int, count: int) -> ExchangeBatch:
+    """Кадры с номерами first..first+count-1 в TMNrpm и в t_ns."""
+    records = np.zeros(count, dtype=EXCHANGE_DTYPE)
+    records["TMNrpm"] = np.arange(first, first + count)
+    return ExchangeBatch(records, np.arange(first, first + count, dtype=np.uint64))
+
+
+def numbers(batches) -> list:
+    return [int(n) for b in batches for n in b["TMNrpm"]]
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing.create(capacity=8)
+    yield ring
+    ring.close()
+
+
+def test_read_across_the_edge(ring):
+    reader = ShmRing.attach(ring.name)
+    try:
+        ring.write(batch(0, 6))
+        assert numbers(reader.read()) == list(range(6))
+        ring.write(batch(6, 5))
+        batches = reader.read()
+        assert len(batches) == 2 and numbers(batches) == list(range(6, 11))
+        assert reader.overruns == 0
+    finally:
+        reader.close()
+
+
+def test_reader_behind_by_more_than_capacity(ring):
+    reader = ShmRing.attach(ring.name)
+    try:
+        ring.write(batch(0, 5))
+        ring.write(batch(5, 7))
+        assert numbers(reader.read()) == list(range(4, 12))
+        assert reader.overruns == 4
+    finally:
+        reader.close()
+
+
+def test_frames_overwritten_during_copy_are_dropped(ring):
+    reader = ShmRing.attach(ring.name)
+    try:
+        ring.write(batch(0, 6))
+        # писатель уже начал класть кадры 6..9: 8 и 9 ложатся на место 0 и 1
+        ring.header["claimed"] = 10
+        assert numbers(reader.read()) == [2, 3, 4, 5]
+        assert reader.overruns == 2
+    finally:
+        reader.close()
+
+
+def test_read_returns_copies(ring):
+    reader = ShmRing.attach(ring.name)
+    try:
+        ring.write(batch(0, 4))
+        first = reader.read()
+        ring.write(batch(4, 8))
+        assert numbers(first) == [0, 1, 2, 3]
+    finally:
+        reader.close()
+
+
+def test_concurrent_writer_never_yields_torn_frames():
+    ring = ShmRing.create(capacity=64)
+    reader = ShmRing.attach(ring.name)
+    total = 200_000
+    done = threading.Event()
+
+    def write():
+        for first in range(0, total, 50):
+            ring.write(batch(first, 50))
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    seen, last = 0, -1
+    try:
+        while not done.is_set() or reader.read_index < ring.written:
+            for b in reader.read():
+                rpm = b["TMNrpm"].astype(np.int64)
+                # кадр и его время записаны одним писателем ‒ не из разных кругов
+                assert np.array_equal(rpm, b.t_ns.astype(np.int64))
+                assert np.all(np.diff(rpm) == 1) and rpm[0] > last
+                last = int(rpm[-1])
+                seen += len(b)
+    finally:
+        thread.join()
+        reader.close()
+        ring.close()
+    assert seen + reader.overruns == total
+
+
+def test_attach_from_unrelated_process_does_not_unlink(ring):
+    # у отдельного процесса свой resource_tracker: без unregister он удалил бы кольцо при выходе
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); from ProcessAcquisition import ShmRing; "
+            "ShmRing.attach(sys.argv[2]).close()")
+    result = subprocess.run([sys.executable, "-c", code, os.path.dirname(ProcessAcquisition.__file__), ring.name],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert "leaked" not in result.stderr
+    SharedMemory(name=ring.name).close()